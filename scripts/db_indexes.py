@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import logging
+import re
+
+from sqlalchemy import inspect, text
+
+
+# Indexes declared per table, by table name template: {suffix: [columns]}.
+# Each index is named ix_{table}_{suffix}, which stays within the 64
+# characters MySQL allows.
+INDEXES = {
+    'raw_statcast_{year}': {'game_date': ['game_date'],
+                            'pitch': ['game_pk', 'at_bat_number', 'pitch_number'],
+                            'batter': ['batter'],
+                            'pitcher': ['pitcher']},
+    'wrk_statcast_{year}': {'game_date': ['Game_Date'],
+                            'pitch': ['Game_ID', 'PA_Num', 'Pitch_Num'],
+                            'batter': ['Batter_ID'],
+                            'pitcher': ['Pitcher_ID']},
+    'rollup_player_game_{year}': {'game': ['Game_Date', 'Game_ID'],
+                                  'batter': ['Batter_ID']},
+    'rollup_team_game_{year}': {'game': ['Game_Date', 'Game_ID']},
+    'rollup_player_season_{year}': {'batter': ['Batter_ID']},
+    'player_form_{year}': {'player': ['Player_ID', 'Game_Date'],
+                           'game': ['Game_ID']},
+    'player_form_state_{year}': {'player': ['Player_ID']},
+}
+
+
+def year_tables(year):
+    '''Returns the names of every table with declared indexes for a season.'''
+    return [template.format(year=year) for template in INDEXES]
+
+
+def declared_indexes(table):
+    '''Returns {index name: [columns]} declared for a table, or {} if none are.'''
+    for template, dct_indexes in INDEXES.items():
+        if re.fullmatch(template.format(year=r'\d{4}'), table):
+            return {f'ix_{table}_{suffix}': lst_cols for suffix, lst_cols in dct_indexes.items()}
+
+    return {}
+
+
+def index_ddl(engine, table, dct_indexes, action):
+    '''Returns the statements that create or drop indexes on a table, in the
+    engine's SQL dialect.
+
+    MySQL adds or drops all of a table's indexes in one ALTER TABLE, so the
+    table is rebuilt once rather than once per index. SQL Server builds each
+    index with its sort in tempdb, keeping the database file from growing
+    for the sort. Other databases (e.g. SQLite) use plain CREATE/DROP INDEX.
+
+    Args:
+        engine(Engine): The database engine.
+        table(str): The table.
+        dct_indexes(dict): {index name: [columns]} to create or drop.
+        action(str): 'create' or 'drop'.
+
+    Returns:
+        list: The SQL statements, empty if dct_indexes is.
+
+    Raises:
+        ValueError: if action is not 'create' or 'drop'
+    '''
+    if action not in ['create', 'drop']:
+        raise ValueError(f"action must be 'create' or 'drop', not {action!r}")
+    if not dct_indexes:
+        return []
+
+    dialect = engine.dialect.name
+    quote = engine.dialect.identifier_preparer.quote
+    dct_cols = {name: ', '.join(quote(col) for col in lst_cols) for name, lst_cols in dct_indexes.items()}
+
+    if dialect == 'mysql':
+        if action == 'create':
+            lst_clauses = [f'ADD INDEX {quote(name)} ({cols})' for name, cols in dct_cols.items()]
+        else:
+            lst_clauses = [f'DROP INDEX {quote(name)}' for name in dct_cols]
+        return [f'ALTER TABLE {quote(table)} ' + ', '.join(lst_clauses)]
+
+    if dialect == 'mssql':
+        if action == 'create':
+            return [f'CREATE INDEX {quote(name)} ON {quote(table)} ({cols}) WITH (SORT_IN_TEMPDB = ON)'
+                    for name, cols in dct_cols.items()]
+        return [f'DROP INDEX {quote(name)} ON {quote(table)}' for name in dct_cols]
+
+    if action == 'create':
+        return [f'CREATE INDEX {quote(name)} ON {quote(table)} ({cols})' for name, cols in dct_cols.items()]
+    return [f'DROP INDEX {quote(name)}' for name in dct_cols]
+
+
+def create_indexes(engine, lst_tables):
+    '''Creates the declared indexes that are missing on each existing table.
+
+    Tables that do not exist yet are skipped, as are indexes on columns the
+    table does not have (e.g. a table created by an older version).
+
+    Args:
+        engine(Engine): The database engine.
+        lst_tables(list): The tables to index.
+
+    Returns:
+        int: Number of indexes created.
+
+    Raises:
+        Exception: if a CREATE INDEX fails
+    '''
+    created = 0
+    inspector = inspect(engine)
+    for table in lst_tables:
+        if not inspector.has_table(table):
+            continue
+        set_existing = {dct_index['name'] for dct_index in inspector.get_indexes(table)}
+        set_cols = {dct_col['name'] for dct_col in inspector.get_columns(table)}
+        dct_missing = {name: lst_cols for name, lst_cols in declared_indexes(table).items()
+                       if name not in set_existing and set(lst_cols) <= set_cols}
+        with engine.begin() as conn:
+            for stmt in index_ddl(engine, table, dct_missing, 'create'):
+                conn.execute(text(stmt))
+        if dct_missing:
+            logging.info(f'{table}: created indexes {list(dct_missing)}')
+        created += len(dct_missing)
+
+    return created
+
+
+def drop_indexes(engine, lst_tables):
+    '''Drops the declared indexes that exist on each table, ahead of a bulk
+    load; create_indexes() builds them again afterwards.
+
+    Args:
+        engine(Engine): The database engine.
+        lst_tables(list): The tables to drop the indexes of.
+
+    Returns:
+        int: Number of indexes dropped.
+
+    Raises:
+        Exception: if a DROP INDEX fails
+    '''
+    dropped = 0
+    inspector = inspect(engine)
+    for table in lst_tables:
+        if not inspector.has_table(table):
+            continue
+        set_existing = {dct_index['name'] for dct_index in inspector.get_indexes(table)}
+        dct_existing = {name: lst_cols for name, lst_cols in declared_indexes(table).items() if name in set_existing}
+        with engine.begin() as conn:
+            for stmt in index_ddl(engine, table, dct_existing, 'drop'):
+                conn.execute(text(stmt))
+        if dct_existing:
+            logging.info(f'{table}: dropped indexes {list(dct_existing)}')
+        dropped += len(dct_existing)
+
+    return dropped
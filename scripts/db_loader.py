@@ -0,0 +1,447 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import csv
+import logging
+import os
+import tempfile
+import urllib
+import uuid
+
+import pandas as pd
+
+from sqlalchemy import BigInteger, Boolean, DateTime, Float, Integer, Text, create_engine, inspect, text
+
+
+# Most drivers cap the number of bound parameters in a single statement,
+# which limits how many rows a multi-row VALUES insert can carry.
+MAX_PARAMS = {'mssql': 2100,
+              'mysql': 65535,
+              'sqlite': 999}
+
+DEFAULT_LOADER = {'batch_size': 5000,
+                  'mssql_mode': 'fast_executemany',
+                  'mysql_mode': 'executemany',
+                  'default_mode': 'executemany'}
+
+
+def create_db_engine(dbtype, dct_db, dct_loader=None):
+    '''Creates a SQLAlchemy engine for the database type used by the pipeline.
+
+    The engine is tuned for bulk loading: MSSQL engines are created with
+    pyodbc's fast_executemany so parameter arrays are sent in one round trip,
+    and MySQL engines enable LOCAL INFILE when the loader is configured to
+    use LOAD DATA.
+
+    Args:
+        dbtype(str): 'mssql', 'mysql' or 'sqlite'.
+        dct_db(dict): The connection settings for the database type, as found
+                      in the DB_MSSQL/DB_MySQL sections of config.yaml. For
+                      sqlite, 'database' is the path to the database file.
+        dct_loader(dict): The 'Loader' section of config.yaml.
+
+    Returns:
+        Engine: The SQLAlchemy engine.
+
+    Raises:
+        ValueError: if the database type is not supported
+    '''
+    dct_loader = {**DEFAULT_LOADER, **(dct_loader or {})}
+
+    if dbtype == 'mssql':
+        params = urllib.parse.quote_plus(f"DRIVER={dct_db['driver']};SERVER={dct_db['server']};DATABASE={dct_db['database']}")
+        return create_engine(f"mssql+pyodbc:///?odbc_connect=%s" % params,
+                             fast_executemany=dct_loader['mssql_mode'] == 'fast_executemany')
+
+    if dbtype == 'mysql':
+        connect_args = {'local_infile': 1} if dct_loader['mysql_mode'] == 'load_data' else {}
+        return create_engine(f"mysql+pymysql://{dct_db['username']}:{dct_db['password']}@{dct_db['server']}/{dct_db['database']}",
+                             connect_args=connect_args)
+
+    if dbtype == 'sqlite':
+        return create_engine(f"sqlite:///{dct_db['database']}")
+
+    raise ValueError(f'Unsupported database type: {dbtype}')
+
+
+def get_batch_size(engine, ncols, batch_size, mode):
+    '''Returns the number of rows to send per statement.
+
+    Multi-row VALUES inserts bind one parameter per cell, so the batch is
+    capped by the driver's parameter limit. Executemany style inserts bind
+    one row at a time and only need the configured batch size.
+
+    Args:
+        engine(Engine): The engine the data is inserted through.
+        ncols(int): Number of columns in the DataFrame.
+        batch_size(int): The configured number of rows per batch.
+        mode(str): The insert mode, 'multi' uses multi-row VALUES.
+
+    Returns:
+        int: Rows per statement.
+
+    Raises:
+        No exceptions
+    '''
+    if mode != 'multi':
+        return batch_size
+
+    max_params = MAX_PARAMS.get(engine.dialect.name, 999)
+
+    return max(1, min(batch_size, (max_params - 1) // max(ncols, 1)))
+
+
+def load_data_infile(df, table, engine):
+    '''Bulk loads a DataFrame into a MySQL table with LOAD DATA LOCAL INFILE.
+
+    The table is created from the DataFrame's schema if it does not exist,
+    then the rows are written to a temporary CSV file that the server
+    reads in a single statement.
+
+    Args:
+        df(DataFrame): The data to load.
+        table(str): The target table.
+        engine(Engine): A mysql+pymysql engine created with local_infile.
+
+    Returns:
+        Does not return a parameter
+
+    Raises:
+        No exceptions
+    '''
+    df.head(0).to_sql(table, engine, index=False, if_exists='append')
+
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    try:
+        with os.fdopen(fd, 'w', newline='') as filehandler:
+            df.to_csv(filehandler,
+                      index=False,
+                      header=False,
+                      na_rep='\\N',
+                      quoting=csv.QUOTE_MINIMAL,
+                      lineterminator='\n')
+
+        str_cols = ', '.join(f'`{c}`' for c in df.columns)
+        with engine.begin() as conn:
+            conn.execute(text(f"LOAD DATA LOCAL INFILE '{path.replace(os.sep, '/')}' "
+                              f"INTO TABLE `{table}` "
+                              f"FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '' "
+                              f"LINES TERMINATED BY '\\n' ({str_cols})"))
+    finally:
+        os.remove(path)
+
+
+def sql_frame(df):
+    '''Returns the frame with its missing values ready to be written as SQL
+    NULLs. This is the only place the pipeline's typed frames are converted:
+    categorical columns become object columns with None for missing values;
+    nullable integer and float columns are left to pandas, which writes NA
+    and NaN as NULL.
+
+    Args:
+        df(DataFrame): The data to write.
+
+    Returns:
+        DataFrame: A shallow copy, or the frame itself if there was nothing
+                   to convert.
+
+    Raises:
+        No exceptions
+    '''
+    lst_category_cols = [c for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)]
+    if not lst_category_cols:
+        return df
+
+    df = df.copy(deep=False)
+    for c in lst_category_cols:
+        srs = df[c].astype(object)
+        df[c] = srs.where(srs.notna(), None)
+
+    return df
+
+
+def insert_df(df, table, engine, dct_loader=None):
+    '''Appends a DataFrame to a table using the fastest path for the backend.
+
+    - mssql+pyodbc: executemany through fast_executemany (set on the engine),
+      or multi-row VALUES batches when mssql_mode is 'multi'.
+    - mysql+pymysql: executemany, which pymysql rewrites into multi-row
+      VALUES statements; explicit multi-row batches when mysql_mode is
+      'multi'; or LOAD DATA LOCAL INFILE when mysql_mode is 'load_data'.
+    - anything else (e.g. sqlite): executemany, or multi-row VALUES batches
+      when default_mode is 'multi'.
+
+    Args:
+        df(DataFrame): The data to insert.
+        table(str): The target table, created if it does not exist.
+        engine(Engine): The engine the data is inserted through.
+        dct_loader(dict): The 'Loader' section of config.yaml.
+
+    Returns:
+        Does not return a parameter
+
+    Raises:
+        No exceptions
+    '''
+    dct_loader = {**DEFAULT_LOADER, **(dct_loader or {})}
+    dialect = engine.dialect.name
+    df = sql_frame(df)
+
+    if dialect == 'mysql' and dct_loader['mysql_mode'] == 'load_data':
+        load_data_infile(df, table, engine)
+        return
+
+    if dialect == 'mssql':
+        mode = dct_loader['mssql_mode']
+    elif dialect == 'mysql':
+        mode = dct_loader['mysql_mode']
+    else:
+        mode = dct_loader['default_mode']
+
+    if mode != 'multi':
+        mode = None
+
+    df.to_sql(table,
+              engine,
+              index=False,
+              if_exists='append',
+              method=mode,
+              chunksize=get_batch_size(engine, len(df.columns), dct_loader['batch_size'], mode))
+
+
+def column_sql_type(dtype):
+    '''Returns the SQLAlchemy type a column of a given dtype is created with,
+    the same choice pandas makes when to_sql() creates a table.
+
+    Args:
+        dtype: The pandas dtype of the column.
+
+    Returns:
+        TypeEngine: The column type.
+
+    Raises:
+        No exceptions
+    '''
+    if pd.api.types.is_bool_dtype(dtype):
+        return Boolean()
+    if pd.api.types.is_integer_dtype(dtype):
+        return BigInteger() if dtype.itemsize == 8 else Integer()
+    if pd.api.types.is_float_dtype(dtype):
+        return Float(precision=53)
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return DateTime()
+
+    return Text()
+
+
+def add_missing_columns(df, table, engine):
+    '''Adds the DataFrame's columns that an existing table does not have, so
+    a table created before a column was added to the pipeline can still be
+    appended to. The columns are added at the end of the table and are NULL
+    for the rows already in it. A table that does not exist is left alone, as
+    insert_df() creates it with every column.
+
+    Args:
+        df(DataFrame): The data about to be written.
+        table(str): The target table.
+        engine(Engine): The engine the data is written through.
+
+    Returns:
+        list: The columns added.
+
+    Raises:
+        Exception: if a column could not be added
+    '''
+    inspector = inspect(engine)
+    if not inspector.has_table(table):
+        return []
+
+    set_existing = {dct_col['name'].lower() for dct_col in inspector.get_columns(table)}
+    lst_missing = [col for col in df.columns if col.lower() not in set_existing]
+    if not lst_missing:
+        return []
+
+    quote = engine.dialect.identifier_preparer.quote
+    with engine.begin() as conn:
+        for col in lst_missing:
+            str_type = column_sql_type(df[col].dtype).compile(dialect=engine.dialect)
+            conn.execute(text(f'ALTER TABLE {quote(table)} ADD {quote(col)} {str_type}'))
+    logging.warning(f'{table}: added missing column(s) {lst_missing}')
+
+    return lst_missing
+
+
+def upsert_sql(engine, table, staging, lst_cols, lst_keys):
+    '''Returns the statements that replace the rows of a table with the rows
+    of its staging table, matched on the key columns.
+
+    The rows of the table that match a staged key are deleted in one
+    statement joined to the staging table, then the staged rows are inserted
+    with one INSERT ... SELECT. Deleting rather than updating the matched
+    rows also removes duplicates an earlier append left behind. SQL Server
+    and MySQL delete through a join; SQLite, which has no DELETE ... JOIN,
+    deletes the rowids the join finds, so both read the table through its
+    index on the keys rather than scanning it.
+
+    Args:
+        engine(Engine): The database engine.
+        table(str): The target table.
+        staging(str): The staging table, with the same columns.
+        lst_cols(list): The columns to insert.
+        lst_keys(list): The columns that identify a row.
+
+    Returns:
+        list: The DELETE and INSERT statements.
+
+    Raises:
+        No exceptions
+    '''
+    quote = engine.dialect.identifier_preparer.quote
+    on = ' AND '.join(f't.{quote(col)} = s.{quote(col)}' for col in lst_keys)
+    cols = ', '.join(quote(col) for col in lst_cols)
+
+    if engine.dialect.name in ['mssql', 'mysql']:
+        delete = f'DELETE t FROM {quote(table)} AS t INNER JOIN {quote(staging)} AS s ON {on}'
+    else:
+        delete = (f'DELETE FROM {quote(table)} WHERE rowid IN '
+                  f'(SELECT t.rowid FROM {quote(staging)} AS s INNER JOIN {quote(table)} AS t ON {on})')
+
+    return [delete, f'INSERT INTO {quote(table)} ({cols}) SELECT {cols} FROM {quote(staging)}']
+
+
+def staging_table(table):
+    '''Returns a staging table name for table that no other run uses:
+    stg_{table}_{pid}_{random hex}.'''
+    return f'stg_{table}_{os.getpid()}_{uuid.uuid4().hex[:8]}'
+
+
+def upsert_df(df, table, engine, lst_keys, dct_loader=None):
+    '''Writes a DataFrame to a table, replacing the rows that have the same
+    keys, so loading the same data again leaves the table unchanged.
+
+    The rows are bulk loaded into a staging table through insert_df(), then
+    applied to the table with the set-based statements of upsert_sql() in a
+    single transaction: either every row is replaced or, if a statement
+    fails, the table is left as it was. There are no per-row existence
+    checks, so the cost is about that of the bulk insert plus one join on the
+    table's key index. A table that does not exist yet is
+    created by a plain insert, and columns the table lacks are added first
+    (see add_missing_columns()).
+
+    The staging table is named stg_{table}_{pid}_{random hex}, so runs
+    writing the same table at the same time each get their own. It is
+    dropped once the rows are applied, even if they are not; only a process
+    killed part way through leaves one behind.
+
+    Args:
+        df(DataFrame): The data to write. Rows with the same keys are
+                       reduced to the last one.
+        table(str): The target table.
+        engine(Engine): The engine the data is written through.
+        lst_keys(list): The columns that identify a row, e.g. ['game_pk',
+                        'at_bat_number', 'pitch_number'].
+        dct_loader(dict): The 'Loader' section of config.yaml.
+
+    Returns:
+        int: Number of existing rows replaced.
+
+    Raises:
+        Exception: if the staging load or the upsert fails; the table is
+                   unchanged
+    '''
+    arr_dup = df.duplicated(lst_keys, keep='last').to_numpy()
+    if arr_dup.any():
+        logging.warning(f'{table}: {int(arr_dup.sum())} row(s) with duplicate keys {lst_keys} dropped')
+        df = df[~arr_dup]
+
+    if not inspect(engine).has_table(table):
+        insert_df(df, table, engine, dct_loader)
+        return 0
+    add_missing_columns(df, table, engine)
+
+    staging = staging_table(table)
+    quote = engine.dialect.identifier_preparer.quote
+    try:
+        insert_df(df, staging, engine, dct_loader)
+        lst_delete_insert = upsert_sql(engine, table, staging, list(df.columns), lst_keys)
+        with engine.begin() as conn:
+            replaced = conn.execute(text(lst_delete_insert[0])).rowcount
+            conn.execute(text(lst_delete_insert[1]))
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text(f'DROP TABLE IF EXISTS {quote(staging)}'))
+
+    return max(replaced, 0)
+
+
+def replace_df(df, table, engine, lst_deletes, dct_loader=None):
+    '''Deletes rows from a table and inserts a DataFrame in their place, in a
+    single transaction, so a failure leaves the table as it was rather than
+    with the rows deleted and nothing inserted (see replace_dfs()).
+
+    Args:
+        df(DataFrame): The rows to insert.
+        table(str): The target table.
+        engine(Engine): The engine the data is written through.
+        lst_deletes(list): (statement, parameters) pairs run before the
+                           insert, e.g. (text('DELETE FROM t WHERE ...'), {}).
+        dct_loader(dict): The 'Loader' section of config.yaml.
+
+    Returns:
+        int: Number of rows deleted.
+
+    Raises:
+        Exception: if the staging load, a delete or the insert fails; the
+                   table is unchanged
+    '''
+    return replace_dfs([(df, table, lst_deletes)], engine, dct_loader)[0]
+
+
+def replace_dfs(lst_writes, engine, dct_loader=None):
+    '''Deletes rows from one or more tables and inserts a DataFrame into each,
+    all in a single transaction, for tables that must stay consistent with
+    each other.
+
+    As in upsert_df(), each frame is first bulk loaded into its own staging
+    table, and only the DELETE statements and one INSERT ... SELECT per table
+    run in the transaction. A table that does not exist yet is created empty
+    first, and columns a table lacks are added (see add_missing_columns()).
+
+    Args:
+        lst_writes(list): (DataFrame, table, lst_deletes) for each table,
+                          where lst_deletes holds the (statement, parameters)
+                          pairs run before the table's insert.
+        engine(Engine): The engine the data is written through.
+        dct_loader(dict): The 'Loader' section of config.yaml.
+
+    Returns:
+        list: Number of rows deleted from each table.
+
+    Raises:
+        Exception: if a staging load, a delete or an insert fails; every
+                   table is unchanged
+    '''
+    quote = engine.dialect.identifier_preparer.quote
+    lst_staging = []
+    try:
+        for df, table, lst_deletes in lst_writes:
+            if inspect(engine).has_table(table):
+                add_missing_columns(df, table, engine)
+            else:
+                insert_df(df.head(0), table, engine, dct_loader)
+            lst_staging.append(staging_table(table))
+            insert_df(df, lst_staging[-1], engine, dct_loader)
+
+        lst_deleted = []
+        with engine.begin() as conn:
+            for (df, table, lst_deletes), staging in zip(lst_writes, lst_staging):
+                str_cols = ', '.join(quote(col) for col in df.columns)
+                lst_deleted.append(sum(max(conn.execute(stmt, dct_params).rowcount, 0)
+                                       for stmt, dct_params in lst_deletes))
+                conn.execute(text(f'INSERT INTO {quote(table)} ({str_cols}) SELECT {str_cols} FROM {quote(staging)}'))
+    finally:
+        with engine.begin() as conn:
+            for staging in lst_staging:
+                conn.execute(text(f'DROP TABLE IF EXISTS {quote(staging)}'))
+
+    return lst_deleted
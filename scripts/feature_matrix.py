@@ -0,0 +1,451 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import io
+import logging
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import ujson
+
+from statcast_dtypes import WRK_CATEGORY_COLS, WRK_TEXT_COLS, WRK_DATE_COLS
+
+
+MATRIX_VERSION = 1
+
+# Free text, close to unique per row; listed features that map to these
+# columns are left out rather than given a code per row.
+FREE_TEXT_COLS = ['Gameday_Description', 'Event_ID']
+
+# Identify each row, so a model's output can be joined back to the WRK table.
+KEY_COLS = ['Game_ID', 'PA_Num', 'Pitch_Num']
+
+DEFAULT_LABELS = ['cnt_Hit', 'cnt_Home_Run', 'cnt_RBI', 'Yahoo_Pnts_Batter']
+
+# The arrays of a matrix: file name, dtype and the manifest entry listing
+# their columns.
+ARRAYS = {'features': ('features.npy', np.float32),
+          'labels': ('labels.npy', np.float32),
+          'keys': ('keys.npy', np.int64)}
+
+
+def read_feature_list(path):
+    '''Reads a feature list such as lists/reorder_features.txt: one quoted
+    RAW column name per line, with '#' comment lines.
+
+    Args:
+        path(str): The list file.
+
+    Returns:
+        list: The column names, in order.
+
+    Raises:
+        No exceptions
+    '''
+    lst_names = []
+    with open(path, 'r') as filehandler:
+        for line in filehandler:
+            name = line.strip().rstrip(',').strip().strip('\'"')
+            if name and not name.startswith('#'):
+                lst_names.append(name)
+
+    return lst_names
+
+
+def wrk_feature_columns(lst_names, parent_path, lst_wrk_columns):
+    '''Maps feature names to WRK columns.
+
+    RAW names are renamed the way rename_columns() renames them
+    (lists/lst_reorder_cols.txt to lists/lst_rename_cols.txt); a name that
+    is not renamed there is matched to a WRK column ignoring case (e.g.
+    post_bat_score to Post_Bat_Score). Names with no WRK column and free
+    text columns are left out, with a warning.
+
+    Args:
+        lst_names(list): Feature names, RAW or WRK.
+        parent_path(str): The project folder that holds /lists.
+        lst_wrk_columns(list): The columns of the WRK table.
+
+    Returns:
+        list: The WRK columns, in order, without duplicates.
+
+    Raises:
+        No exceptions
+    '''
+    with open(f'{parent_path}/lists/lst_reorder_cols.txt', 'r') as filehandler:
+        lst_raw = [line[:-1] for line in filehandler]
+    with open(f'{parent_path}/lists/lst_rename_cols.txt', 'r') as filehandler:
+        lst_wrk = [line[:-1] for line in filehandler]
+    dct_rename = dict(zip(lst_raw, lst_wrk))
+    dct_lower = {col.lower(): col for col in lst_wrk_columns}
+
+    lst_columns = []
+    lst_skipped = []
+    for name in lst_names:
+        col = dct_rename.get(name, name)
+        col = col if col in lst_wrk_columns else dct_lower.get(col.lower())
+        if col is None or col in FREE_TEXT_COLS:
+            lst_skipped.append(name)
+        elif col not in lst_columns:
+            lst_columns.append(col)
+    if lst_skipped:
+        logging.warning(f'Features not in the WRK table or free text, left out: {lst_skipped}')
+
+    return lst_columns
+
+
+def feature_kind(col):
+    '''Returns how a WRK column is encoded: 'code' (an index into the
+    column's code table), 'days' (days since 1970-01-01) or 'numeric'.'''
+    if col in WRK_CATEGORY_COLS or col in WRK_TEXT_COLS:
+        return 'code'
+    if col in WRK_DATE_COLS:
+        return 'days'
+    return 'numeric'
+
+
+def _npy_offset(path):
+    '''Returns the shape of a .npy file and the offset of its data.'''
+    with open(path, 'rb') as f:
+        np.lib.format.read_magic(f)
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+
+        return shape, f.tell()
+
+
+def _npy_header(shape, dtype):
+    '''Returns the .npy header bytes for a C-ordered array.'''
+    buffer = io.BytesIO()
+    np.lib.format.write_array_header_1_0(buffer, {'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)),
+                                                  'fortran_order': False,
+                                                  'shape': tuple(shape)})
+
+    return buffer.getvalue()
+
+
+class FeatureMatrix():
+    '''
+    A model input matrix built from WRK rows and kept on disk as .npy files,
+    which are read back as memory maps, so a matrix larger than memory can
+    be built and used a batch at a time.
+
+    Files in path:
+        features.npy   float32 (rows, features); codes for text columns,
+                       NaN for missing values
+        labels.npy     float32 (rows, labels)
+        keys.npy       int64 (rows, 3): Game_ID, PA_Num, Pitch_Num
+        codes.json     {column: [values]}, the code of a value is its index
+        manifest.json  version, features (column and encoding), labels,
+                       rows, and the rows of each date
+
+    Rows are added by append(), which writes the new rows after the existing
+    ones and rewrites only the .npy headers, so adding a day costs the same
+    however long the matrix is. Values are given the next free code the
+    first time they appear, so a code never changes once written and models
+    trained on an earlier matrix stay valid.
+
+    Args:
+        path(str): Directory of the matrix.
+
+    Attributes:
+        dct_manifest(dict): The manifest, None if the matrix was not created.
+        dct_codes(dict): The code tables.
+
+    '''
+    def __init__(self, path):
+
+        self.path = path
+        self.dct_manifest = None
+        self.dct_codes = {}
+
+        if os.path.exists(os.path.join(self.path, 'manifest.json')):
+            self.dct_manifest = ujson.load(open(os.path.join(self.path, 'manifest.json')))
+            self.dct_codes = ujson.load(open(os.path.join(self.path, 'codes.json')))
+            if self.dct_manifest.get('version') != MATRIX_VERSION:
+                raise ValueError(f'{self.path} is version {self.dct_manifest.get("version")}, '
+                                 f'expected {MATRIX_VERSION}; build the matrix again')
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    @property
+    def rows(self):
+        '''Number of rows in the matrix.'''
+        return self.dct_manifest['rows'] if self.dct_manifest else 0
+
+    @property
+    def last_date(self):
+        '''The latest date in the matrix, formatted 'yyyy-mm-dd', or None.'''
+        return max(self.dct_manifest['dates']) if self.dct_manifest and self.dct_manifest['dates'] else None
+
+    def array_path(self, name):
+        '''Returns the file path of one of ARRAYS.'''
+        return os.path.join(self.path, ARRAYS[name][0])
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def create(self, lst_features, lst_labels):
+        '''Creates an empty matrix with the given columns.
+
+        Args:
+            lst_features(list): WRK columns to encode as features.
+            lst_labels(list): WRK columns to write as labels.
+
+        Returns:
+            Does not return a parameter
+
+        Raises:
+            ValueError: if the matrix already exists
+        '''
+        if self.dct_manifest is not None:
+            raise ValueError(f'A feature matrix already exists in {self.path}')
+
+        os.makedirs(self.path, exist_ok=True)
+        lst_features = [col for col in lst_features if col not in lst_labels]
+        self.dct_manifest = {'version': MATRIX_VERSION,
+                             'features': [{'name': col, 'kind': feature_kind(col)} for col in lst_features],
+                             'labels': list(lst_labels),
+                             'keys': KEY_COLS,
+                             'rows': 0,
+                             'dates': {}}
+        self.dct_codes = {col: [] for col in lst_features if feature_kind(col) == 'code'}
+        for name in ARRAYS:
+            self._resize(name, 0)
+        self._save()
+
+    def _columns(self, name):
+        '''Returns the columns of one of ARRAYS.'''
+        if name == 'features':
+            return [dct_feature['name'] for dct_feature in self.dct_manifest['features']]
+        return self.dct_manifest[name]
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def encode(self, df_wrk):
+        '''Encodes WRK rows as the matrix's float32 features and labels and
+        int64 keys, adding values not seen before to the code tables.
+
+        Args:
+            df_wrk(DataFrame): WRK rows with every feature, label and key column.
+
+        Returns:
+            dict: {'features': array, 'labels': array, 'keys': array}
+
+        Raises:
+            KeyError: if a column of the matrix is missing from df_wrk
+        '''
+        arr_features = np.empty((len(df_wrk), len(self.dct_manifest['features'])), dtype=np.float32)
+        for f, dct_feature in enumerate(self.dct_manifest['features']):
+            srs = df_wrk[dct_feature['name']]
+            if dct_feature['kind'] == 'code':
+                arr_codes, uniques = pd.factorize(srs)
+                lst_uniques = [str(v) for v in uniques]
+                lst_table = self.dct_codes[dct_feature['name']]
+                dct_table = {v: c for c, v in enumerate(lst_table)}
+                for v in sorted(set(lst_uniques) - set(dct_table)):
+                    dct_table[v] = len(lst_table)
+                    lst_table.append(v)
+                arr_lookup = np.array([dct_table[v] for v in lst_uniques] + [np.nan], dtype=np.float32)
+                arr_features[:, f] = arr_lookup[arr_codes]
+            elif dct_feature['kind'] == 'days':
+                arr_days = pd.to_datetime(srs).to_numpy(dtype='datetime64[D]')
+                arr_features[:, f] = np.where(np.isnat(arr_days), np.nan, arr_days.astype(np.int64))
+            else:
+                arr_features[:, f] = pd.to_numeric(srs).to_numpy(dtype=np.float32, na_value=np.nan)
+
+        arr_labels = np.empty((len(df_wrk), len(self.dct_manifest['labels'])), dtype=np.float32)
+        for l, col in enumerate(self.dct_manifest['labels']):
+            arr_labels[:, l] = pd.to_numeric(df_wrk[col]).to_numpy(dtype=np.float32, na_value=np.nan)
+        arr_keys = np.empty((len(df_wrk), len(KEY_COLS)), dtype=np.int64)
+        for k, col in enumerate(KEY_COLS):
+            arr_keys[:, k] = pd.to_numeric(df_wrk[col]).to_numpy(dtype=np.int64, na_value=-1)
+
+        return {'features': arr_features, 'labels': arr_labels, 'keys': arr_keys}
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def _resize(self, name, rows):
+        '''Sets the number of rows of an array file, cutting off rows after
+        them. The rows before are left in place, only the header changes.'''
+        file_name, dtype = ARRAYS[name]
+        path = self.array_path(name)
+        ncols = len(self._columns(name))
+        header = _npy_header((rows, ncols), dtype)
+
+        if os.path.exists(path):
+            shape, offset = _npy_offset(path)
+            if offset != len(header):
+                # The header grew past its padding: move the rows to a new file.
+                arr_old = np.load(path, mmap_mode='r')
+                tmp_path = f'{path}.tmp'
+                with open(tmp_path, 'wb') as f:
+                    f.write(header)
+                    for r in range(0, min(rows, shape[0]), 100000):
+                        f.write(np.ascontiguousarray(arr_old[r:min(rows, r + 100000)]).tobytes())
+                del arr_old
+                os.replace(tmp_path, path)
+                return
+
+        with open(path, 'r+b' if os.path.exists(path) else 'w+b') as f:
+            f.write(header)
+            f.truncate(len(header) + rows * ncols * np.dtype(dtype).itemsize)
+
+    def _write_rows(self, name, start, arr):
+        '''Writes rows into an array file from row start, growing the file.'''
+        file_name, dtype = ARRAYS[name]
+        ncols = len(self._columns(name))
+        shape, offset = _npy_offset(self.array_path(name))
+        with open(self.array_path(name), 'r+b') as f:
+            f.seek(offset + start * ncols * np.dtype(dtype).itemsize)
+            f.write(np.ascontiguousarray(arr, dtype=dtype).tobytes())
+
+    def _save(self):
+        '''Writes the code tables, then the manifest, each under a temporary
+        name renamed into place. The manifest's row count is what the matrix
+        holds; rows written after it are cut off by the next append().'''
+        self.dct_manifest['updated_at'] = datetime.now().isoformat(timespec='seconds')
+        for file_name, obj in [('codes.json', self.dct_codes), ('manifest.json', self.dct_manifest)]:
+            path = os.path.join(self.path, file_name)
+            with open(f'{path}.tmp', 'w') as f:
+                ujson.dump(obj, f)
+            os.replace(f'{path}.tmp', path)
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def truncate(self, date):
+        '''Removes the rows of a date and every later date.
+
+        Args:
+            date(str): The first date to remove, formatted 'yyyy-mm-dd'.
+
+        Returns:
+            int: Rows removed.
+
+        Raises:
+            No exceptions
+        '''
+        dct_dates = self.dct_manifest['dates']
+        lst_removed = [d for d in dct_dates if d >= date]
+        if not lst_removed:
+            return 0
+
+        rows = min(dct_dates[d][0] for d in lst_removed)
+        removed = self.dct_manifest['rows'] - rows
+        for d in lst_removed:
+            del dct_dates[d]
+        self.dct_manifest['rows'] = rows
+        for name in ARRAYS:
+            self._resize(name, rows)
+        self._save()
+
+        return removed
+
+    def append(self, df_wrk):
+        '''Encodes WRK rows and adds them after the existing rows.
+
+        The rows must be in date order and come after the dates already in
+        the matrix (see truncate() to replace the latest dates).
+
+        Args:
+            df_wrk(DataFrame): WRK rows with every column of the matrix.
+
+        Returns:
+            int: Rows added.
+
+        Raises:
+            ValueError: if the rows are not in date order after the matrix
+        '''
+        if len(df_wrk) == 0:
+            return 0
+
+        arr_dates = pd.to_datetime(df_wrk['Game_Date']).dt.strftime('%Y-%m-%d').to_numpy()
+        if (arr_dates[1:] < arr_dates[:-1]).any():
+            raise ValueError('WRK rows must be in date order')
+        dct_dates = self.dct_manifest['dates']
+        if self.last_date is not None and arr_dates[0] < self.last_date:
+            raise ValueError(f'{arr_dates[0]} is before {self.last_date}, the latest date in the matrix')
+
+        start = self.dct_manifest['rows']
+        for name in ARRAYS:
+            self._resize(name, start)
+        dct_arrays = self.encode(df_wrk)
+        for name, arr in dct_arrays.items():
+            self._write_rows(name, start, arr)
+            self._resize(name, start + len(df_wrk))
+
+        lst_dates, arr_first = np.unique(arr_dates, return_index=True)
+        arr_stop = np.append(arr_first[1:], len(arr_dates))
+        for date, first, stop in zip(lst_dates, arr_first, arr_stop):
+            first_row = dct_dates[date][0] if date in dct_dates else start + int(first)
+            dct_dates[date] = [first_row, start + int(stop)]
+        self.dct_manifest['rows'] = start + len(df_wrk)
+        self._save()
+
+        return len(df_wrk)
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def build(self, analyzer, start=None, end=None, batch_rows=None):
+        '''Extends the matrix with the WRK rows from start to end, streamed
+        from the database a batch at a time by Statcast_Analyze.iter_wrk().
+
+        Dates from start on that are already in the matrix are removed and
+        encoded again, so re-running a day replaces it. By default the matrix
+        is extended from the day after its latest date.
+
+        Args:
+            analyzer(Statcast_Analyze): Reads the WRK tables.
+            start(str): First date, formatted 'yyyy-mm-dd'. Defaults to the
+                        day after the latest date in the matrix, or every
+                        season for a new matrix.
+            end(str): Last date, formatted 'yyyy-mm-dd'. Defaults to the
+                      latest date in the database.
+            batch_rows(int): Rows read and encoded at a time.
+
+        Returns:
+            int: Rows added.
+
+        Raises:
+            ValueError: if the matrix does not exist
+        '''
+        if self.dct_manifest is None:
+            raise ValueError(f'No feature matrix in {self.path}, call create() first')
+
+        if start is None and self.last_date is not None:
+            start = (pd.Timestamp(self.last_date) + pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+        elif start is not None:
+            self.truncate(start)
+
+        lst_columns = list(dict.fromkeys(['Game_Date'] + KEY_COLS + self._columns('features') +
+                                         self._columns('labels')))
+        added = 0
+        for df in analyzer.iter_wrk(lst_columns, start, end, sort=True, chunk_rows=batch_rows):
+            added += self.append(df)
+
+        return added
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def load(self, mmap_mode='r'):
+        '''Returns the features, labels and keys as memory-mapped arrays.
+
+        Args:
+            mmap_mode(str): np.load() mmap_mode, 'r' for read only.
+
+        Returns:
+            tuple: (features, labels, keys)
+
+        Raises:
+            ValueError: if the matrix does not exist
+        '''
+        if self.dct_manifest is None:
+            raise ValueError(f'No feature matrix in {self.path}')
+
+        return tuple(np.load(self.array_path(name), mmap_mode=mmap_mode) for name in ARRAYS)
+
+    def date_rows(self, date):
+        '''Returns the slice of rows that hold a date, or None.'''
+        lst_range = self.dct_manifest['dates'].get(date)
+
+        return slice(*lst_range) if lst_range else None
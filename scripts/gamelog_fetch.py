@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import logging
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from io import StringIO
+
+import pandas as pd
+
+
+GAMELOG_URL = 'https://www.baseball-reference.com/players/gl.fcgi?id={brefid}&t=b&year={year}'
+
+# HTTP statuses worth retrying; anything else (e.g. 404) fails immediately.
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class RateLimiter():
+    '''
+    Spaces out requests to each host so no host sees more than
+    requests_per_minute, no matter how many threads are fetching.
+
+    Args:
+        requests_per_minute(float): The per-host request limit.
+
+    '''
+    def __init__(self, requests_per_minute):
+
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self.lock = threading.Lock()
+        self.dct_next_slot = {}
+
+    def wait(self, host):
+        '''Blocks until the next request slot for the host.'''
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.dct_next_slot.get(host, now))
+            self.dct_next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def defer(self, host, seconds):
+        '''Pushes the host's next slot back, e.g. after a 429 with Retry-After.'''
+        with self.lock:
+            self.dct_next_slot[host] = max(self.dct_next_slot.get(host, 0.0), time.monotonic() + seconds)
+
+
+class GamelogFetcher():
+    '''
+    Downloads baseball-reference.com batting game logs concurrently.
+
+    A thread pool capped at 'concurrency' does the HTTP requests, a shared
+    RateLimiter keeps each host under its request limit, and failed requests
+    are retried with exponential backoff and jitter. The fetch threads only
+    download; the pages are handed back as they complete so the caller can
+    parse them while the remaining downloads continue.
+
+    The limit is per host, and every game log comes from the same host, so
+    the scrape never goes faster than requests_per_minute, whatever the
+    concurrency. The threads keep a slot from going unused while a slow
+    response is read, and overlap the downloads with the caller's parsing;
+    more threads only help when pages are requested from several hosts or
+    the limit is raised.
+
+    Args:
+        concurrency(int): Maximum number of requests in flight.
+        requests_per_minute(float): Per-host request limit. baseball-reference
+                                    blocks clients that go over ~20/minute.
+        retries(int): Number of retries after the first attempt.
+        backoff(float): Base delay in seconds, doubled after each retry.
+        timeout(float): Socket timeout per request, in seconds.
+        url_template(str): Game log URL with {brefid} and {year} fields. Can be
+                           pointed at a local server serving recorded pages.
+
+    Attributes:
+        retry_count(int): Number of retried requests so far, for run metrics.
+
+    '''
+    def __init__(self, concurrency=4, requests_per_minute=20, retries=3, backoff=2.0, timeout=30,
+                 url_template=GAMELOG_URL):
+
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.url_template = url_template
+        self.limiter = RateLimiter(requests_per_minute)
+        self.retry_count = 0
+        self.lock = threading.Lock()
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def fetch(self, url):
+        '''Downloads one page, retrying transient failures.
+
+        Args:
+            url(str): The page to download.
+
+        Returns:
+            str: The page's HTML, or None if it could not be downloaded.
+
+        Raises:
+            No exceptions
+        '''
+        host = urllib.parse.urlsplit(url).netloc
+        request = urllib.request.Request(url, headers={'User-Agent': 'mlb-statcast-ml'})
+
+        for attempt in range(0, self.retries + 1):
+            self.limiter.wait(host)
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    return response.read().decode('utf-8', errors='replace')
+            except urllib.error.HTTPError as e:
+                if e.code not in RETRY_STATUS:
+                    logging.warning(f'HTTP {e.code}: {url}')
+                    return None
+                retry_after = e.headers.get('Retry-After')
+                if retry_after and retry_after.isdigit():
+                    self.limiter.defer(host, int(retry_after))
+                logging.warning(f'HTTP {e.code} (attempt {attempt + 1}): {url}')
+            except (urllib.error.URLError, OSError) as e:
+                logging.warning(f'{e} (attempt {attempt + 1}): {url}')
+
+            if attempt < self.retries:
+                with self.lock:
+                    self.retry_count += 1
+                time.sleep(self.backoff * 2**attempt * (1 + random.random()))
+
+        logging.error(f'Giving up after {self.retries + 1} attempts: {url}')
+
+        return None
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def iter_gamelogs(self, lst_brefid, year):
+        '''Fetches the game log of each player for a season, yielding the pages
+        in the order they finish downloading.
+
+        Args:
+            lst_brefid(list): baseball-reference player IDs.
+            year(str): The season.
+
+        Returns:
+            generator: (brefid, html) tuples, html is None on failure.
+
+        Raises:
+            No exceptions
+        '''
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            dct_futures = {executor.submit(self.fetch, self.url_template.format(brefid=brefid, year=year)): brefid
+                           for brefid in lst_brefid}
+            for future in as_completed(dct_futures):
+                yield dct_futures[future], future.result()
+
+
+def parse_last_game(html, year):
+    '''Parses the most recent game from a batting game log page.
+
+    Args:
+        html(str): The game log page.
+        year(str): The season of the game log.
+
+    Returns:
+        DataFrame: One row with the 'Date' (yyyy-mm-dd), 'BOP' and 'Pos' of
+                   the player's last game.
+
+    Raises:
+        ValueError: if the page does not contain a game log table
+    '''
+    df = pd.read_html(StringIO(html))[4][['Date', 'BOP', 'Pos']]
+
+    df.drop(df.index[0:-2], inplace=True)
+    df.drop(df.index[-1], inplace=True)
+
+    df['Date'] = df.Date.map(str) + " " + year
+    df.drop(df[df['Date'].str.contains('Date')].index, inplace=True)
+    df.drop(df[df['Date'].str.contains('nan')].index, inplace=True)
+    df = df.reset_index(drop=True)
+
+    df['Date'] = df['Date'].str.replace('(1)', '', regex=False)
+    df['Date'] = df['Date'].str.replace('(2)', '', regex=False)
+    df['Date'] = df['Date'].str.replace('susp', '', regex=False)
+    df.loc[0, 'Date'] = datetime.strptime(df.loc[0, 'Date'].strip(), '%b %d %Y').strftime('%Y-%m-%d')
+
+    return df
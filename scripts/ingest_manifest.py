@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import inspect, text
+
+
+MANIFEST_TABLE = 'ingest_manifest'
+
+# Statuses written to the manifest. 'started' is recorded before an insert so
+# a crash mid-insert leaves a marker that the date's rows need to be cleared.
+STATUS_STARTED = 'started'
+STATUS_COMPLETE = 'complete'
+STATUS_EMPTY = 'empty'
+STATUS_FAILED = 'failed'
+
+
+def create_manifest(engine):
+    '''Creates the ingestion manifest table if it does not exist.
+
+    Args:
+        engine(Engine): The database engine.
+
+    Returns:
+        Does not return a parameter
+
+    Raises:
+        No exceptions
+    '''
+    if inspect(engine).has_table(MANIFEST_TABLE):
+        return
+
+    with engine.begin() as conn:
+        conn.execute(text(f'''CREATE TABLE {MANIFEST_TABLE} (
+                                  Game_Date VARCHAR(10) NOT NULL,
+                                  Table_Name VARCHAR(64) NOT NULL,
+                                  Row_Count INTEGER,
+                                  Status VARCHAR(16) NOT NULL,
+                                  Duration_Sec FLOAT,
+                                  Updated_At VARCHAR(26))'''))
+
+
+def record_manifest(engine, date, table, status, row_count=0, duration=0.0):
+    '''Records the outcome of loading one date into one table, replacing any
+    earlier entry for the same (date, table).
+
+    Args:
+        engine(Engine): The database engine.
+        date(str): The date loaded, formatted 'yyyy-mm-dd'.
+        table(str): The table the date was loaded into.
+        status(str): One of the STATUS_* values.
+        row_count(int): Number of rows inserted.
+        duration(float): Seconds the insert took.
+
+    Returns:
+        Does not return a parameter
+
+    Raises:
+        No exceptions
+    '''
+    dct_params = {'date': date,
+                  'table': table,
+                  'rows': int(row_count),
+                  'status': status,
+                  'duration': float(duration),
+                  'updated': datetime.now().isoformat(timespec='seconds')}
+
+    with engine.begin() as conn:
+        conn.execute(text(f'DELETE FROM {MANIFEST_TABLE} WHERE Game_Date = :date AND Table_Name = :table'),
+                     dct_params)
+        conn.execute(text(f'''INSERT INTO {MANIFEST_TABLE} (Game_Date, Table_Name, Row_Count, Status, Duration_Sec, Updated_At)
+                              VALUES (:date, :table, :rows, :status, :duration, :updated)'''),
+                     dct_params)
+
+
+def read_manifest(engine):
+    '''Reads the status of every (date, table) in the manifest.
+
+    Args:
+        engine(Engine): The database engine.
+
+    Returns:
+        dict: {(date, table): status}
+
+    Raises:
+        No exceptions
+    '''
+    if not inspect(engine).has_table(MANIFEST_TABLE):
+        return {}
+
+    with engine.connect() as conn:
+        df = pd.read_sql(text(f'SELECT Game_Date, Table_Name, Status FROM {MANIFEST_TABLE}'), conn)
+
+    return dict(zip(zip(df['Game_Date'], df['Table_Name']), df['Status']))
+
+
+def failed_dates(engine, table):
+    '''Returns the dates the manifest shows as failed for a table, an empty
+    list if there is no manifest.
+
+    Args:
+        engine(Engine): The database engine.
+        table(str): The table.
+
+    Returns:
+        list: The dates, formatted 'yyyy-mm-dd'.
+
+    Raises:
+        No exceptions
+    '''
+    if not inspect(engine).has_table(MANIFEST_TABLE):
+        return []
+
+    with engine.connect() as conn:
+        return [row[0] for row in conn.execute(text(f'''SELECT Game_Date FROM {MANIFEST_TABLE}
+                                                       WHERE Table_Name = :table AND Status = :status'''),
+                                               {'table': table, 'status': STATUS_FAILED})]
+
+
+def is_date_done(dct_manifest, date, lst_tables):
+    '''Returns True if the date was loaded into every table, or had no data.'''
+    lst_status = [dct_manifest.get((date, table)) for table in lst_tables]
+
+    return (all(status == STATUS_COMPLETE for status in lst_status)
+            or all(status == STATUS_EMPTY for status in lst_status))
+
+
+def delete_date_rows(engine, table, date_col, date):
+    '''Deletes the rows for a single date from a table, so a date whose
+    earlier load failed part way through can be reloaded without duplicates.
+
+    The date is matched as a half-open range so it works whether the column
+    is stored as a DATETIME or as text.
+
+    Args:
+        engine(Engine): The database engine.
+        table(str): The table to delete from.
+        date_col(str): The date column, 'game_date' for RAW or 'Game_Date'
+                       for WRK tables.
+        date(str): The date, formatted 'yyyy-mm-dd'.
+
+    Returns:
+        Does not return a parameter
+
+    Raises:
+        No exceptions
+    '''
+    if not inspect(engine).has_table(table):
+        return
+
+    next_date = (pd.Timestamp(date) + pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+    with engine.begin() as conn:
+        conn.execute(text(f'DELETE FROM {table} WHERE {date_col} >= :start AND {date_col} < :end'),
+                     {'start': date, 'end': next_date})
+
+
+def plan_dates(dct_manifest, lst_dates, resume=False, refresh=False):
+    '''Decides which dates a build loads, from what the manifest shows.
+
+    A date the manifest shows as loaded (or as having no data) is skipped,
+    and a date it has no entry for is loaded. A date whose last load failed
+    or was interrupted is retried only when resuming; otherwise it is left
+    as it is. With refresh every date is loaded again, and its manifest
+    entries are set to started so the writers delete its rows first.
+
+    Args:
+        dct_manifest(dict): {(date, table): status} from read_manifest().
+                            Updated in place when refresh is True.
+        lst_dates(list): The requested dates, formatted 'yyyy-mm-dd'.
+        resume(bool): Retry the dates that failed or were interrupted.
+        refresh(bool): Load every date again, replacing the loaded ones.
+
+    Returns:
+        tuple: (list of dates to load, {'done': dates skipped as loaded,
+               'unfinished': failed or interrupted dates skipped})
+
+    Raises:
+        No exceptions
+    '''
+    lst_load = []
+    dct_skipped = {'done': [], 'unfinished': []}
+    for date in lst_dates:
+        lst_tables = [f'raw_statcast_{date[:4]}', f'wrk_statcast_{date[:4]}']
+        lst_status = [dct_manifest.get((date, table)) for table in lst_tables]
+        if refresh:
+            for table, status in zip(lst_tables, lst_status):
+                if status is not None:
+                    dct_manifest[(date, table)] = STATUS_STARTED
+            lst_load.append(date)
+        elif is_date_done(dct_manifest, date, lst_tables):
+            dct_skipped['done'].append(date)
+        elif all(status is None for status in lst_status) or resume:
+            lst_load.append(date)
+        else:
+            dct_skipped['unfinished'].append(date)
+
+    return lst_load, dct_skipped
@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import glob
+import os
+import re
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import ujson
+
+
+STORE_VERSION = 1
+
+# Defaults used by Statcast_DB when a batter is not in a season's dictionary.
+MISSING_POS = 'P'
+MISSING_BOP = 9
+
+
+def _player_date_key(player_ids, day_ordinals):
+    '''Packs player keys and date ordinals into one sortable int64 key.'''
+    return (np.asarray(player_ids, dtype=np.int64) << 32) | np.asarray(day_ordinals, dtype=np.int64)
+
+
+def _player_year_key(player_ids, years):
+    '''Packs player keys and seasons into one sortable int64 key.'''
+    return (np.asarray(player_ids, dtype=np.int64) << 16) | np.asarray(years, dtype=np.int64)
+
+
+def _day_ordinals(dates):
+    '''Converts dates (strings, datetimes or Timestamps) to days since 1970-01-01.'''
+    return pd.to_datetime(pd.Series(dates).astype(str).str[:10], format='%Y-%m-%d', errors='coerce').to_numpy(dtype='datetime64[D]').astype(np.int64)
+
+
+def compile_lookup_store(parent_path, out_path=None):
+    '''Compiles every season of the position, batting order and sprint speed
+    JSON dictionaries into a compact, memory-mappable array store.
+
+    The nested {name: {date: value}} dictionaries become flat, sorted NumPy
+    arrays: each player name is replaced by an integer key, each date by its
+    day ordinal, and each position/batting order string by a small integer
+    code into a code table. A second sorted array records which players
+    appear in which season, so a lookup can tell a player who is missing
+    from a season apart from a missing date, the same way the dictionaries do.
+
+    Files written to out_path:
+        players.json                    player names, the index is the key
+        pos_codes.json, bop_codes.json  code tables for the values
+        {kind}_key.npy, {kind}_code.npy sorted (player, date) keys and codes
+        {kind}_present.npy              sorted (player, season) keys
+        ss_key.npy, ss_value.npy        sorted (player, season) keys and speeds
+        meta.json                       version and source files
+
+    Args:
+        parent_path(str): The project folder that holds /dicts.
+        out_path(str): Where to write the store. Defaults to
+                       {parent_path}/dicts/lookup_store.
+
+    Returns:
+        str: The path of the store.
+
+    Raises:
+        No exceptions
+    '''
+    out_path = out_path or f'{parent_path}/dicts/lookup_store'
+    os.makedirs(out_path, exist_ok=True)
+
+    dct_sources = {}
+    for kind in ['pos', 'bop', 'ss']:
+        lst_files = sorted(glob.glob(f'{parent_path}/dicts/dct_{kind}_*.txt'))
+        dct_sources[kind] = {int(re.search(r'_(\d{4})\.txt$', f).group(1)): f
+                             for f in lst_files if re.search(r'_(\d{4})\.txt$', f)}
+
+    dct_data = {kind: {year: ujson.load(open(path)) for year, path in dct_years.items()}
+                for kind, dct_years in dct_sources.items()}
+
+    set_names = set()
+    for dct_years in dct_data.values():
+        for dct in dct_years.values():
+            set_names.update(dct.keys())
+    lst_players = sorted(set_names)
+    dct_player_key = {name: p for p, name in enumerate(lst_players)}
+
+    for kind in ['pos', 'bop']:
+        lst_codes = []
+        dct_code = {}
+        lst_player, lst_date, lst_value, lst_present_player, lst_present_year = [], [], [], [], []
+        for year, dct in dct_data[kind].items():
+            for name, dct_dates in dct.items():
+                lst_present_player.append(dct_player_key[name])
+                lst_present_year.append(year)
+                for date, value in dct_dates.items():
+                    if value not in dct_code:
+                        dct_code[value] = len(lst_codes)
+                        lst_codes.append(value)
+                    lst_player.append(dct_player_key[name])
+                    lst_date.append(date)
+                    lst_value.append(dct_code[value])
+
+        arr_key = _player_date_key(lst_player, _day_ordinals(lst_date) if lst_date else [])
+        arr_order = np.argsort(arr_key, kind='stable')
+        np.save(f'{out_path}/{kind}_key.npy', arr_key[arr_order])
+        np.save(f'{out_path}/{kind}_code.npy', np.asarray(lst_value, dtype=np.int16)[arr_order])
+        np.save(f'{out_path}/{kind}_present.npy', np.unique(_player_year_key(lst_present_player, lst_present_year)))
+        ujson.dump(lst_codes, open(f'{out_path}/{kind}_codes.json', 'w'))
+
+    lst_ss_key, lst_ss_value = [], []
+    for year, dct in dct_data['ss'].items():
+        for name, value in dct.items():
+            lst_ss_key.append(_player_year_key(dct_player_key[name], year))
+            lst_ss_value.append(np.nan if value is None else value)
+    arr_ss_key = np.asarray(lst_ss_key, dtype=np.int64)
+    arr_order = np.argsort(arr_ss_key, kind='stable')
+    np.save(f'{out_path}/ss_key.npy', arr_ss_key[arr_order])
+    np.save(f'{out_path}/ss_value.npy', np.asarray(lst_ss_value, dtype=np.float64)[arr_order])
+
+    ujson.dump(lst_players, open(f'{out_path}/players.json', 'w'))
+    ujson.dump({'version': STORE_VERSION,
+                'compiled_at': datetime.now().isoformat(timespec='seconds'),
+                'sources': {kind: {str(year): os.path.basename(path) for year, path in dct_years.items()}
+                            for kind, dct_years in dct_sources.items()}},
+               open(f'{out_path}/meta.json', 'w'))
+
+    print(f'Lookup store compiled: {len(lst_players)} players -> {out_path}')
+
+    return out_path
+
+
+class LookupStore():
+    '''
+    Read access to a store written by compile_lookup_store().
+
+    The arrays are opened memory-mapped, so loading the store only parses
+    the player and code tables, and worker processes share the pages.
+    Lookups are vectorized over whole columns and return the same values the
+    per-season JSON dictionaries would.
+
+    Args:
+        path(str): The store directory.
+
+    Attributes:
+        idx_players(Index): Player names, positioned by their integer key.
+
+    '''
+    def __init__(self, path):
+
+        self.path = path
+        self.idx_players = pd.Index(ujson.load(open(f'{path}/players.json')))
+        self.dct_arrays = {}
+        self.dct_codes = {}
+        for kind in ['pos', 'bop']:
+            for part in ['key', 'code', 'present']:
+                self.dct_arrays[f'{kind}_{part}'] = np.load(f'{path}/{kind}_{part}.npy', mmap_mode='r')
+            self.dct_codes[kind] = np.array(ujson.load(open(f'{path}/{kind}_codes.json')) + [None], dtype=object)
+        for part in ['key', 'value']:
+            self.dct_arrays[f'ss_{part}'] = np.load(f'{path}/ss_{part}.npy', mmap_mode='r')
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def __getstate__(self):
+        '''Only the path is pickled, each process maps the arrays itself.'''
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    @staticmethod
+    def _search(arr_sorted, arr_keys):
+        '''Returns (positions, found) for each key in a sorted key array.'''
+        if len(arr_sorted) == 0:
+            return np.zeros(len(arr_keys), dtype=np.int64), np.zeros(len(arr_keys), dtype=bool)
+        arr_pos = np.searchsorted(arr_sorted, arr_keys).clip(0, len(arr_sorted) - 1)
+
+        return arr_pos, arr_sorted[arr_pos] == arr_keys
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def lookup_game(self, kind, names, dates, missing_player):
+        '''Looks up a per-game value for each (player name, date) pair.
+
+        Args:
+            kind(str): 'pos' or 'bop'.
+            names(Series): Player names.
+            dates(Series): Game dates.
+            missing_player: Value for players not in that season's dictionary.
+
+        Returns:
+            ndarray: Object array with the value for each row, None where the
+                     player is in the season but has no entry for the date.
+
+        Raises:
+            No exceptions
+        '''
+        arr_player = self.idx_players.get_indexer(pd.Series(names).astype(object))
+        arr_days = _day_ordinals(dates)
+        arr_years = arr_days.astype('datetime64[D]').astype('datetime64[Y]').astype(np.int64) + 1970
+
+        _, arr_present = self._search(self.dct_arrays[f'{kind}_present'], _player_year_key(arr_player, arr_years))
+        arr_present &= arr_player >= 0
+        arr_pos, arr_found = self._search(self.dct_arrays[f'{kind}_key'], _player_date_key(arr_player, arr_days))
+
+        arr_codes = np.where(arr_found & arr_present, self.dct_arrays[f'{kind}_code'][arr_pos], -1)
+        arr_values = self.dct_codes[kind][arr_codes]
+        arr_values[~arr_present] = missing_player
+
+        return arr_values
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def lookup_ss(self, names, year):
+        '''Looks up each player's sprint speed for a season.
+
+        Args:
+            names(Series): Player names.
+            year(int): The season.
+
+        Returns:
+            ndarray: Float array of speeds, NaN where there is no entry.
+
+        Raises:
+            No exceptions
+        '''
+        arr_player = self.idx_players.get_indexer(pd.Series(names).astype(object))
+        arr_pos, arr_found = self._search(self.dct_arrays['ss_key'], _player_year_key(arr_player, np.full(len(arr_player), int(year))))
+        arr_found &= arr_player >= 0
+
+        return np.where(arr_found, self.dct_arrays['ss_value'][arr_pos], np.nan)
+
+
+if __name__ == '__main__':
+    import yaml
+
+    with open('config.yaml', 'r') as yamlfile:
+        lst_config = yaml.load(yamlfile, Loader=yaml.FullLoader)
+    parent_path = [section['Paths'] for section in lst_config if 'Paths' in section][0]['parent_path']
+
+    compile_lookup_store(parent_path)
@@ -3,14 +3,33 @@
 
 import pandas as pd
 import numpy as np
-import urllib
-from sqlalchemy import create_engine
-from pybaseball import statcast
 from datetime import datetime
-import tkinter as tk
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 import logging
+import os
 import ujson
 import yaml
+from db_loader import create_db_engine, insert_df, upsert_df, add_missing_columns
+from db_indexes import create_indexes, drop_indexes, year_tables
+from statcast_cache import DiskCache, raw_statcast_key
+from lookup_store import LookupStore, MISSING_POS, MISSING_BOP
+from gamelog_fetch import GamelogFetcher, parse_last_game
+from player_map import load_player_map, player_id_names
+from run_metrics import RunMetrics, frame_bytes
+from statcast_dtypes import type_raw_frame
+from rollups import ROLLUPS, rollup_table, update_rollups, check_rollup, rebuild_rollup
+from wrk_export import pyarrow_installed, write_partition, export_wrk
+from player_form import DEFAULT_GAMES, DEFAULT_PAS, form_table, update_form, rebuild_form
+from transform_registry import BASE_STEPS, CNT_EVENT_COLS, CNT_EVENT_FLAGS, CNT_EVENT_DESC_FLAGS, EVENT_OUTS, plan_steps
+from table_watermarks import bump_watermark
+from ingest_manifest import (create_manifest, record_manifest, read_manifest, plan_dates, delete_date_rows, failed_dates,
+                             STATUS_STARTED, STATUS_COMPLETE, STATUS_EMPTY, STATUS_FAILED)
+
+
+# The columns that identify a pitch in the RAW and WRK tables, the keys
+# stream_data() upserts on.
+PITCH_KEYS = {'raw': ['game_pk', 'at_bat_number', 'pitch_number'],
+              'wrk': ['Game_ID', 'PA_Num', 'Pitch_Num']}
 
 
 class Statcast_DB():
@@ -22,14 +41,15 @@ class Statcast_DB():
     new data through the pipeline during in-season.
 
     Args:
-        None
+        config_path(str): The config.yaml file.
 
     Attributes:
         playerMap(DataFrame): A map containing info for all players to be
-                              used for data transformation.
-        dct_playerIDs(Dictionary): Dictionary with the player MLB IS as the
-                                   key, and the player MLB Full Name as the
-                                   value.
+                              used for data transformation. Loaded on first
+                              use from the local snapshot (see player_map.py).
+        dct_playerIDs(Dictionary): Dictionary with the player MLB ID (int) as
+                                   the key, and the player MLB Full Name as the
+                                   value. Loaded on first use.
         team_atts(DataFrame): A csv file that contains descriptive information
                               for each team; Ball park for each year, league,
                               and division.
@@ -37,27 +57,89 @@ class Statcast_DB():
                                      the league as the value.
         dct_team_division(Dictionary): A dictionary with the team as the key and
                                       the division as the value.
+        cache(DiskCache): Local cache of raw statcast pulls, configured by the
+                          'Cache' section of config.yaml.
+        refresh_cache(bool): If True, raw pulls skip the cache and re-download.
+        lookup_store(LookupStore): Compiled position/batting order/sprint speed
+                                   store used in place of the per-year JSON
+                                   dictionaries, or None if not configured.
+        metrics(RunMetrics): Per-date, per-stage timings written as JSON lines,
+                             configured by the 'Metrics' section of config.yaml.
 
     '''
-    def __init__(self):
+    def __init__(self, config_path='config.yaml'):
 
-        with open('config.yaml', 'r') as yamlfile:
+        with open(config_path, 'r') as yamlfile:
             self.lst_config = yaml.load(yamlfile, Loader=yaml.FullLoader)
 
-        self.parent_path = self.lst_config[3]['Paths']['parent_path']
-        self.playerMap = pd.read_csv('https://www.smartfantasybaseball.com/PLAYERIDMAPCSV',
-                                     usecols=['MLBID', 'MLBNAME', 'BREFID', 'POS', 'PLAYERNAME'],
-                                     dtype={'MLBID': 'category', 'MLBNAME': 'category'},
-                                     skiprows=[2604+1])
-        self.dct_playerIDs = dict(zip(self.playerMap['MLBID'].astype(float), self.playerMap['MLBNAME']))
+        self.parent_path = self.get_config_section('Paths')['parent_path']
+        self._playerMap = None
+        self._dct_playerIDs = None
         self.team_atts = pd.read_csv(f'{self.parent_path}/csv/team_atts.csv')
         self.dct_team_league = dict(zip(self.team_atts['Team'], self.team_atts['League']))
         self.dct_team_division = dict(zip(self.team_atts['Team'], self.team_atts['Division']))
 
+        dct_cache = self.get_config_section('Cache')
+        self.cache = DiskCache(dct_cache.get('path', f'{self.parent_path}/cache/statcast'),
+                               max_bytes=int(dct_cache.get('max_gb', 5) * 1024**3))
+        self.cache.enabled = self.cache.enabled and dct_cache.get('enabled', True)
+        self.refresh_cache = False
+
+        store_path = self.get_config_section('Lookups').get('store')
+        self.lookup_store = LookupStore(store_path) if store_path and os.path.isdir(store_path) else None
+
+        dct_metrics = self.get_config_section('Metrics')
+        self.metrics = RunMetrics(dct_metrics.get('path', f'{self.parent_path}/logs/metrics.jsonl'),
+                                  enabled=dct_metrics.get('enabled', True))
 
         print('To Build an initial Database, call build_db()')
         print('To append date(s) into Database, call stream_data("yyyy-mm-dd")')
 
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def get_config_section(self, name):
+        '''Returns a named section of config.yaml, or an empty dictionary if the
+        section is not in the file.
+
+        Args:
+            name(str): The section name, e.g. 'Build'.
+
+        Returns:
+            dict: The settings in the section.
+
+        Raises:
+            No exceptions
+        '''
+        for section in self.lst_config:
+            if name in section:
+                return section[name] or {}
+
+        return {}
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    @property
+    def playerMap(self):
+        '''The PlayerID Map, read from the local snapshot the first time it is
+        needed. The snapshot is re-downloaded when it is older than the
+        'ttl_days' of the 'PlayerMap' section of config.yaml.
+        '''
+        if getattr(self, '_playerMap', None) is None:
+            dct_map = self.get_config_section('PlayerMap')
+            self._playerMap = load_player_map(dct_map.get('path', f'{self.parent_path}/csv/playeridmap.csv'),
+                                              ttl_days=dct_map.get('ttl_days', 7),
+                                              refresh=dct_map.get('refresh', False))
+
+        return self._playerMap
+
+    @property
+    def dct_playerIDs(self):
+        '''{MLB ID: MLB Full Name}, built from playerMap the first time it is needed.'''
+        if getattr(self, '_dct_playerIDs', None) is None:
+            self._dct_playerIDs = player_id_names(self.playerMap)
+
+        return self._dct_playerIDs
+
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
     def get_variables_mssql(self):
@@ -118,6 +200,8 @@ class Statcast_DB():
         Raises:
             No exceptions
         '''
+        import tkinter as tk
+
         self.window.destroy()
         self.window = tk.Tk()
         self.window.geometry('500x180')
@@ -200,6 +284,8 @@ class Statcast_DB():
         Raises:
             No exceptions
         '''
+        import tkinter as tk
+
         self.window.destroy()
         self.window = tk.Tk()
         self.window.geometry('500x180')
@@ -294,6 +380,8 @@ class Statcast_DB():
         Raises:
             No exceptions
         '''
+        import tkinter as tk
+
         self.window = tk.Tk()
         self.window.geometry('500x150')
         self.window.config(bg='#0E4B95')
@@ -331,6 +419,9 @@ class Statcast_DB():
         '''Connects and creates an engine for the SQL Database specified
         by the user.
 
+        The engine is created by db_loader.create_db_engine(), which tunes it
+        for bulk inserts using the optional 'Loader' section of config.yaml.
+
         Args:
             No arguments
 
@@ -340,21 +431,68 @@ class Statcast_DB():
         Raises:
             No exceptions
         '''
-        if self.dbtype == 'mssql':
-            self.driver = self.lst_config[1]['DB_MSSQL']['driver']
-            self.server = self.lst_config[1]['DB_MSSQL']['server']
-            self.database = self.lst_config[1]['DB_MSSQL']['database']
-            params = urllib.parse.quote_plus(f"DRIVER={self.driver};SERVER={self.server};DATABASE={self.database}")
+        self.dct_loader = self.get_config_section('Loader')
 
-            self.engine = create_engine(f"mssql+pyodbc:///?odbc_connect=%s" % params)
+        if self.dbtype == 'mssql':
+            dct_db = self.get_config_section('DB_MSSQL')
+            self.driver = dct_db['driver']
+            self.server = dct_db['server']
+            self.database = dct_db['database']
 
         if self.dbtype == 'mysql':
-            self.username = self.lst_config[2]['DB_MySQL']['username']
-            self.password = self.lst_config[2]['DB_MySQL']['password']
-            self.server = self.lst_config[2]['DB_MySQL']['server']
-            self.database = self.lst_config[2]['DB_MySQL']['database']
+            dct_db = self.get_config_section('DB_MySQL')
+            self.username = dct_db['username']
+            self.password = dct_db['password']
+            self.server = dct_db['server']
+            self.database = dct_db['database']
+
+        if self.dbtype == 'sqlite':
+            dct_db = self.get_config_section('DB_SQLite')
+            self.server = 'localhost'
+            self.database = dct_db['database']
 
-            self.engine = create_engine(f'mysql+pymysql://{self.username}:{self.password}@{self.server}/{self.database}').connect()
+        self.engine = create_db_engine(self.dbtype, dct_db, self.dct_loader)
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def fetch_statcast(self, start_dt, end_dt):
+        '''Returns the raw statcast data for a date range, reading it from the
+        local cache when it has been pulled before.
+
+        Only non-empty pulls are cached, so a date that has no data yet (e.g.
+        today's games while streaming) is re-checked on the next call. Setting
+        self.refresh_cache forces a new download that replaces the cached copy.
+
+        Args:
+            start_dt(str): First date, formatted 'yyyy-mm-dd'.
+            end_dt(str): Last date, formatted 'yyyy-mm-dd'.
+
+        Returns:
+            DataFrame: The raw statcast data.
+
+        Raises:
+            Exception: if the data could not be downloaded
+        '''
+        key = raw_statcast_key(start_dt, end_dt)
+
+        with self.metrics.stage(start_dt, 'fetch') as dct_metric:
+            df = None if self.refresh_cache else self.cache.get(key)
+
+            if df is None:
+                from pybaseball import statcast
+
+                df = pd.DataFrame(statcast(start_dt=start_dt, end_dt=end_dt))
+                if not df.empty:
+                    self.cache.put(key, df)
+                dct_metric['source'] = 'savant'
+            else:
+                logging.info(f'{start_dt}: RAW data read from local cache')
+                dct_metric['source'] = 'cache'
+
+            dct_metric['rows'] = len(df)
+            dct_metric['bytes'] = frame_bytes(df)
+
+        return df
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
@@ -411,7 +549,7 @@ class Statcast_DB():
         The raw statcast data only shows the batter's MLB ID number.
         This method uses a MLB Player Map to create a new column with
         the associated batter name to the ID. It uses a dictionary that
-        is created in the __init__ method.
+        is loaded from the PlayerID Map snapshot on first use.
 
         Args:
             No arguments
@@ -422,7 +560,8 @@ class Statcast_DB():
         Raises:
             No exceptions
         '''
-        lst_batter_name = [self.dct_playerIDs.get(x, None) for x in self.df['Batter_ID']]
+        srs_playerIDs = pd.Series(self.dct_playerIDs, dtype=object)
+        lst_batter_name = self.df['Batter_ID'].map(srs_playerIDs).astype('category')
         self.df.insert(self.df.columns.get_loc('Pitcher_ID'),
                        'Batter_Name',
                        lst_batter_name)
@@ -435,7 +574,7 @@ class Statcast_DB():
 
         The raw statcast data shows only the MLD ID for all players that are in the field
         and on base during each pitch. This method replaces the MLB IDs with the PLayer
-        Full Names using a dictionary created in __init__.
+        Full Names using the dct_playerIDs dictionary.
 
         Args:
             No arguments
@@ -449,9 +588,11 @@ class Statcast_DB():
         lst_cols = ['Fielder_2', 'Fielder_3', 'Fielder_4', 'Fielder_5', 'Fielder_6',
                     'Fielder_7', 'Fielder_8', 'Fielder_9', 'On_1b', 'On_2b', 'On_3b']
 
+        srs_playerIDs = pd.Series(self.dct_playerIDs)
+        srs_playerIDs = srs_playerIDs[srs_playerIDs.index.notna()]
+
         for c in range(0, len(lst_cols)):
-            new_col = [self.dct_playerIDs.get(x, None) for x in self.df[lst_cols[c]]]
-            self.df[lst_cols[c]] = new_col
+            self.df[lst_cols[c]] = self.df[lst_cols[c]].map(srs_playerIDs).astype('category')
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
@@ -472,16 +613,9 @@ class Statcast_DB():
         Raises:
             No exceptions
         '''
-        lst_bat_team = []
-        lst_fld_team = []
-
-        for i in range(0, len(self.df['Inning_TopBot'])):
-            if self.df['Inning_TopBot'][i] == 'Top':
-                lst_bat_team.append(self.df['Away_Team'][i])
-                lst_fld_team.append(self.df['Home_Team'][i])
-            if self.df['Inning_TopBot'][i] == 'Bot':
-                lst_bat_team.append(self.df['Home_Team'][i])
-                lst_fld_team.append(self.df['Away_Team'][i])
+        arr_top = (self.df['Inning_TopBot'] == 'Top').to_numpy()
+        lst_bat_team = pd.Categorical(np.where(arr_top, self.df['Away_Team'], self.df['Home_Team']))
+        lst_fld_team = pd.Categorical(np.where(arr_top, self.df['Home_Team'], self.df['Away_Team']))
 
         self.df.insert(self.df.columns.get_loc('Home_Score'),
                        'Bat_Team',
@@ -508,10 +642,10 @@ class Statcast_DB():
         Raises:
             No exceptions
         '''
-        lst_bat_league = [self.dct_team_league.get(x, None) for x in self.df['Bat_Team']]
-        lst_bat_division = [self.dct_team_division.get(x, None) for x in self.df['Bat_Team']]
-        lst_fld_league = [self.dct_team_league.get(x, None) for x in self.df['Fld_Team']]
-        lst_fld_division = [self.dct_team_division.get(x, None) for x in self.df['Fld_Team']]
+        lst_bat_league = self.df['Bat_Team'].map(self.dct_team_league).astype('category')
+        lst_bat_division = self.df['Bat_Team'].map(self.dct_team_division).astype('category')
+        lst_fld_league = self.df['Fld_Team'].map(self.dct_team_league).astype('category')
+        lst_fld_division = self.df['Fld_Team'].map(self.dct_team_division).astype('category')
 
         self.df.insert(self.df.columns.get_loc('Home_Score'),
                        'Bat_Team_League',
@@ -543,7 +677,7 @@ class Statcast_DB():
         Raises:
             No exceptions
         '''
-        lst_parks = [self.dct_parks.get(x, None) for x in self.df['Home_Team']]
+        lst_parks = self.df['Home_Team'].map(self.dct_parks).astype('category')
         self.df.insert(self.df.columns.get_loc('Home_Score'),
                        'Ball_Park',
                        lst_parks)
@@ -566,10 +700,18 @@ class Statcast_DB():
         Raises:
             No exceptions
         '''
+        if self.dct_pos is None:
+            lst_hitter_pos = self.lookup_store.lookup_game('pos', self.df['Batter_Name'], self.df['Game_Date'],
+                                                           MISSING_POS).tolist()
+            self.df.insert(self.df.columns.get_loc('Home_Team'),
+                           'Batter_Pos',
+                           lst_hitter_pos)
+            return
+
         lst_hitter_pos = []
-        for i in range(0, len(self.df['Batter_Name'])):
+        for name, game_date in zip(self.df['Batter_Name'].astype(object), self.df['Game_Date'].astype(str).str[:10]):
             try:
-                lst_hitter_pos.append(self.dct_pos[self.df['Batter_Name'][i]].get(str(self.df['Game_Date'][i])[:10], None))
+                lst_hitter_pos.append(self.dct_pos[name].get(game_date, None))
             except:
                 lst_hitter_pos.append('P')
                 continue
@@ -596,10 +738,20 @@ class Statcast_DB():
         Raises:
             No exceptions
         '''
+        if self.dct_bop is None:
+            # As a list, so the column is inferred the way the dictionary
+            # lookup's is: floats with NaN rather than objects.
+            lst_hitter_bop = self.lookup_store.lookup_game('bop', self.df['Batter_Name'], self.df['Game_Date'],
+                                                           MISSING_BOP).tolist()
+            self.df.insert(self.df.columns.get_loc('Home_Team'),
+                           'Batter_BOP',
+                           lst_hitter_bop)
+            return
+
         lst_hitter_bop = []
-        for i in range(0, len(self.df['Batter_Name'])):
+        for name, game_date in zip(self.df['Batter_Name'].astype(object), self.df['Game_Date'].astype(str).str[:10]):
             try:
-                lst_hitter_bop.append(self.dct_bop[self.df['Batter_Name'][i]].get(str(self.df['Game_Date'][i])[:10], None))
+                lst_hitter_bop.append(self.dct_bop[name].get(game_date, None))
             except:
                 lst_hitter_bop.append(9)
                 continue
@@ -621,30 +773,94 @@ class Statcast_DB():
             No exceptions
         '''
 
-        lst_hitter_ss = [self.dct_ss.get(batter, None) for batter in self.df['Batter_Name']]
+        if self.dct_ss is None:
+            lst_hitter_ss = self.lookup_store.lookup_ss(self.df['Batter_Name'], self.df['Game_Year'].iloc[0])
+        else:
+            lst_hitter_ss = [self.dct_ss.get(batter, None) for batter in self.df['Batter_Name']]
         self.df.insert(self.df.columns.get_loc('Home_Team'),
                        'Batter_Sprint',
                        lst_hitter_ss)
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-    def add_post_scores(self):
-        lst_post_bat_score = []
-        for i in range(0, len(self.df['Gameday_Description'])):
-            if self.df['Gameday_Description'].iloc[i] is not None:
-                runs_scored = float(self.df['Gameday_Description'].iloc[i].count('score')) + float(self.df['Gameday_Description'].iloc[i].count('homer'))
-            else:
-                runs_scored = 0
-            lst_post_bat_score.append(float(self.df['Bat_Score'].iloc[i]) + runs_scored)
+    def add_game_state(self):
+        '''Adds the game state after each pitch: the batting and fielding team
+        scores, the outs and the runners on base.
+
+        The pitches are ordered by game, plate appearance and pitch number,
+        and the state after a pitch is read from the state before the next
+        pitch of the same game: its home and away scores, and, if it is in the
+        same half inning, its outs and runners. When the half inning changes
+        the pitch ended it, with three outs and the bases cleared.
+
+        The last pitch of a game has no next pitch. Its runs are counted from
+        the Gameday description ('scores', 'homers'), its outs from the event
+        (transform_registry.EVENT_OUTS) if the home team walked off and 3
+        otherwise, and its base state is unknown (NA) after a walk-off.
+
+        Post_Base_State packs the runners into one number: 1 for a runner on
+        first, 2 on second, 4 on third, so 0 is bases empty and 7 bases loaded.
+
+        Args:
+            No arguments
 
-        self.df.insert(self.df.columns.get_loc('Inning'),
-                       'Post_Bat_Score',
-                       lst_post_bat_score)
+        Returns:
+            Does not return a parameter
 
+        Raises:
+            No exceptions
+        '''
+        arr_order = np.lexsort((self.df['Pitch_Num'].to_numpy(dtype='int64', na_value=0),
+                                self.df['PA_Num'].to_numpy(dtype='int64', na_value=0),
+                                self.df['Game_ID'].to_numpy(dtype='int64', na_value=0)))
+        df = self.df[['Game_ID', 'Inning', 'Inning_TopBot', 'Home_Score', 'Away_Score', 'Outs_When_Up',
+                      'On_1b', 'On_2b', 'On_3b', 'Result_Event', 'Gameday_Description']].iloc[arr_order]
+
+        arr_game = df['Game_ID'].to_numpy(dtype='int64', na_value=0)
+        arr_inning = df['Inning'].to_numpy(dtype='int64', na_value=0)
+        arr_bot = (df['Inning_TopBot'] == 'Bot').to_numpy()
+        arr_home = df['Home_Score'].to_numpy(dtype='float64', na_value=np.nan)
+        arr_away = df['Away_Score'].to_numpy(dtype='float64', na_value=np.nan)
+        arr_outs = df['Outs_When_Up'].to_numpy(dtype='float64', na_value=np.nan)
+        arr_bases = (df['On_1b'].notna().to_numpy() * 1
+                     + df['On_2b'].notna().to_numpy() * 2
+                     + df['On_3b'].notna().to_numpy() * 4).astype('float64')
+
+        arr_same_game = np.append(arr_game[1:] == arr_game[:-1], False)
+        arr_same_half = arr_same_game & np.append((arr_inning[1:] == arr_inning[:-1]) & (arr_bot[1:] == arr_bot[:-1]), False)
+        arr_last = ~arr_same_game
+
+        arr_post_home = np.append(arr_home[1:], np.nan)
+        arr_post_away = np.append(arr_away[1:], np.nan)
+        arr_runs = np.zeros(len(df))
+        srs_desc = df['Gameday_Description'][arr_last].astype(object).fillna('').astype(str)
+        arr_runs[arr_last] = srs_desc.str.count('score') + srs_desc.str.count('homer')
+        arr_post_home = np.where(arr_last, arr_home + np.where(arr_bot, arr_runs, 0), arr_post_home)
+        arr_post_away = np.where(arr_last, arr_away + np.where(arr_bot, 0, arr_runs), arr_post_away)
+        arr_post_bat = np.where(arr_bot, arr_post_home, arr_post_away)
+        arr_post_fld = np.where(arr_bot, arr_post_away, arr_post_home)
+
+        arr_walk_off = arr_last & arr_bot & (arr_post_bat > arr_post_fld)
+        arr_event_outs = np.zeros(len(df))
+        arr_event_outs[arr_walk_off] = df['Result_Event'][arr_walk_off].astype(object).map(EVENT_OUTS).fillna(0)
+        arr_post_outs = np.where(arr_same_half, np.append(arr_outs[1:], np.nan), 3.0)
+        arr_post_outs = np.where(arr_walk_off, np.minimum(arr_outs + arr_event_outs, 3.0), arr_post_outs)
+        arr_post_bases = np.where(arr_same_half, np.append(arr_bases[1:], np.nan), 0.0)
+        arr_post_bases = np.where(arr_walk_off, np.nan, arr_post_bases)
+
+        arr_unsort = np.empty_like(arr_order)
+        arr_unsort[arr_order] = np.arange(len(arr_order))
+        dct_cols = {'Post_Bat_Score': arr_post_bat, 'Post_Fld_Score': arr_post_fld,
+                    'Post_Outs': arr_post_outs, 'Post_Base_State': arr_post_bases}
+        for col, before in [('Post_Bat_Score', 'Inning'), ('Post_Fld_Score', 'Inning'),
+                            ('Post_Outs', 'Balls'), ('Post_Base_State', 'Balls')]:
+            self.df.insert(self.df.columns.get_loc(before),
+                           col,
+                           pd.array(dct_cols[col][arr_unsort], dtype='Float64').astype('Int32'))
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-    def stream_pos_bop_dct(self, date):
+    def stream_pos_bop_dct(self, date, batter_ids=None):
         '''
         Create dictionary json files for each year containing which field position
          a player was playing for each date in their career.
@@ -654,20 +870,25 @@ class Statcast_DB():
         playing for each game in their career. The function scrapes data from
         the baseball-reference.com game logs for each player then parses and
         converts the data into the form neccessary to use in a Statcast Databse.
+        The game logs are downloaded concurrently by a GamelogFetcher, configured
+        by the 'Scraper' section of config.yaml, and parsed as they arrive.
+
+        When batter_ids is given, only the players who batted on the date are
+        scraped, instead of every active player in the PlayerID Map.
 
         Example of an entry into a dictionary:
         {"Jose Abreu": {"2020-07-24": "3", "2020-07-25": "3" ...
 
         Args:
-            No arguments.
+            date(str): The date to refresh, formatted 'yyyy-mm-dd'.
+            batter_ids(iterable): MLB IDs of the batters that appeared on the
+                                  date, e.g. the day's 'Batter_ID' column.
 
         Returns:
             list: a list of each years dictionary
 
         '''
-        with open('config.yaml', 'r') as yamlfile:
-            lst_config = yaml.load(yamlfile, Loader=yaml.FullLoader)
-        parent_path = lst_config[3]['Paths']['parent_path']
+        parent_path = self.parent_path
 
         # date = (datetime.now()-timedelta(1)).strftime('%Y-%m-%d')
         # date = '2019-06-03'
@@ -679,7 +900,7 @@ class Statcast_DB():
         filename_pos = f'{parent_path}/dicts/dct_pos_2021_test.txt'
         filename_bop = f'{parent_path}/dicts/dct_bop_2021_test.txt'
 
-        playeridmap = pd.read_csv('https://www.smartfantasybaseball.com/PLAYERIDMAPCSV')
+        playeridmap = self.playerMap
 
         try:
             self.dct_pos = ujson.load(open(filename_pos))
@@ -690,50 +911,46 @@ class Statcast_DB():
         except ValueError:
             print('The BOP text file is empty.')
 
-        playeridmap_hitters = playeridmap.drop(playeridmap[playeridmap['POS'].str.contains('P')].index)
-        playeridmap_hitters = playeridmap.drop(playeridmap[playeridmap['ACTIVE'].str.contains('N')].index)
+        if batter_ids is not None:
+            set_batter_ids = {int(x) for x in batter_ids if pd.notna(x)}
+            playeridmap_hitters = playeridmap[playeridmap['MLBID'].isin(set_batter_ids)]
+            print(f'Refreshing Pos/BOP for {len(playeridmap_hitters)} of {len(set_batter_ids)} batters that appeared on {date}')
+            logging.info(f'{date}: Refreshing Pos/BOP for {len(playeridmap_hitters)} of {len(set_batter_ids)} batters that appeared')
+        else:
+            playeridmap_hitters = playeridmap.drop(playeridmap[playeridmap['POS'].str.contains('P')].index)
+            playeridmap_hitters = playeridmap.drop(playeridmap[playeridmap['ACTIVE'].str.contains('N')].index)
         playeridmap_hitters = playeridmap_hitters.reset_index(drop=True)
         dct_brefid_name = dict(zip(playeridmap_hitters['BREFID'], playeridmap_hitters['PLAYERNAME']))
-        lst_brefid = playeridmap_hitters['BREFID']
-        for p in range(0, len(lst_brefid)):
-            try:
-                df = pd.read_html(f'https://www.baseball-reference.com/players/gl.fcgi?id={lst_brefid[p]}&t=b&year={year}')[4][['Date', 'BOP', 'Pos']]
-            except:
-                print(f'Table Not Found: {dct_brefid_name.get(lst_brefid[p])}:{year}: https://www.baseball-reference.com/players/gl.fcgi?id={lst_brefid[p]}&t=b&year={year}')
-                continue
-
-            df.drop(df.index[0:-2], inplace=True)
-            df.drop(df.index[-1], inplace=True)
-
-            df['Date'] = df.Date.map(str) + " " + year
-            df.drop(df[df['Date'].str.contains('Date')].index, inplace=True)
-            df.drop(df[df['Date'].str.contains('nan')].index, inplace=True)
-            df = df.reset_index(drop=True)
-
-            df['Date'] = df['Date'].str.replace('(1)', '', regex=False)
-            df['Date'] = df['Date'].str.replace('(2)', '', regex=False)
-            df['Date'] = df['Date'].str.replace('susp', '', regex=False)
-            df.loc[0, 'Date'] = datetime.strptime(df.loc[0, 'Date'], '%b %d %Y').strftime('%Y-%m-%d')
-
-            print(df.loc[0, 'Date'])
-            print(date)
-
-            if df.loc[0, 'Date'] == date:
-                if dct_brefid_name.get(lst_brefid[p]) in self.dct_pos:
-                    self.dct_pos.get(dct_brefid_name.get(lst_brefid[p])).update(dict(zip(df['Date'], df['Pos'])))
-                    print(f'Updated Pos: {dct_brefid_name.get(lst_brefid[p])}: entry updated for {date}')
-                else:
-                    self.dct_pos.update({dct_brefid_name.get(lst_brefid[p]): dict(zip(df['Date'], df['Pos']))})
-                    print(f'Inserted Pos: {dct_brefid_name.get(lst_brefid[p])}: new entry inserted for {date}')
+        lst_brefid = playeridmap_hitters['BREFID'].dropna().tolist()
+
+        fetcher = GamelogFetcher(**self.get_config_section('Scraper'))
+        with self.metrics.stage(date, 'gamelogs', rows=len(lst_brefid)) as dct_metric:
+            for brefid, html in fetcher.iter_gamelogs(lst_brefid, year):
+                name = dct_brefid_name.get(brefid)
+                dct_metric['bytes'] += len(html or '')
+                try:
+                    df = parse_last_game(html, year)
+                except:
+                    print(f'Table Not Found: {name}:{year}: {fetcher.url_template.format(brefid=brefid, year=year)}')
+                    continue
+
+                if df.loc[0, 'Date'] == date:
+                    if name in self.dct_pos:
+                        self.dct_pos.get(name).update(dict(zip(df['Date'], df['Pos'])))
+                        print(f'Updated Pos: {name}: entry updated for {date}')
+                    else:
+                        self.dct_pos.update({name: dict(zip(df['Date'], df['Pos']))})
+                        print(f'Inserted Pos: {name}: new entry inserted for {date}')
 
-                if dct_brefid_name.get(lst_brefid[p]) in self.dct_bop:
-                    self.dct_bop.get(dct_brefid_name.get(lst_brefid[p])).update(dict(zip(df['Date'], df['BOP'])))
-                    print(f'Updated BOP: {dct_brefid_name.get(lst_brefid[p])}: entry updated for {date}')
+                    if name in self.dct_bop:
+                        self.dct_bop.get(name).update(dict(zip(df['Date'], df['BOP'])))
+                        print(f'Updated BOP: {name}: entry updated for {date}')
+                    else:
+                        self.dct_bop.update({name: dict(zip(df['Date'], df['BOP']))})
+                        print(f'Inserted BOP: {name}: new entry inserted for {date}')
                 else:
-                    self.dct_bop.update({dct_brefid_name.get(lst_brefid[p]): dict(zip(df['Date'], df['BOP']))})
-                    print(f'Inserted BOP: {dct_brefid_name.get(lst_brefid[p])}: new entry inserted for {date}')
-            else:
-                print(f'DNP: {dct_brefid_name.get(lst_brefid[p])}: Did not play {date}')
+                    print(f'DNP: {name}: Did not play {date}')
+            dct_metric['retries'] = fetcher.retry_count
 
         ujson.dump(self.dct_pos, open(filename_pos, 'w'))
         ujson.dump(self.dct_bop, open(filename_bop, 'w'))
@@ -745,144 +962,671 @@ class Statcast_DB():
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-    def add_cnt_pa(self):
-        self.df['cnt_PA'] = np.select([
-            self.df['Result_Event'] == 'strikeout',
-            self.df['Result_Event'] == 'field_out',
-            self.df['Result_Event'] == 'grounded_into_double_play',
-            self.df['Result_Event'] == 'strikeout_double_play',
-            self.df['Result_Event'] == 'double_play',
-            self.df['Result_Event'] == 'force_out',
-            self.df['Result_Event'] == 'fielders_choice_out',
-            self.df['Result_Event'] == 'fielders_choice',
-            self.df['Result_Event'] == 'single',
-            self.df['Result_Event'] == 'double',
-            self.df['Result_Event'] == 'triple',
-            self.df['Result_Event'] == 'home_run',
-            self.df['Result_Event'] == 'hit_by_pitch',
-            self.df['Result_Event'] == 'walk',
-            self.df['Result_Event'] == 'field_error',
-            self.df['Result_Event'] == 'sac_fly',
-            self.df['Result_Event'] == 'sac_bunt',
-            self.df['Result_Event'] == 'interf_def'],
-            [1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1], default=0)
+    def add_cnt_events(self):
+        '''Adds the cnt_* counting columns (PA, AB, hits, walks, strikeouts...)
+        in one pass.
+
+        Result_Event and Event_Description are factorized once, and each
+        distinct value is looked up in transform_registry.CNT_EVENT_FLAGS and
+        CNT_EVENT_DESC_FLAGS to build a small flags table. The columns are then
+        taken from that table by the codes, so the day's strings are scanned
+        once rather than once per event per column. Each column is 1 on the
+        pitch that ended a plate appearance with a counted event, otherwise 0.
+
+        Args:
+            No arguments
+
+        Returns:
+            Does not return a parameter
+
+        Raises:
+            No exceptions
+        '''
+        dct_col_idx = {col: c for c, col in enumerate(CNT_EVENT_COLS)}
+
+        arr_event_codes, arr_events = pd.factorize(self.df['Result_Event'])
+        arr_flags = np.zeros((len(arr_events) + 1, len(CNT_EVENT_COLS)), dtype='int64')
+        for e, event in enumerate(arr_events):
+            for col in CNT_EVENT_FLAGS.get(event, []):
+                arr_flags[e, dct_col_idx[col]] = 1
+        arr_cnt = arr_flags[arr_event_codes]
+
+        arr_desc_codes, arr_descs = pd.factorize(self.df['Event_Description'])
+        dct_event_idx = {event: e for e, event in enumerate(arr_events)}
+        dct_desc_idx = {desc: d for d, desc in enumerate(arr_descs)}
+        for (event, desc), lst_cols in CNT_EVENT_DESC_FLAGS.items():
+            if event in dct_event_idx and desc in dct_desc_idx:
+                arr_match = (arr_event_codes == dct_event_idx[event]) & (arr_desc_codes == dct_desc_idx[desc])
+                for col in lst_cols:
+                    arr_cnt[arr_match, dct_col_idx[col]] = 1
+
+        self.df = pd.concat([self.df, pd.DataFrame(arr_cnt, columns=CNT_EVENT_COLS, index=self.df.index)], axis=1)
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-    def add_cnt_ab(self):
-        self.df['cnt_AB'] = np.select([
-            self.df['Result_Event'] == 'strikeout',
-            self.df['Result_Event'] == 'field_out',
-            self.df['Result_Event'] == 'grounded_into_double_play',
-            self.df['Result_Event'] == 'strikeout_double_play',
-            self.df['Result_Event'] == 'double_play',
-            self.df['Result_Event'] == 'force_out',
-            self.df['Result_Event'] == 'fielders_choice_out',
-            self.df['Result_Event'] == 'fielders_choice',
-            self.df['Result_Event'] == 'single',
-            self.df['Result_Event'] == 'double',
-            self.df['Result_Event'] == 'triple',
-            self.df['Result_Event'] == 'home_run'],
-            [1,1,1,1,1,1,1,1,1,1,1,1], default=0)
+    def add_cnt_rbi(self):
+        '''Adds a column with the runs batted in on each pitch: the batting
+        team's score change over the pitch (see add_game_state()), on pitches
+        that ended a plate appearance with an event that can drive in a run.
+
+        Args:
+            No arguments
+
+        Returns:
+            Does not return a parameter
+
+        Raises:
+            No exceptions
+        '''
+        arr_no_rbi = (self.df['Result_Event'].isna()
+                      | self.df['Result_Event'].isin(['field_error', 'grounded_into_double_play', 'strikeout', 'strikeout_double_play', 'double_play'])).to_numpy()
+        arr_runs = (self.df['Post_Bat_Score'] - self.df['Bat_Score']).to_numpy(dtype='float64', na_value=np.nan)
+        lst_cnt_rbi = np.where(arr_no_rbi, 0.0, arr_runs)
+
+        self.df.insert(len(self.df.columns),
+                       'cnt_RBI',
+                       lst_cnt_rbi)
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def calc_yahoo_pnts(self, i=slice(None)):
+        pnts_b = (self.df['cnt_Single'].iloc[i]*2.6) + (self.df['cnt_Double'].iloc[i]*5.2) + (self.df['cnt_Triple'].iloc[i]*7.8) + (self.df['cnt_Home_Run'].iloc[i]*10.4) + (self.df['cnt_RBI'].iloc[i]*1.9) + (self.df['cnt_Walk'].iloc[i]*2.6) + (self.df['cnt_HBP'].iloc[i]*2.6)
 
-    def add_cnt_hit(self):
-        self.df['cnt_Hit'] = np.select([
-            self.df['Result_Event'] == 'single',
-            self.df['Result_Event'] == 'double',
-            self.df['Result_Event'] == 'triple',
-            self.df['Result_Event'] == 'home_run'],
-            [1,1,1,1], default=0)
+        return pnts_b
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-    def add_cnt_single(self):
-        self.df['cnt_Single'] = np.select([
-            self.df['Result_Event'] == 'single'],
-            [1], default=0)
+    def add_yahoo_pnts(self):
+        lst_yahoo_pnts_b = self.calc_yahoo_pnts().to_numpy()
+        self.df.insert(len(self.df.columns), 'Yahoo_Pnts_Batter', lst_yahoo_pnts_b)
+
+
+    def load_year_lookups(self, year, missing_ok=False):
+        '''Loads the per-year lookup dictionaries used by the WRK transformation.
+
+        The position, batting order and sprint speed dictionaries are large
+        JSON files, so they are only reloaded when the requested year differs
+        from the year that is currently loaded. Parallel build workers keep
+        their own copy, which means each worker parses a year once rather than
+        once per day. When a compiled lookup store is configured, the JSON
+        dictionaries are not loaded at all and the add_batter_* methods read
+        from the store instead.
+
+        Args:
+            year(str): The season to load the lookups for.
+            missing_ok(bool): Use an empty dictionary for a lookup file that
+                              does not exist yet, e.g. when streaming the first
+                              days of a new season.
+
+        Returns:
+            Does not return a parameter
+
+        Raises:
+            FileNotFoundError: if a lookup file is missing and missing_ok is False
+        '''
+        if getattr(self, 'lookup_year', None) == year:
+            return
+
+        if self.lookup_store is not None:
+            self.dct_pos = None
+            self.dct_bop = None
+            self.dct_ss = None
+        else:
+            lst_dcts = []
+            for name in ['pos', 'bop', 'ss']:
+                filename = f'{self.parent_path}/dicts/dct_{name}_{year}.txt'
+                if missing_ok and not os.path.exists(filename):
+                    logging.warning(f'{filename} not found, the {name} lookup is empty for {year}')
+                    lst_dcts.append({})
+                else:
+                    lst_dcts.append(ujson.load(open(filename)))
+            self.dct_pos, self.dct_bop, self.dct_ss = lst_dcts
+        self.dct_parks = dict(zip(self.team_atts['Team'], self.team_atts[f'Ball_Park_{year}']))
+        self.lookup_year = year
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-    def add_cnt_double(self):
-        self.df['cnt_Double'] = np.select([
-            self.df['Result_Event'] == 'double'],
-            [1], default=0)
+    def run_steps(self, date, lst_steps):
+        '''Runs transformation steps on self.df in order, recording the time
+        of each one in the run metrics.
+
+        Args:
+            date(str): The date the data in self.df belongs to.
+            lst_steps(list): The steps, each a bound method or a
+                             (method, args) tuple.
+
+        Returns:
+            Does not return a parameter
+
+        Raises:
+            Exception: whatever a step raised
+        '''
+        for step in lst_steps:
+            method, args = step if isinstance(step, tuple) else (step, ())
+            with self.metrics.stage(date, method.__name__, rows=len(self.df)):
+                method(*args)
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-    def add_cnt_triple(self):
-        self.df['cnt_Triple'] = np.select([
-            self.df['Result_Event'] == 'triple'],
-            [1], default=0)
+    def transform_wrk(self, year, date=None, lst_columns=None):
+        '''Runs the WRK transformation on self.df, as declared in
+        transform_registry.WRK_STEPS.
+
+        By default every step runs, which gives the full WRK table. When
+        lst_columns is given, only the steps those columns need are run (see
+        transform_registry.plan_steps()), e.g. ['cnt_Hit', 'Bat_Team'] skips
+        the position, batting order and sprint speed lookups. Such a frame has
+        the renamed statcast columns plus the requested ones and is meant for
+        analysis, not for the WRK tables.
+
+        Args:
+            year(str): The season the data in self.df belongs to.
+            date(str): The date the data belongs to, used to label the step
+                       metrics. Defaults to the year.
+            lst_columns(list): WRK columns to compute. Defaults to all of them.
+
+        Returns:
+            Does not return a parameter
+
+        Raises:
+            No exceptions
+        '''
+        dct_args = {'year': year}
+        lst_steps = [getattr(self, name) for name in BASE_STEPS]
+        for dct_step in plan_steps(lst_columns):
+            lst_args = tuple(dct_args[arg] for arg in dct_step.get('args', ()))
+            lst_steps.append((getattr(self, dct_step['name']), lst_args))
+
+        self.run_steps(date or year, lst_steps)
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-    def add_cnt_home_run(self):
-        self.df['cnt_Home_Run'] = np.select([
-            self.df['Result_Event'] == 'home_run'],
-            [1], default=0)
+    def fetch_raw_day(self, date):
+        '''Fetches the RAW data for a single date, typed and without the
+        duplicate columns statcast returns, and loads the lookups for its year.
+
+        Args:
+            date(str): The date to fetch, formatted 'yyyy-mm-dd'.
+
+        Returns:
+            DataFrame: The RAW data, or None if there is no data for the date.
+
+        Raises:
+            Exception: if the data could not be fetched from Baseball Savant
+        '''
+        self.load_year_lookups(date[:4])
+
+        try:
+            df = self.fetch_statcast(date, date)
+        except Exception as e:
+            logging.exception("Exception occurred")
+            raise
+
+        if df.empty:
+            print(f'{date}: NO DATA FOR THIS DATE')
+            logging.warning(f'{date}: NO DATA FOR THIS DATE')
+            return None
+
+        print(f'Completed: {date} RAW data imported from Baseball Savant')
+        logging.info(f'{date}: RAW data imported from Baseball Savant')
+
+        df = type_raw_frame(df)
+        df.drop(['pitcher.1', 'fielder_2.1', 'post_away_score', 'post_home_score', 'post_bat_score', 'post_fld_score'],
+                axis=1,
+                inplace=True,
+                errors='ignore')
+
+        return df
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-    def add_cnt_k(self):
-        self.df['cnt_K'] = np.select([
-            (self.df['Result_Event'] == 'strikeout') & (self.df['Event_Description'] == 'called_strike')],
-            [1], default=0)
+    def process_date(self, date):
+        '''Fetches and transforms the statcast data for a single date.
+
+        This is the unit of work for build_db(). It does not touch the
+        database, so it can run in a worker process while the parent process
+        does the inserts.
+
+        Args:
+            date(str): The date to process, formatted 'yyyy-mm-dd'.
+
+        Returns:
+            tuple: (DataFrame, DataFrame) with the RAW and WRK data for the
+                   date, or (None, None) if there is no data for the date. The
+                   WRK data is None if the transformation failed.
+
+        Raises:
+            Exception: if the data could not be fetched from Baseball Savant
+        '''
+        year = date[:4]
+        self.df = self.fetch_raw_day(date)
+
+        if self.df is None:
+            return None, None
+
+        df_raw = self.df
+
+        try:
+            self.transform_wrk(year, date)
+            print(f'{date}: Data transformation complete')
+            logging.info(f'{date}: Data transformation complete')
+            df_wrk = self.df
+        except Exception as e:
+            logging.exception('Exception Occured')
+            df_wrk = None
+
+        self.df = None
+
+        return df_raw, df_wrk
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-    def add_cnt_backwardsk(self):
-        self.df['cnt_BackwardsK'] = np.select([
-            (self.df['Result_Event'] == 'strikeout') & (self.df['Event_Description'] == 'swinging_strike')],
-            [1], default=0)
+    def write_date(self, date, df_raw, df_wrk, startTime):
+        '''Inserts the RAW and WRK data for a single date into the database.
+
+        Each insert is recorded in the ingestion manifest with its row count,
+        status and duration. When resuming a build, a table that already
+        completed the date is skipped, and a table with a started or failed
+        entry has the date's rows deleted before they are inserted again.
+
+        Args:
+            date(str): The date the data belongs to, formatted 'yyyy-mm-dd'.
+            df_raw(DataFrame): The RAW data returned by process_date(), or None
+                               if there was no data for the date.
+            df_wrk(DataFrame): The WRK data returned by process_date(), or None
+                               if the transformation failed; the WRK table
+                               is then marked failed instead of loaded.
+            startTime(datetime): Start of the build, used for progress logging.
+
+        Returns:
+            Does not return a parameter
+
+        Raises:
+            No exceptions
+        '''
+        year = date[:4]
+
+        if df_raw is None:
+            self.record_date_status(date, STATUS_EMPTY)
+            return
+
+        print('............')
+        print(f'|{date.replace("-", "/")}|')
+        print('............')
+
+        for df, table, date_col, label in [(df_raw, f'raw_statcast_{year}', 'game_date', 'Raw'),
+                                           (df_wrk, f'wrk_statcast_{year}', 'Game_Date', 'Working')]:
+            status = self.dct_manifest.get((date, table))
+            if status == STATUS_COMPLETE:
+                print(f'Skipped: {label} data already in DB: STATCAST , TABLE: {table}')
+                continue
+
+            tableTime = datetime.now()
+            if df is None:
+                print(f'Failed: Data transformation, {label} data not inserted into TABLE: {table}')
+                logging.error(f'{date}: Data transformation failed, {label} data not inserted into TABLE: {table}')
+                self.record_table_failed(date, table, tableTime)
+                continue
+
+            try:
+                if status is not None:
+                    delete_date_rows(self.engine, table, date_col, date)
+                record_manifest(self.engine, date, table, STATUS_STARTED)
+                add_missing_columns(df, table, self.engine)
+                with self.metrics.stage(date, f'insert_{table[:3]}', rows=len(df), bytes=frame_bytes(df), table=table):
+                    insert_df(df, table, self.engine, self.dct_loader)
+                bump_watermark(self.engine, table, date, len(df))
+                record_manifest(self.engine, date, table, STATUS_COMPLETE, len(df),
+                                (datetime.now() - tableTime).total_seconds())
+                print(f'Completed: {label} data inserted into DB: STATCAST , TABLE: {table}')
+                logging.info(f'{date}: {label} data inserted into DB: STATCAST , TABLE: {table}')
+                if df is df_wrk:
+                    self.write_rollups(date, df_wrk)
+                    self.write_export(date, df_wrk)
+            except Exception as e:
+                logging.exception("Exception occurred")
+                self.record_table_failed(date, table, tableTime)
+
+        print(f'Time Elapsed: {datetime.now() - startTime}\n')
+        logging.info(f'{date}: Time Elapsed: {datetime.now() - startTime}')
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-    def add_cnt_walk(self):
-        self.df['cnt_Walk'] = np.select([
-            self.df['Result_Event'] == 'walk'],
-            [1], default=0)
+    def record_date_status(self, date, status):
+        '''Records the same manifest status for the RAW and WRK tables of a date.
+        Used when a date has no data or could not be fetched.
+
+        Args:
+            date(str): The date, formatted 'yyyy-mm-dd'.
+            status(str): The manifest status to record.
+
+        Returns:
+            Does not return a parameter
+
+        Raises:
+            No exceptions
+        '''
+        try:
+            for table in [f'raw_statcast_{date[:4]}', f'wrk_statcast_{date[:4]}']:
+                record_manifest(self.engine, date, table, status)
+        except Exception as e:
+            logging.exception("Exception occurred")
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-    def add_cnt_hbp(self):
-        self.df['cnt_HBP'] = np.select([
-            self.df['Result_Event'] == 'hit_by_pitch'],
-            [1], default=0)
+    def record_table_failed(self, date, table, tableTime):
+        '''Records a failed manifest entry for one table of a date, logging
+        rather than raising if the manifest cannot be written.
+
+        Args:
+            date(str): The date, formatted 'yyyy-mm-dd'.
+            table(str): The table the date failed to load into.
+            tableTime(datetime): When the load of the table started.
+
+        Returns:
+            Does not return a parameter
+
+        Raises:
+            No exceptions
+        '''
+        try:
+            record_manifest(self.engine, date, table, STATUS_FAILED, 0, (datetime.now() - tableTime).total_seconds())
+        except Exception as e:
+            logging.exception("Exception occurred")
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-    def add_cnt_rbi(self):
-        lst_cnt_rbi = []
-        for i in range(0, len(self.df)):
-            if self.df['Result_Event'][i] not in ['field_error', 'grounded_into_double_play', 'strikeout', 'strikeout_double_play', 'double_play']:
-                lst_cnt_rbi.append(self.df['Post_Bat_Score'][i] - self.df['Bat_Score'][i])
-            else:
-                lst_cnt_rbi.append(0)
+    def write_rollups(self, date, df_wrk):
+        '''Updates the player-game, team-game and player-season rollup tables
+        with WRK rows that were just inserted (see rollups.update_rollups()).
 
-        self.df.insert(len(self.df.columns),
-                       'cnt_RBI',
-                       lst_cnt_rbi)
+        A failure is logged and does not fail the load; check_rollups() finds
+        and repairs a rollup that fell behind. The rollups are skipped when
+        'enabled' is False in the 'Rollups' section of config.yaml.
+
+        Args:
+            date(str): The date the rows belong to, formatted 'yyyy-mm-dd'.
+            df_wrk(DataFrame): The WRK rows, every pitch of each game in them.
+
+        Returns:
+            Does not return a parameter
+
+        Raises:
+            No exceptions
+        '''
+        if not self.get_config_section('Rollups').get('enabled', True):
+            return
+
+        try:
+            with self.metrics.stage(date, 'rollups', rows=len(df_wrk)) as dct_metric:
+                dct_metric.update(update_rollups(self.engine, df_wrk, date[:4], self.dct_loader))
+        except Exception as e:
+            logging.exception(f'{date}: Rollups not updated')
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-    def calc_yahoo_pnts(self, i):
-        pnts_b = (self.df['cnt_Single'].iloc[i]*2.6) + (self.df['cnt_Double'].iloc[i]*5.2) + (self.df['cnt_Triple'].iloc[i]*7.8) + (self.df['cnt_Home_Run'].iloc[i]*10.4) + (self.df['cnt_RBI'].iloc[i]*1.9) + (self.df['cnt_Walk'].iloc[i]*2.6) + (self.df['cnt_HBP'].iloc[i]*2.6)
 
-        return pnts_b
+    def form_windows(self):
+        '''Returns the game and plate appearance window lengths of the player
+        form, the 'games' and 'pa' lists of the 'Form' section of config.yaml.'''
+        dct_form = self.get_config_section('Form')
+
+        return dct_form.get('games') or DEFAULT_GAMES, dct_form.get('pa') or DEFAULT_PAS
+
+    def write_form(self, date, df_wrk):
+        '''Updates the rolling player form with WRK rows that were just
+        inserted (see player_form.update_form()), starting from the stored
+        state of the players in them rather than the season's history.
+
+        A failure is logged and does not fail the load. The form and state
+        tables are left as they were, without the rows' games, and the date
+        is marked failed for player_form_{year} in the ingestion manifest;
+        the next update of the season then rebuilds it from the WRK table
+        (player_form.rebuild_form()) instead, as later windows would
+        otherwise miss the date. The form is skipped when 'enabled' is False
+        in the 'Form' section of config.yaml.
+
+        Args:
+            date(str): The date the rows belong to, formatted 'yyyy-mm-dd'.
+            df_wrk(DataFrame): The WRK rows, every pitch of each game in them.
+
+        Returns:
+            Does not return a parameter
+
+        Raises:
+            No exceptions
+        '''
+        if not self.get_config_section('Form').get('enabled', True):
+            return
+
+        table = form_table(date[:4])
+        tableTime = datetime.now()
+        try:
+            lst_games, lst_pas = self.form_windows()
+            lst_failed = failed_dates(self.engine, table)
+            with self.metrics.stage(date, 'player_form', rows=len(df_wrk)) as dct_metric:
+                if lst_failed:
+                    logging.warning(f'{table}: update failed for {lst_failed}, rebuilding the season')
+                    dct_metric.update(rebuild_form(self.engine, date[:4], lst_games, lst_pas, self.dct_loader))
+                else:
+                    dct_metric.update(update_form(self.engine, df_wrk, date[:4], lst_games, lst_pas, self.dct_loader))
+            for failed_date in lst_failed:
+                record_manifest(self.engine, failed_date, table, STATUS_COMPLETE)
+        except Exception as e:
+            logging.exception(f'{date}: Player form not updated, {table} is rebuilt on its next update')
+            self.record_table_failed(date, table, tableTime)
+
+    def rebuild_year_form(self, year):
+        '''Recomputes a season's rolling player form from its WRK table (see
+        player_form.rebuild_form()), replacing the form and state tables.
+
+        Args:
+            year(str): The season.
+
+        Returns:
+            Does not return a parameter
+
+        Raises:
+            No exceptions
+        '''
+        if not self.get_config_section('Form').get('enabled', True):
+            return
+
+        try:
+            lst_games, lst_pas = self.form_windows()
+            with self.metrics.stage(year, 'player_form') as dct_metric:
+                dct_metric.update(rebuild_form(self.engine, year, lst_games, lst_pas, self.dct_loader))
+            for failed_date in failed_dates(self.engine, form_table(year)):
+                record_manifest(self.engine, failed_date, form_table(year), STATUS_COMPLETE)
+            if dct_metric.get('form'):
+                print(f'Completed: player_form_{year} built from wrk_statcast_{year}, {dct_metric["form"]} rows')
+                logging.info(f'{year}: player_form_{year} built, {dct_metric["form"]} rows')
+        except Exception as e:
+            print(f'Unable to build player_form_{year}')
+            logging.exception(f'{year}: Could not build player_form_{year}')
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-    def add_yahoo_pnts(self):
-        lst_yahoo_pnts_b = [self.calc_yahoo_pnts(i) for i in list(self.df.index.values)]
-        self.df.insert(len(self.df.columns), 'Yahoo_Pnts_Batter', lst_yahoo_pnts_b)
+    def export_path(self):
+        '''Returns the directory of the Parquet export of the WRK tables, the
+        'path' of the 'Export' section of config.yaml.'''
+        return self.get_config_section('Export').get('path') or f'{self.parent_path}/parquet/wrk_statcast'
+
+    def write_export(self, date, df_wrk, chunk=0):
+        '''Writes WRK rows that were just inserted to the Parquet export (see
+        wrk_export.write_partition()), when 'enabled' is True in the 'Export'
+        section of config.yaml.
+
+        A failure is logged and does not fail the load; export_year()
+        rewrites a season from the WRK table.
+
+        Args:
+            date(str): The date the rows belong to, formatted 'yyyy-mm-dd'.
+            df_wrk(DataFrame): The WRK rows of the date, or of one chunk of it.
+            chunk(int): Position of the chunk within the date.
+
+        Returns:
+            Does not return a parameter
+
+        Raises:
+            No exceptions
+        '''
+        dct_export = self.get_config_section('Export')
+        if not dct_export.get('enabled', False):
+            return
+        if not pyarrow_installed():
+            logging.warning(f'{date}: pyarrow is not installed, WRK data not exported')
+            return
+
+        try:
+            with self.metrics.stage(date, 'export_wrk', rows=len(df_wrk)):
+                write_partition(df_wrk, self.export_path(), date, chunk,
+                                row_group_rows=dct_export.get('row_group_rows', 1000))
+        except Exception as e:
+            logging.exception(f'{date}: WRK data not exported')
+
+    def export_year(self, year):
+        '''Exports a season's WRK table to the Parquet export, replacing the
+        files of every date in the table.
+
+        Args:
+            year(str): The season to export.
+
+        Returns:
+            Does not return a parameter
+
+        Raises:
+            No exceptions
+        '''
+        if not pyarrow_installed():
+            print('pyarrow is not installed, nothing exported')
+            return
+
+        self.dbtype = self.get_config_section('Database_System')['db_type']
+        self.connect_db()
+        try:
+            with self.metrics.stage(year, 'export_wrk') as dct_metric:
+                dct_rows = export_wrk(self.engine, year, self.export_path(),
+                                      row_group_rows=self.get_config_section('Export').get('row_group_rows', 1000))
+                dct_metric['rows'] = sum(dct_rows.values())
+            print(f'Completed: wrk_statcast_{year} exported to {self.export_path()}, '
+                  f'{len(dct_rows)} date(s), {dct_metric["rows"]} rows')
+            logging.info(f'{year}: wrk_statcast_{year} exported, {len(dct_rows)} date(s)')
+        except Exception as e:
+            print(f'Unable to export wrk_statcast_{year}')
+            logging.exception(f'{year}: Could not export wrk_statcast_{year}')
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def manage_indexes(self, lst_years, action):
+        '''Creates the missing indexes, or drops the existing ones, on the RAW,
+        WRK and rollup tables of each season (see db_indexes.INDEXES).
+
+        Args:
+            lst_years(list): The seasons, e.g. ['2019'].
+            action(str): 'create' or 'drop'.
+
+        Returns:
+            Does not return a parameter
+
+        Raises:
+            No exceptions
+        '''
+        for year in lst_years:
+            try:
+                with self.metrics.stage(year, f'{action}_indexes') as dct_metric:
+                    if action == 'drop':
+                        dct_metric['indexes'] = drop_indexes(self.engine, year_tables(year))
+                    else:
+                        dct_metric['indexes'] = create_indexes(self.engine, year_tables(year))
+                if dct_metric['indexes']:
+                    print(f'Completed: {action.capitalize()} {dct_metric["indexes"]} index(es) on the {year} tables')
+                    logging.info(f'{year}: {action} {dct_metric["indexes"]} index(es)')
+            except Exception as e:
+                logging.exception(f'{year}: Could not {action} the indexes')
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
+    def check_rollups(self, year, rebuild=False):
+        '''Recomputes each rollup of a season from its WRK table and reports
+        the rows where the stored rollup differs, optionally rebuilding it.
+
+        Args:
+            year(str): The season to check.
+            rebuild(bool): Replace a rollup that differs with the recomputed one.
+
+        Returns:
+            dict: {rollup name: DataFrame of the keys that differed}
+
+        Raises:
+            No exceptions
+        '''
+        self.dbtype = self.get_config_section('Database_System')['db_type']
+        self.connect_db()
+
+        dct_diffs = {}
+        for name in ROLLUPS:
+            df_diff = check_rollup(self.engine, name, year)
+            dct_diffs[name] = df_diff
+            table = rollup_table(name, year)
+            print(f'{table}: {len(df_diff)} row(s) differ from wrk_statcast_{year}')
+            if len(df_diff):
+                print(df_diff.head(10).to_string(index=False))
+                logging.warning(f'{table}: {len(df_diff)} row(s) differ from wrk_statcast_{year}')
+                if rebuild:
+                    rows = rebuild_rollup(self.engine, name, year, self.dct_loader)
+                    print(f'Rebuilt: {table} from wrk_statcast_{year}, {rows} rows')
+
+        return dct_diffs
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def plan_manifest_dates(self, lst_dates, resume, refresh):
+        '''Returns the dates to load, skipping those self.dct_manifest shows as
+        loaded, and failed or interrupted ones unless resuming (see
+        ingest_manifest.plan_dates()). Prints what was skipped.
+
+        Args:
+            lst_dates(list): The requested dates, formatted 'yyyy-mm-dd'.
+            resume(bool): Retry the dates that failed or were interrupted.
+            refresh(bool): Load every date again.
+
+        Returns:
+            list: The dates to load.
+
+        Raises:
+            No exceptions
+        '''
+        lst_dates, dct_skipped = plan_dates(self.dct_manifest, lst_dates, resume, refresh)
+        if dct_skipped['done']:
+            print(f'Skipped: {len(dct_skipped["done"])} date(s) already loaded')
+            logging.info(f'Skipped {len(dct_skipped["done"])} date(s) already loaded')
+        if dct_skipped['unfinished']:
+            print(f'Skipped: {len(dct_skipped["unfinished"])} date(s) that failed or were interrupted, '
+                  f'resume to retry them: {dct_skipped["unfinished"][:5]}')
+            logging.warning(f'Skipped {len(dct_skipped["unfinished"])} failed or interrupted date(s): '
+                            f'{dct_skipped["unfinished"]}')
+        print(f'{len(lst_dates)} date(s) to load')
+        logging.info(f'{len(lst_dates)} date(s) to load')
+
+        return lst_dates
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def __getstate__(self):
+        '''Drops the database connection, GUI widgets and loaded lookups when the
+        object is pickled to be sent to a build worker process.
+        '''
+        dct_state = self.__dict__.copy()
+        for attr in ['engine', 'window', 'entry_a', 'entry_b', 'entry_c', 'entry_d',
+                     'df', 'dct_pos', 'dct_bop', 'dct_ss', 'dct_parks', 'lookup_year', 'dct_manifest']:
+            dct_state.pop(attr, None)
+
+        return dct_state
 
 # ------------------------------------------------------------------------------
 # ++++++++++++++Builder Method+++++++++++++++++++++++++++++++++++++++++++++++++
 # -----------------------------------------------------------------------------
 
-    def build_db(self):
+    def build_db(self, workers=None, resume=False, refresh=False, lst_dates=None, interactive=True):
         '''Builds MLB Statcast tables within a pre-defined SQL database.
 
         Through a pipeline, this method will build tables containing all available
@@ -895,8 +1639,41 @@ class Statcast_DB():
         that is created to track the progress. The data tables are created day-by-day,
         with each day appended. This should limit memory usage.
 
+        With more than one worker, the dates are fetched and transformed in a
+        pool of worker processes while this process acts as the single writer
+        for every table. Only a few days are in flight at a time, so memory use
+        stays bounded by the worker count rather than the number of dates.
+
+        Every date is recorded in the 'ingest_manifest' table, and every build
+        reads it: dates already loaded (or that had no data) are skipped, so
+        building over them again does not duplicate their rows. If a build
+        stops part way through, calling build_db(resume=True) also reloads
+        the dates that failed or were interrupted, replacing their partial
+        rows. refresh=True reloads every date, replacing the loaded ones.
+
+        The indexes of the seasons being loaded (see db_indexes.py) are dropped
+        before the first insert and built again once every date is loaded,
+        unless 'defer_during_build' is False in the 'Indexes' section of
+        config.yaml.
+
+        The rolling player form (see player_form.py) of each season is
+        computed from its WRK table once every date is loaded; stream_data()
+        and stream_range() then update it a day at a time.
+
         Args:
-            No arguments
+            workers(int): Number of worker processes used to fetch and transform
+                          dates. Defaults to the 'workers' value of the 'Build'
+                          section in config.yaml, or 1 (serial) if not set.
+            resume(bool): Retry the dates the manifest shows as failed or
+                          interrupted.
+            refresh(bool): Re-download every date instead of reading the local
+                           raw data cache, and reload the dates the manifest
+                           shows as loaded.
+            lst_dates(list): Dates to load, formatted 'yyyy-mm-dd'. Defaults to
+                             every date of the seasons being built.
+            interactive(bool): Ask for the database in the GUI prompt. If False,
+                               the database in config.yaml is used, so the build
+                               can run on a server without a display.
 
         Returns:
             Does not return a parameter
@@ -906,6 +1683,7 @@ class Statcast_DB():
 
         '''
         startTime = datetime.now()
+        self.refresh_cache = refresh
 
 
         logging.basicConfig(filename=f'{self.parent_path}/logs/build_db.log',
@@ -915,126 +1693,131 @@ class Statcast_DB():
                             level=logging.INFO)
 
         try:
-            self.prompt_window()
+            if interactive:
+                self.prompt_window()
+            else:
+                self.dbtype = self.get_config_section('Database_System')['db_type']
+                self.connect_db()
             logging.info(f'Connected to: \nServer: {self.server}\nDatabase: {self.database}')
         except Exception as e:
             logging.exception('Exception occured')
 
-        lst_year = ['2016', '2017', '2018', '2019']
-        lst_month = ['03', '09']
-        lst_day_31 = ['01', '31']
-        lst_day_30 = ['01','30']
-
-#         lst_year =  list(reversed([str(i) for i in range(2008,2021)]))
-#         lst_month = ['0'+str(i) for i in range(3,10)] + [str(i) for i in range(10,12)]
-#         lst_day_31 = ['0'+str(i) for i in range(1,10)] + [str(i) for i in range(10,32)]
-#         lst_day_30 = ['0'+str(i) for i in range(1,10)] + [str(i) for i in range(10,31)]
-
-
-
-        for y in range(0, len(lst_year)):
-            self.dct_pos = ujson.load(open(f'{self.parent_path}/dicts/dct_pos_{lst_year[y]}.txt'))
-            self.dct_bop = ujson.load(open(f'{self.parent_path}/dicts/dct_bop_{lst_year[y]}.txt'))
-            self.dct_ss = ujson.load(open(f'{self.parent_path}/dicts/dct_ss_{lst_year[y]}.txt'))
-            self.dct_parks = dict(zip(self.team_atts['Team'], self.team_atts[f'Ball_Park_{lst_year[y]}']))
+        if lst_dates is None:
+            lst_year = ['2016', '2017', '2018', '2019']
+            lst_month = ['03', '09']
+            lst_day_31 = ['01', '31']
+            lst_day_30 = ['01','30']
+
+#             lst_year =  list(reversed([str(i) for i in range(2008,2021)]))
+#             lst_month = ['0'+str(i) for i in range(3,10)] + [str(i) for i in range(10,12)]
+#             lst_day_31 = ['0'+str(i) for i in range(1,10)] + [str(i) for i in range(10,32)]
+#             lst_day_30 = ['0'+str(i) for i in range(1,10)] + [str(i) for i in range(10,31)]
+
+            lst_dates = []
+            for y in range(0, len(lst_year)):
+                for m in range(0, len(lst_month)):
+                    if any(lst_month[m] == x for x in ['03', '05', '07', '08', '10']):
+                        lst_day = lst_day_31
+                    else:
+                        lst_day = lst_day_30
+                    for d in range(0, len(lst_day)):
+                        lst_dates.append(f'{lst_year[y]}-{lst_month[m]}-{lst_day[d]}')
 
-            for m in range(0, len(lst_month)):
-                if any(lst_month[m] == x for x in ['03', '05', '07', '08', '10']):
-                    lst_day = lst_day_31
-                else:
-                    lst_day = lst_day_30
-                for d in range(0, len(lst_day)):
+        create_manifest(self.engine)
+        self.dct_manifest = read_manifest(self.engine)
+        lst_dates = self.plan_manifest_dates(lst_dates, resume, refresh)
 
-                    try:
-                        self.df = pd.DataFrame(statcast(start_dt=f'{lst_year[y]}-{lst_month[m]}-{lst_day[d]}',
-                                                        end_dt=f'{lst_year[y]}-{lst_month[m]}-{lst_day[d]}'))
-                    except Exception as e:
-                        logging.exception("Exception occurred")
+        # Indexes slow every insert down, so they are dropped for the load and
+        # built once at the end.
+        lst_years = sorted({date[:4] for date in lst_dates})
+        if self.get_config_section('Indexes').get('defer_during_build', True):
+            self.manage_indexes(lst_years, 'drop')
 
-                    self.df = self.df.replace({np.nan: None})
+        if workers is None:
+            workers = self.get_config_section('Build').get('workers', 1)
 
-                    if self.df.empty:
-                        print(f'{lst_year[y]}-{lst_month[m]}-{lst_day[d]}: NO DATA FOR THIS DATE')
-                        logging.warning(f'{lst_year[y]}-{lst_month[m]}-{lst_day[d]}: NO DATA FOR THIS DATE')
-                    else:
-                        print('............')
-                        print(f'|{lst_year[y]}/{lst_month[m]}/{lst_day[d]}|')
-                        print('............')
-                        print(f'Completed: RAW data imported from Baseball Savant')
-                        logging.info(f'{lst_year[y]}-{lst_month[m]}-{lst_day[d]}: RAW data imported from Baseball Savant')
-
-                        try:
-                            self.df.drop(['pitcher.1', 'fielder_2.1', 'post_away_score', 'post_home_score', 'post_bat_score', 'post_fld_score'],
-                                         axis=1,
-                                         inplace=True)
-                            self.df.to_sql(f'raw_statcast_{lst_year[y]}',
-                                           self.engine,
-                                           index=False,
-                                           if_exists='append')
-                            print(f'Completed: Raw data inserted into DB: STATCAST , TABLE: raw_statcast_{lst_year[y]}')
-                            logging.info(f'{lst_year[y]}-{lst_month[m]}-{lst_day[d]}: Raw data inserted into DB: STATCAST , TABLE: raw_statcast_{lst_year[y]}')
-                        except Exception as e:
-                            logging.exception("Exception occurred")
-
-                        try:
-                            self.reorder_columns()
-                            self.rename_columns()
-                            self.add_batter_name()
-                            self.add_player_names()
-                            self.add_teams()
-                            self.add_lg_div()
-                            self.add_ballparks(lst_year[y])
-                            self.add_batter_pos()
-                            self.add_batter_bop()
-                            self.add_batter_ss()
-                            self.add_post_scores()
-                            self.add_cnt_pa()
-                            self.add_cnt_ab()
-                            self.add_cnt_hit()
-                            self.add_cnt_single()
-                            self.add_cnt_double()
-                            self.add_cnt_triple()
-                            self.add_cnt_home_run()
-                            self.add_cnt_k()
-                            self.add_cnt_backwardsk()
-                            self.add_cnt_walk()
-                            self.add_cnt_hbp()
-                            self.add_cnt_rbi()
-                            self.add_yahoo_pnts()
-
-                            print(f'{lst_year[y]}-{lst_month[m]}-{lst_day[d]}: Data transformation complete')
-                            logging.info(f'{lst_year[y]}-{lst_month[m]}-{lst_day[d]}: Data transformation complete')
-                        except Exception as e:
-                            logging.exception('Exception Occured')
-
-                        try:
-                            self.df.to_sql(f'wrk_statcast_{lst_year[y]}',
-                                           self.engine,
-                                           index=False,
-                                           if_exists='append')
-                            print(f'Completed: Working data inserted into DB: STATCAST , TABLE: wrk_statcast_{lst_year[y]}')
-                            print(f'Time Elapsed: {datetime.now() - startTime}\n')
-                            logging.info(f'{lst_year[y]}-{lst_month[m]}-{lst_day[d]}: Working data inserted into DB: STATCAST , TABLE: wrk_statcast_{lst_year[y]}\nTime Elapsed: {datetime.now() - startTime}')
-                        except Exception as e:
-                            logging.exception("Exception occurred")
+        if workers > 1:
+            logging.info(f'Building with {workers} worker processes')
+            try:
+                # Loaded once here and pickled to the workers, so they do not
+                # each refresh the PlayerID Map snapshot.
+                self.dct_playerIDs
+            except Exception as e:
+                logging.exception('Exception occurred')
+            with ProcessPoolExecutor(max_workers=workers,
+                                     initializer=_init_build_worker,
+                                     initargs=(self,)) as executor:
+                dct_pending = {}
+                for date in lst_dates:
+                    dct_pending[executor.submit(_process_date_worker, date)] = date
+                    if len(dct_pending) >= workers * 2:
+                        self._write_completed(dct_pending, startTime)
+                while dct_pending:
+                    self._write_completed(dct_pending, startTime)
+        else:
+            for date in lst_dates:
+                try:
+                    df_raw, df_wrk = self.process_date(date)
+                except Exception as e:
+                    self.record_date_status(date, STATUS_FAILED)
+                    continue
+                self.write_date(date, df_raw, df_wrk, startTime)
+
+        # Dates finish out of order with several workers, so the rolling player
+        # form is computed once per season after the load rather than per date.
+        for year in lst_years:
+            self.rebuild_year_form(year)
+        self.manage_indexes(lst_years, 'create')
 
         print('\n\n--------All Dates Complete--------')
         print(f'Total Time Elapsed: {datetime.now() - startTime}')
         logging.info(f'--------All Dates Complete--------\nTotal Time Elapsed: {datetime.now() - startTime}')
+        print(self.metrics.summary())
+        logging.info(f'Run metrics ({self.metrics.path}):\n{self.metrics.summary()}')
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def _write_completed(self, dct_pending, startTime):
+        '''Waits for at least one worker to finish and writes every completed date.'''
+        done, _ = wait(dct_pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            date = dct_pending.pop(future)
+            try:
+                df_raw, df_wrk, lst_metrics = future.result()
+                self.metrics.add(lst_metrics)
+            except Exception as e:
+                logging.exception(f'{date}: Exception occurred in build worker')
+                self.record_date_status(date, STATUS_FAILED)
+                continue
+            self.write_date(date, df_raw, df_wrk, startTime)
 
 # ------------------------------------------------------------------------------
 # ++++++++++++Streaming Method+++++++++++++++++++++++++++++++++++++++++++++++++
 # ------------------------------------------------------------------------------
-    def stream_data(self, date):
+    def stream_data(self, date, refresh=False):
         '''Appends new MLB statcast data for a specified date. Designed to
         be used as a streaming pipline for new daily data during in-season.
 
         Once the database is built, this method can be used to add new data
         to the RAW and WRK tables. This method should be used while scheduling
         a task to send new daily data through the pipeline during in-season.
+        The position and batting order lookups are refreshed from the day's
+        game logs first; the transformation itself is the same transform_wrk()
+        that build_db() runs, so both write the same WRK columns.
+
+        The RAW and WRK rows are upserted on PITCH_KEYS (see
+        db_loader.upsert_df()): pitches already in a table are replaced rather
+        than appended, so running a date again, or after a partial failure,
+        leaves one copy of each pitch. Each table's outcome is recorded in the
+        ingestion manifest as build_db() does. If the lookup refresh or the
+        transformation fails, the WRK upsert is skipped and the date is marked
+        failed for the WRK table, so a partly transformed frame is never
+        written; build_db(resume=True) or streaming the date again reloads it.
 
         Args:
-            No arguments
+            date(str): The date to append, formatted 'yyyy-mm-dd'.
+            refresh(bool): Re-download the date instead of reading the local
+                           raw data cache.
 
         Returns:
             Does not return a parameter
@@ -1049,75 +1832,343 @@ class Statcast_DB():
                             level=logging.INFO)
 
         startTime = datetime.now()
+        self.refresh_cache = refresh
 
-        self.dbtype = self.lst_config[0]['Database_System']['db_type']
+        self.dbtype = self.get_config_section('Database_System')['db_type']
         self.connect_db()
         try:
             self.engine.connect()
             print(f'Connected to: \nServer: {self.server}\nDatabase: {self.database}')
             logging.info(f'\nConnection Successful \nServer: {self.server}\nDatabase: {self.database}')
         except Exception as e:
-            Print('Unable to connect to Server: {self.sever]}')
+            print(f'Unable to connect to Server: {self.server}')
             logging.exception('Exception Occured')
 
+        create_manifest(self.engine)
         try:
-            self.df = pd.DataFrame(statcast(start_dt=f'{date}',
-                                            end_dt=f'{date}'))
+            self.load_year_lookups(date[:4], missing_ok=True)
+            self.df = self.fetch_raw_day(date)
+            if self.df is None:
+                self.record_date_status(date, STATUS_EMPTY)
         except Exception as e:
             logging.exception("Exception occurred")
+            self.record_date_status(date, STATUS_FAILED)
+            self.df = None
 
-        self.df = self.df.replace({np.nan: None})
-        self.dct_parks = dict(zip(self.team_atts['Team'], self.team_atts[f'Ball_Park_{int(self.df.game_year.loc[1])}']))
-
-        if self.df.empty:
-            print(f'{date}: NO DATA FOR THIS DATE')
-            logging.warning(f'{date}: NO DATA FOR THIS DATE')
-        else:
+        if self.df is not None:
+            year = date[:4]
             print('............')
             print(f'|{date}|')
             print('............')
-            print(f'Completed: RAW data imported from Baseball Savant')
-            logging.info(f'{date}: RAW data imported from Baseball Savant')
+            tableTime = datetime.now()
             try:
-                self.df.drop(['pitcher.1', 'fielder_2.1'],
-                             axis=1,
-                             inplace=True)
-                self.df.to_sql(f'raw_statcast_{int(self.df.game_year.loc[1])}',
-                               self.engine,
-                               index=False,
-                               if_exists='append')
-                print(f'Completed: Raw data inserted into DB: STATCAST , TABLE: raw_statcast_{int(self.df.game_year.loc[1])}')
-                logging.info(f'{date}: Raw data inserted into DB: STATCAST , TABLE: raw_statcast_{int(self.df.game_year.loc[1])}')
+                record_manifest(self.engine, date, f'raw_statcast_{year}', STATUS_STARTED)
+                with self.metrics.stage(date, 'insert_raw', rows=len(self.df), bytes=frame_bytes(self.df)) as dct_metric:
+                    dct_metric['replaced'] = upsert_df(self.df, f'raw_statcast_{year}', self.engine,
+                                                       PITCH_KEYS['raw'], self.dct_loader)
+                bump_watermark(self.engine, f'raw_statcast_{year}', date, len(self.df) - dct_metric['replaced'])
+                record_manifest(self.engine, date, f'raw_statcast_{year}', STATUS_COMPLETE, len(self.df),
+                                (datetime.now() - tableTime).total_seconds())
+                print(f'Completed: Raw data inserted into DB: STATCAST , TABLE: raw_statcast_{year}, '
+                      f'{dct_metric["replaced"]} existing rows replaced')
+                logging.info(f'{date}: Raw data inserted into DB: STATCAST , TABLE: raw_statcast_{year}, '
+                             f'{dct_metric["replaced"]} existing rows replaced')
             except Exception as e:
                 logging.exception("Exception occurred")
+                self.record_table_failed(date, f'raw_statcast_{year}', tableTime)
+
+            tableTime = datetime.now()
             try:
-                self.reorder_columns()
-                self.rename_columns()
-                self.add_batter_name()
-                self.add_player_names()
-                self.add_teams()
-                self.add_lg_div()
-                self.add_ballparks(self.df['Game_Year'][0])
-                self.stream_pos_bop_dct(date)
-                self.add_batter_pos()
-                self.add_batter_bop()
+                self.stream_pos_bop_dct(date, self.df['batter'].unique())
+                self.transform_wrk(year, date)
                 print(f'Completed: Data transformation')
                 logging.info(f'{date}: Data transformation complete')
-            except:
-                logging.exception("Exception occurred")
-
-            try:
-                self.df.to_sql(f'wrk_statcast_{int(self.df.Game_Year.loc[1])}',
-                               self.engine,
-                               index=False,
-                               if_exists='append')
-                print(f'Completed: Working data inserted into DB: STATCAST , TABLE: wrk_statcast_{int(self.df.Game_Year.loc[1])}\n')
-                logging.info(f'''{date}: Working data inserted into DB: STATCAST , TABLE:
-                              wrk_statcast_{int(self.df.Game_Year.loc[1])}\nTime Elapsed: {datetime.now() - startTime}''')
             except Exception as e:
                 logging.exception("Exception occurred")
+                print(f'Failed: Data transformation, WRK data not inserted for {date}')
+                self.record_table_failed(date, f'wrk_statcast_{year}', tableTime)
+            else:
+                try:
+                    record_manifest(self.engine, date, f'wrk_statcast_{year}', STATUS_STARTED)
+                    with self.metrics.stage(date, 'insert_wrk', rows=len(self.df),
+                                            bytes=frame_bytes(self.df)) as dct_metric:
+                        dct_metric['replaced'] = upsert_df(self.df, f'wrk_statcast_{year}', self.engine,
+                                                           PITCH_KEYS['wrk'], self.dct_loader)
+                    bump_watermark(self.engine, f'wrk_statcast_{year}', date, len(self.df) - dct_metric['replaced'])
+                    record_manifest(self.engine, date, f'wrk_statcast_{year}', STATUS_COMPLETE, len(self.df),
+                                    (datetime.now() - tableTime).total_seconds())
+                    self.write_rollups(date, self.df)
+                    self.write_form(date, self.df)
+                    self.write_export(date, self.df)
+                    print(f'Completed: Working data inserted into DB: STATCAST , TABLE: wrk_statcast_{year}\n')
+                    logging.info(f'''{date}: Working data inserted into DB: STATCAST , TABLE:
+                                  wrk_statcast_{year}\nTime Elapsed: {datetime.now() - startTime}''')
+                except Exception as e:
+                    logging.exception("Exception occurred")
+                    self.record_table_failed(date, f'wrk_statcast_{year}', tableTime)
+
+            self.manage_indexes([year], 'create')
 
 
         print(f'--------{date} Complete--------')
         print(f'Total Time Elapsed: {datetime.now() - startTime}')
         logging.info(f'--------{date} Complete--------\nTotal Time Elapsed: {datetime.now() - startTime}')
+        print(self.metrics.summary())
+        logging.info(f'Run metrics ({self.metrics.path}):\n{self.metrics.summary()}')
+
+
+# ------------------------------------------------------------------------------
+# ++++++++++++Chunked Pipeline Methods+++++++++++++++++++++++++++++++++++++++++
+# ------------------------------------------------------------------------------
+    def iter_raw_chunks(self, lst_dates, chunk_games=None):
+        '''Fetches each date and yields its RAW data in chunks of whole games.
+
+        Only one date is held at a time, and each chunk holds at most
+        chunk_games games, so memory stays bounded however many dates are
+        requested. A game is never split across chunks, so any transformation
+        that looks across the pitches of a game sees all of them, and the
+        games are chunked in game_pk order, the order the player form windows
+        run in within a date.
+
+        Each chunk is a dictionary:
+            'date'    the date, formatted 'yyyy-mm-dd'
+            'chunk'   position of the chunk within the date, from 0
+            'chunks'  number of chunks for the date (0 if there was no data)
+            'raw'     the RAW DataFrame, None if the date is empty or failed
+            'wrk'     None, filled in by iter_wrk_chunks()
+            'status'  None, or STATUS_EMPTY/STATUS_FAILED for a date without data
+
+        Args:
+            lst_dates(iterable): Dates to fetch, formatted 'yyyy-mm-dd'.
+            chunk_games(int): Maximum games per chunk. Defaults to the
+                              'chunk_games' value of the 'Build' section in
+                              config.yaml, or 5.
+
+        Returns:
+            generator: The chunks, in date order.
+
+        Raises:
+            No exceptions
+        '''
+        if chunk_games is None:
+            chunk_games = self.get_config_section('Build').get('chunk_games', 5)
+
+        for date in lst_dates:
+            try:
+                df_day = self.fetch_raw_day(date)
+            except Exception as e:
+                yield {'date': date, 'chunk': 0, 'chunks': 0, 'raw': None, 'wrk': None, 'status': STATUS_FAILED}
+                continue
+
+            if df_day is None:
+                yield {'date': date, 'chunk': 0, 'chunks': 0, 'raw': None, 'wrk': None, 'status': STATUS_EMPTY}
+                continue
+
+            lst_game_idx = list(df_day.groupby('game_pk', sort=True).indices.values())
+            lst_groups = [lst_game_idx[g:g + chunk_games] for g in range(0, len(lst_game_idx), chunk_games)]
+            for c in range(0, len(lst_groups)):
+                arr_rows = np.sort(np.concatenate(lst_groups[c]))
+                yield {'date': date, 'chunk': c, 'chunks': len(lst_groups),
+                       'raw': df_day.iloc[arr_rows].reset_index(drop=True), 'wrk': None, 'status': None}
+            del df_day
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def iter_wrk_chunks(self, chunks):
+        '''Runs the WRK transformation on each chunk and yields it on with
+        its 'wrk' DataFrame filled in. A chunk whose transformation fails is
+        yielded with 'wrk' left as None.
+
+        Args:
+            chunks(iterable): Chunks from iter_raw_chunks().
+
+        Returns:
+            generator: The transformed chunks.
+
+        Raises:
+            No exceptions
+        '''
+        for dct_chunk in chunks:
+            if dct_chunk['raw'] is not None:
+                self.df = dct_chunk['raw']
+                try:
+                    self.transform_wrk(dct_chunk['date'][:4], dct_chunk['date'])
+                    dct_chunk['wrk'] = self.df
+                except Exception as e:
+                    logging.exception(f'{dct_chunk["date"]}: Exception occurred in chunk {dct_chunk["chunk"]}')
+                self.df = None
+            yield dct_chunk
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def write_chunks(self, chunks, kind):
+        '''Inserts the RAW or WRK DataFrame of each chunk and yields the chunk on.
+
+        The manifest is kept per date, as in write_date(): the first chunk of
+        a date marks it started (clearing the rows of an earlier failed
+        attempt), and the last chunk marks it complete with the date's total
+        row count. A table already complete for the date in self.dct_manifest
+        is not written again, as in write_date(): e.g. when a date whose WRK
+        write failed is resumed, its RAW chunks are only passed on to be
+        transformed. Once a chunk fails the rest of that date is skipped and
+        the date is marked failed. The DataFrame of a failed or skipped chunk is set to
+        None, so a date whose RAW write fails is not transformed and its WRK
+        table is marked failed as well.
+
+        Args:
+            chunks(iterable): Chunks from iter_raw_chunks() or iter_wrk_chunks().
+            kind(str): 'raw' or 'wrk', the DataFrame and tables to write.
+
+        Returns:
+            generator: The chunks, after they were written.
+
+        Raises:
+            No exceptions
+        '''
+        date_col = 'game_date' if kind == 'raw' else 'Game_Date'
+        dct_rows = {}
+
+        for dct_chunk in chunks:
+            date = dct_chunk['date']
+            table = f'{kind}_statcast_{date[:4]}'
+            status = self.dct_manifest.get((date, table))
+
+            if dct_chunk['status'] is not None:
+                if kind == 'raw':
+                    self.record_date_status(date, dct_chunk['status'])
+            elif status == STATUS_COMPLETE:
+                if dct_chunk['chunk'] == 0:
+                    print(f'Skipped: {date} {kind.upper()} data already in DB: STATCAST , TABLE: {table}')
+            elif status == STATUS_FAILED and dct_chunk['chunk'] > 0:
+                dct_chunk[kind] = None
+            else:
+                try:
+                    if dct_chunk['chunk'] == 0:
+                        if status is not None:
+                            delete_date_rows(self.engine, table, date_col, date)
+                        record_manifest(self.engine, date, table, STATUS_STARTED)
+                        self.dct_manifest[(date, table)] = STATUS_STARTED
+                        dct_rows[table] = (0, datetime.now())
+                    if dct_chunk[kind] is None:
+                        raise ValueError(f'No {kind.upper()} data for chunk {dct_chunk["chunk"]}')
+                    df = dct_chunk[kind]
+                    if dct_chunk['chunk'] == 0:
+                        add_missing_columns(df, table, self.engine)
+                    with self.metrics.stage(date, f'insert_{kind}', rows=len(df), bytes=frame_bytes(df), table=table):
+                        insert_df(df, table, self.engine, self.dct_loader)
+                    bump_watermark(self.engine, table, date, len(df))
+                    if kind == 'wrk':
+                        self.write_rollups(date, df)
+                        self.write_form(date, df)
+                        self.write_export(date, df, dct_chunk['chunk'])
+                    rows, tableTime = dct_rows[table]
+                    dct_rows[table] = (rows + len(df), tableTime)
+                    if dct_chunk['chunk'] == dct_chunk['chunks'] - 1:
+                        record_manifest(self.engine, date, table, STATUS_COMPLETE, rows + len(df),
+                                        (datetime.now() - tableTime).total_seconds())
+                        self.dct_manifest[(date, table)] = STATUS_COMPLETE
+                        print(f'Completed: {date} {kind.upper()} data inserted into DB: STATCAST , TABLE: {table}')
+                        logging.info(f'{date}: {kind.upper()} data inserted into DB: STATCAST , TABLE: {table}')
+                except Exception as e:
+                    logging.exception("Exception occurred")
+                    dct_chunk[kind] = None
+                    self.dct_manifest[(date, table)] = STATUS_FAILED
+                    try:
+                        record_manifest(self.engine, date, table, STATUS_FAILED)
+                    except Exception as e:
+                        logging.exception("Exception occurred")
+
+            yield dct_chunk
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def stream_range(self, start_dt, end_dt=None, chunk_games=None, resume=False, refresh=False):
+        '''Loads a range of dates through the chunked pipeline:
+        fetch -> RAW write -> transform -> WRK write.
+
+        The stages are chained generators, so each chunk of games is written
+        to the RAW table, transformed and written to the WRK table before the
+        next chunk is fetched. Peak memory is one date's RAW data plus one
+        chunk, regardless of how long the range is, so a whole season can be
+        loaded in one call. The database comes from config.yaml, and the
+        transformation uses the stored lookup dictionaries, as build_db() does.
+
+        Args:
+            start_dt(str): First date, formatted 'yyyy-mm-dd'.
+            end_dt(str): Last date, formatted 'yyyy-mm-dd'. Defaults to start_dt.
+            chunk_games(int): Maximum games per chunk, see iter_raw_chunks().
+            resume(bool): Retry the dates the manifest shows as failed or
+                          interrupted. Loaded dates are always skipped.
+            refresh(bool): Re-download instead of reading the local raw data
+                           cache, and reload the dates already loaded.
+
+        Returns:
+            Does not return a parameter
+
+        Raises:
+            No exceptions
+        '''
+        logging.basicConfig(filename=f'{self.parent_path}/logs/stream_range.log',
+                            filemode='w',
+                            format='%(asctime)s - %(levelname)s - %(message)s',
+                            datefmt='%d-%b-%y %H:%M:%S',
+                            level=logging.INFO)
+
+        startTime = datetime.now()
+        self.refresh_cache = refresh
+
+        self.dbtype = self.get_config_section('Database_System')['db_type']
+        self.connect_db()
+        create_manifest(self.engine)
+        self.dct_manifest = read_manifest(self.engine)
+        lst_dates = [d.strftime('%Y-%m-%d') for d in pd.date_range(start_dt, end_dt or start_dt)]
+        lst_dates = self.plan_manifest_dates(lst_dates, resume, refresh)
+
+        chunks = self.iter_raw_chunks(lst_dates, chunk_games)
+        chunks = self.write_chunks(chunks, 'raw')
+        chunks = self.iter_wrk_chunks(chunks)
+        chunks = self.write_chunks(chunks, 'wrk')
+        for dct_chunk in chunks:
+            if dct_chunk['chunk'] == max(dct_chunk['chunks'] - 1, 0):
+                print(f'--------{dct_chunk["date"]} Complete--------  Time Elapsed: {datetime.now() - startTime}')
+
+        self.manage_indexes(sorted({date[:4] for date in lst_dates}), 'create')
+
+        print(f'Total Time Elapsed: {datetime.now() - startTime}')
+        logging.info(f'--------{start_dt} to {end_dt or start_dt} Complete--------\nTotal Time Elapsed: {datetime.now() - startTime}')
+        print(self.metrics.summary())
+        logging.info(f'Run metrics ({self.metrics.path}):\n{self.metrics.summary()}')
+
+
+# ------------------------------------------------------------------------------
+# ++++++++++++++Build Worker Functions+++++++++++++++++++++++++++++++++++++++++
+# ------------------------------------------------------------------------------
+
+_worker_db = None
+
+
+def _init_build_worker(statcast_db):
+    '''Initializes a build worker process with its own copy of the Statcast_DB
+    object. The per-year lookups are loaded lazily by process_date(), so each
+    worker parses a year's dictionaries at most once.
+    '''
+    global _worker_db
+    _worker_db = statcast_db
+    _worker_db.metrics.buffer()
+    logging.basicConfig(filename=f'{statcast_db.parent_path}/logs/build_db_worker_{os.getpid()}.log',
+                        filemode='w',
+                        format='%(asctime)s - %(levelname)s - %(message)s',
+                        datefmt='%d-%b-%y %H:%M:%S',
+                        level=logging.INFO,
+                        force=True)
+
+
+def _process_date_worker(date):
+    '''Runs Statcast_DB.process_date() for a date inside a build worker, and
+    returns the RAW and WRK data with the worker's metrics records.'''
+    try:
+        df_raw, df_wrk = _worker_db.process_date(date)
+    finally:
+        lst_metrics = _worker_db.metrics.drain()
+
+    return df_raw, df_wrk, lst_metrics
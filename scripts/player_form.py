@@ -0,0 +1,411 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import logging
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, inspect, text
+
+from db_loader import insert_df, replace_dfs
+from rollups import MAX_IN_PARAMS
+from table_watermarks import bump_watermark
+
+
+# Player form is kept for each role: {role: WRK column with the player's ID}.
+# A pitcher's form is what the batters faced did against the pitcher.
+FORM_ROLES = {'batter': 'Batter_ID', 'pitcher': 'Pitcher_ID'}
+
+# Event_Description values counted as a swing, a swing and miss, and a ball
+# in play (the pitches whose Exit_Velo is averaged).
+SWING_DESCRIPTIONS = ['swinging_strike', 'swinging_strike_blocked', 'foul', 'foul_tip', 'foul_bunt', 'missed_bunt',
+                      'bunt_foul_tip', 'hit_into_play', 'hit_into_play_no_out', 'hit_into_play_score']
+WHIFF_DESCRIPTIONS = ['swinging_strike', 'swinging_strike_blocked', 'foul_tip', 'missed_bunt', 'bunt_foul_tip']
+IN_PLAY_DESCRIPTIONS = ['hit_into_play', 'hit_into_play_no_out', 'hit_into_play_score']
+
+# The per plate appearance measures the windows are summed from, and the form
+# columns computed from the sums: {stat: (numerator, denominator or None)}.
+FORM_MEASURES = ['PA', 'Hit', 'HR', 'Pnts', 'EV_Sum', 'EV_Cnt', 'Swings', 'Whiffs']
+FORM_STATS = {'PA': ('PA', None),
+              'Hit': ('Hit', None),
+              'HR': ('HR', None),
+              'Pnts': ('Pnts', None),
+              'Exit_Velo': ('EV_Sum', 'EV_Cnt'),
+              'Whiff_Rate': ('Whiffs', 'Swings')}
+
+FORM_KEYS = ['Role', 'Player_ID', 'Game_Date', 'Game_ID']
+DEFAULT_GAMES = [5, 15]
+DEFAULT_PAS = [25, 100]
+
+
+def form_table(year):
+    '''Returns the table with a season's rolling player form, one row per
+    player and game.'''
+    return f'player_form_{year}'
+
+
+def state_table(year):
+    '''Returns the table with the plate appearances a season's incremental
+    form updates start from.'''
+    return f'player_form_state_{year}'
+
+
+def form_columns(lst_games=DEFAULT_GAMES, lst_pas=DEFAULT_PAS):
+    '''Returns the form columns for the windows, e.g. G5_Hit or PA25_Whiff_Rate.'''
+    lst_prefixes = [f'G{n}' for n in lst_games] + [f'PA{n}' for n in lst_pas]
+
+    return [f'{prefix}_{stat}' for prefix in lst_prefixes for stat in FORM_STATS]
+
+
+def _chunks(lst, size=MAX_IN_PARAMS):
+    '''Splits a list into lists of at most size values.'''
+    return [lst[i:i + size] for i in range(0, len(lst), size)]
+
+
+def pa_rows(df_wrk):
+    '''Reduces WRK rows to one row per role, player and plate appearance
+    (PA_Num), with the measures the form windows are summed from.
+
+    Args:
+        df_wrk(DataFrame): WRK rows.
+
+    Returns:
+        DataFrame: FORM_KEYS, PA_Num and FORM_MEASURES, sorted by player
+                   and then by date, game and plate appearance.
+
+    Raises:
+        No exceptions
+    '''
+    srs_desc = df_wrk['Event_Description'].astype(object)
+    arr_ev = pd.to_numeric(df_wrk['Exit_Velo']).to_numpy(dtype='float64', na_value=np.nan)
+    arr_ev_cnt = srs_desc.isin(IN_PLAY_DESCRIPTIONS).to_numpy() & ~np.isnan(arr_ev)
+
+    df = pd.DataFrame({'Game_Date': pd.to_datetime(df_wrk['Game_Date']).to_numpy(),
+                       'Game_ID': pd.to_numeric(df_wrk['Game_ID']).to_numpy(dtype='int64'),
+                       'PA_Num': pd.to_numeric(df_wrk['PA_Num']).to_numpy(dtype='int64'),
+                       'PA': df_wrk['cnt_PA'].to_numpy(dtype='int64'),
+                       'Hit': df_wrk['cnt_Hit'].to_numpy(dtype='int64'),
+                       'HR': df_wrk['cnt_Home_Run'].to_numpy(dtype='int64'),
+                       'Pnts': pd.to_numeric(df_wrk['Yahoo_Pnts_Batter']).to_numpy(dtype='float64', na_value=0.0),
+                       'EV_Sum': np.where(arr_ev_cnt, arr_ev, 0.0),
+                       'EV_Cnt': arr_ev_cnt.astype('int64'),
+                       'Swings': srs_desc.isin(SWING_DESCRIPTIONS).to_numpy(dtype='int64'),
+                       'Whiffs': srs_desc.isin(WHIFF_DESCRIPTIONS).to_numpy(dtype='int64')})
+
+    lst_dfs = []
+    for role, col in FORM_ROLES.items():
+        df_role = df.assign(Role=role, Player_ID=pd.to_numeric(df_wrk[col]).to_numpy(dtype='float64'))
+        df_role = df_role[df_role['Player_ID'].notna()].astype({'Player_ID': 'int64'})
+        lst_dfs.append(df_role.groupby(FORM_KEYS + ['PA_Num'], sort=False)[FORM_MEASURES].sum().reset_index())
+
+    return sort_pa_rows(pd.concat(lst_dfs, ignore_index=True))
+
+
+def sort_pa_rows(df_pa):
+    '''Sorts plate appearance rows by player, then by date, game and plate
+    appearance, the order the windows run in.'''
+    return df_pa.sort_values(FORM_KEYS + ['PA_Num'], kind='stable').reset_index(drop=True)
+
+
+def _window_sums(df, arr_player, n):
+    '''Returns the sum of each measure over the last n rows of each player,
+    up to and including every row. The rows must be sorted by player.
+
+    Each sum is a running total minus the running total n rows earlier, so a
+    window of any length costs two grouped passes over the rows.
+    '''
+    df_cum = df[FORM_MEASURES].groupby(arr_player).cumsum()
+    df_prev = df_cum.groupby(arr_player).shift(n, fill_value=0)
+
+    return (df_cum - df_prev).round(6)
+
+
+def _form_stats(df_sums, prefix):
+    '''Turns window sums into the form columns of one window.'''
+    dct_cols = {}
+    for stat, (num, den) in FORM_STATS.items():
+        if den is None:
+            dct_cols[f'{prefix}_{stat}'] = df_sums[num].to_numpy()
+        else:
+            arr_den = df_sums[den].to_numpy(dtype='float64')
+            with np.errstate(divide='ignore', invalid='ignore'):
+                dct_cols[f'{prefix}_{stat}'] = np.where(arr_den > 0, df_sums[num].to_numpy() / arr_den, np.nan)
+
+    return dct_cols
+
+
+def rolling_form(df_pa, lst_games=DEFAULT_GAMES, lst_pas=DEFAULT_PAS):
+    '''Computes each player's form through the end of every game in df_pa.
+
+    A game window covers the player's last n games up to and including the
+    game; a plate appearance window covers the last n plate appearances up
+    to and including the player's last one in the game. Windows are shorter
+    while a player has fewer games or plate appearances, so G5_PA is the
+    plate appearances of up to 5 games.
+
+    Args:
+        df_pa(DataFrame): Plate appearance rows from pa_rows(), sorted by
+                          sort_pa_rows(), holding enough of each player's
+                          earlier rows to fill the longest window.
+        lst_games(list): Lengths of the game windows.
+        lst_pas(list): Lengths of the plate appearance windows.
+
+    Returns:
+        DataFrame: One row per role, player and game, with FORM_KEYS and the
+                   columns of form_columns().
+
+    Raises:
+        No exceptions
+    '''
+    df_games = df_pa.groupby(FORM_KEYS, sort=True)[FORM_MEASURES].sum().reset_index()
+    arr_game_player = df_games.groupby(['Role', 'Player_ID'], sort=False).ngroup().to_numpy()
+
+    arr_pa_player = df_pa.groupby(['Role', 'Player_ID'], sort=False).ngroup().to_numpy()
+    arr_last_pa = ~df_pa.duplicated(FORM_KEYS, keep='last').to_numpy()
+
+    dct_cols = {}
+    for n in lst_games:
+        dct_cols.update(_form_stats(_window_sums(df_games, arr_game_player, n), f'G{n}'))
+    for n in lst_pas:
+        dct_cols.update(_form_stats(_window_sums(df_pa, arr_pa_player, n)[arr_last_pa], f'PA{n}'))
+
+    return pd.concat([df_games[FORM_KEYS], pd.DataFrame(dct_cols, index=df_games.index)], axis=1)
+
+
+def trim_state(df_pa, max_games, max_pas):
+    '''Keeps the plate appearance rows the next incremental update needs.
+
+    For each player that is every row of the player's latest date, so that
+    date can be loaded again, and before it the rows of the last max_games
+    games and the last max_pas plate appearances.
+
+    Args:
+        df_pa(DataFrame): Plate appearance rows, sorted by sort_pa_rows().
+        max_games(int): Length of the longest game window.
+        max_pas(int): Length of the longest plate appearance window.
+
+    Returns:
+        DataFrame: The rows kept.
+
+    Raises:
+        No exceptions
+    '''
+    arr_player = df_pa.groupby(['Role', 'Player_ID'], sort=False).ngroup().to_numpy()
+    srs_latest = df_pa.groupby(arr_player)['Game_Date'].transform('max')
+    arr_latest = (df_pa['Game_Date'] == srs_latest).to_numpy()
+
+    df_prior = df_pa[~arr_latest]
+    arr_prior_player = arr_player[~arr_latest]
+    srs_pa_rank = df_prior.groupby(arr_prior_player).cumcount(ascending=False)
+    arr_new_game = ~df_prior.duplicated(FORM_KEYS, keep='first').to_numpy()
+    srs_game = pd.Series(arr_new_game.astype('int64'), index=df_prior.index).groupby(arr_prior_player).cumsum()
+    srs_game_rank = srs_game.groupby(arr_prior_player).transform('max') - srs_game
+    arr_keep = ((srs_pa_rank < max_pas) | (srs_game_rank < max_games)).to_numpy()
+
+    return pd.concat([df_prior[arr_keep], df_pa[arr_latest]]).sort_index()
+
+
+def _read_state(engine, year, df_new):
+    '''Reads the state rows of the players in df_new.'''
+    table = state_table(year)
+    if not inspect(engine).has_table(table):
+        return df_new.iloc[:0]
+
+    lst_dfs = []
+    stmt = text(f'SELECT * FROM {table} WHERE Role = :role AND Player_ID IN :players')
+    stmt = stmt.bindparams(bindparam('players', expanding=True))
+    with engine.connect() as conn:
+        for role in FORM_ROLES:
+            lst_players = [int(p) for p in df_new.loc[df_new['Role'] == role, 'Player_ID'].unique()]
+            for lst_chunk in _chunks(lst_players):
+                lst_dfs.append(pd.read_sql(stmt, conn, params={'role': role, 'players': lst_chunk}))
+    if not lst_dfs:
+        return df_new.iloc[:0]
+
+    df = pd.concat(lst_dfs, ignore_index=True)
+    df['Game_Date'] = pd.to_datetime(df['Game_Date'])
+
+    return df.astype({col: df_new[col].dtype for col in df_new.columns if col not in ['Game_Date', 'Role']})
+
+
+def _deletes(table, col, dct_values):
+    '''Returns the (statement, parameters) pairs that delete the rows of a
+    table whose Role and col match, for each {role: [values]}.'''
+    stmt = text(f'DELETE FROM {table} WHERE Role = :role AND {col} IN :values')
+    stmt = stmt.bindparams(bindparam('values', expanding=True))
+
+    return [(stmt, {'role': role, 'values': lst_chunk})
+            for role, lst_values in dct_values.items() for lst_chunk in _chunks(lst_values)]
+
+
+def _write_form(engine, year, df_form, df_state, max_date, dct_loader):
+    '''Inserts form and state rows and records the writes in the watermarks.'''
+    for df, table in [(df_form, form_table(year)), (df_state, state_table(year))]:
+        if len(df):
+            insert_df(df, table, engine, dct_loader)
+        bump_watermark(engine, table, max_date, len(df))
+
+
+def update_form(engine, df_wrk, year, lst_games=DEFAULT_GAMES, lst_pas=DEFAULT_PAS, dct_loader=None):
+    '''Updates the player form for newly loaded WRK rows.
+
+    The windows are computed from the new rows and the players' rows in the
+    state table, which holds the few plate appearances before them, so the
+    season is not read again. The form rows of the games in df_wrk replace
+    any already stored (a retried date, a chunk of a date), and the state of
+    the players in df_wrk is replaced by its trimmed tail, both in a single
+    transaction so the stored state always matches the stored form.
+
+    Windows only run forward in time: when a player already has rows after
+    the new ones (dates loaded out of order, or a game of the same date with
+    a higher Game_ID), the form of their later games changes too, and the
+    season is rebuilt with rebuild_form() instead.
+
+    Args:
+        engine(Engine): The database engine.
+        df_wrk(DataFrame): The WRK rows just inserted, every pitch of each
+                           game in them.
+        year(str): The season, for the table names.
+        lst_games(list): Lengths of the game windows.
+        lst_pas(list): Lengths of the plate appearance windows.
+        dct_loader(dict): The 'Loader' section of config.yaml.
+
+    Returns:
+        dict: {'form': form rows written, 'state': state rows written}
+
+    Raises:
+        Exception: if a read, delete or insert fails; the form and state
+                   tables are unchanged
+    '''
+    df_new = pa_rows(df_wrk)
+    set_games = set(df_new['Game_ID'].unique())
+    df_state = _read_state(engine, year, df_new)
+    df_state = df_state[~df_state['Game_ID'].isin(set_games)]
+
+    # The windows run in (Game_Date, Game_ID) order, so a stored game of the
+    # same date with a higher Game_ID is later too.
+    df_first = sort_pa_rows(df_new).groupby(['Role', 'Player_ID'], sort=False)[['Game_Date', 'Game_ID']].first()
+    df_check = df_state.merge(df_first.add_prefix('First_').reset_index(), on=['Role', 'Player_ID'])
+    if ((df_check['Game_Date'] > df_check['First_Game_Date'])
+            | ((df_check['Game_Date'] == df_check['First_Game_Date'])
+               & (df_check['Game_ID'] > df_check['First_Game_ID']))).any():
+        logging.info(f'{form_table(year)}: rows loaded before later dates, rebuilding the season')
+        return rebuild_form(engine, year, lst_games, lst_pas, dct_loader)
+
+    df_pa = sort_pa_rows(pd.concat([df_state, df_new], ignore_index=True))
+    df_form = rolling_form(df_pa, lst_games, lst_pas)
+    df_form = df_form[df_form['Game_ID'].isin(set_games)]
+    df_state = trim_state(df_pa, max(lst_games), max(lst_pas))
+
+    # The form and state rows are replaced in one transaction: state left
+    # behind by a failed write would be the start of every later update.
+    dct_players = {role: [int(p) for p in df_new.loc[df_new['Role'] == role, 'Player_ID'].unique()]
+                   for role in FORM_ROLES}
+    replace_dfs([(df_form, form_table(year),
+                  _deletes(form_table(year), 'Game_ID', {role: [int(g) for g in set_games] for role in FORM_ROLES})),
+                 (df_state, state_table(year), _deletes(state_table(year), 'Player_ID', dct_players))],
+                engine, dct_loader)
+    for df, table in [(df_form, form_table(year)), (df_state, state_table(year))]:
+        bump_watermark(engine, table, df_new['Game_Date'].max().strftime('%Y-%m-%d'), len(df))
+
+    return {'form': len(df_form), 'state': len(df_state)}
+
+
+def rebuild_form(engine, year, lst_games=DEFAULT_GAMES, lst_pas=DEFAULT_PAS, dct_loader=None, chunk_rows=100000):
+    '''Replaces a season's player form and state with ones computed from its
+    WRK table in a single pass.
+
+    Only the columns the measures need are read, a chunk of rows at a time,
+    and each chunk is reduced to plate appearance rows before the next is
+    read, so memory holds the season's plate appearances rather than its
+    pitches.
+
+    Args:
+        engine(Engine): The database engine.
+        year(str): The season.
+        lst_games(list): Lengths of the game windows.
+        lst_pas(list): Lengths of the plate appearance windows.
+        dct_loader(dict): The 'Loader' section of config.yaml.
+        chunk_rows(int): WRK rows read at a time.
+
+    Returns:
+        dict: {'form': form rows written, 'state': state rows written}, empty
+              if the WRK table does not exist.
+
+    Raises:
+        Exception: if a read, delete or insert fails
+    '''
+    table = f'wrk_statcast_{year}'
+    if not inspect(engine).has_table(table):
+        logging.warning(f'{table} does not exist, no player form built')
+        return {}
+
+    lst_cols = ['Game_Date', 'Game_ID', 'PA_Num', 'Event_Description', 'Exit_Velo', 'cnt_PA', 'cnt_Hit',
+                'cnt_Home_Run', 'Yahoo_Pnts_Batter'] + list(FORM_ROLES.values())
+    lst_dfs = []
+    with engine.connect() as conn:
+        for df_chunk in pd.read_sql(text(f'SELECT {", ".join(lst_cols)} FROM {table}'), conn, chunksize=chunk_rows):
+            lst_dfs.append(pa_rows(df_chunk))
+    if not lst_dfs:
+        return {'form': 0, 'state': 0}
+
+    # A plate appearance split across two chunks is summed back into one row.
+    df_pa = pd.concat(lst_dfs, ignore_index=True)
+    df_pa = sort_pa_rows(df_pa.groupby(FORM_KEYS + ['PA_Num'], sort=False)[FORM_MEASURES].sum().reset_index())
+    df_form = rolling_form(df_pa, lst_games, lst_pas)
+    df_state = trim_state(df_pa, max(lst_games), max(lst_pas))
+
+    # Dropped rather than emptied, so a change to the windows in config.yaml
+    # takes effect with its new columns.
+    lst_existing = [name for name in [form_table(year), state_table(year)] if inspect(engine).has_table(name)]
+    with engine.begin() as conn:
+        for name in lst_existing:
+            conn.execute(text(f'DROP TABLE {name}'))
+    _write_form(engine, year, df_form, df_state, df_pa['Game_Date'].max().strftime('%Y-%m-%d'), dct_loader)
+
+    return {'form': len(df_form), 'state': len(df_state)}
+
+
+def read_form(engine, year, role='batter', lst_players=None, date=None):
+    '''Returns each player's latest form on or before a date, e.g. the
+    inputs of a projection for the next day's games.
+
+    Args:
+        engine(Engine): The database engine.
+        year(str): The season.
+        role(str): 'batter' or 'pitcher'.
+        lst_players(list): Player MLB IDs. None returns every player.
+        date(str): Latest date to use, formatted 'yyyy-mm-dd'. None uses
+                   every loaded date.
+
+    Returns:
+        DataFrame: One form row per player, empty if the season has none.
+
+    Raises:
+        ValueError: if role is not a key of FORM_ROLES
+    '''
+    if role not in FORM_ROLES:
+        raise ValueError(f'role must be one of {list(FORM_ROLES)}, not {role!r}')
+    table = form_table(year)
+    if not inspect(engine).has_table(table):
+        return pd.DataFrame(columns=FORM_KEYS)
+
+    sql = f'SELECT * FROM {table} WHERE Role = :role'
+    dct_params = {'role': role}
+    if date is not None:
+        sql += ' AND Game_Date < :end'
+        dct_params['end'] = (pd.Timestamp(date) + pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+    lst_stmts = [(text(sql), dct_params)]
+    if lst_players is not None:
+        stmt = text(f'{sql} AND Player_ID IN :players').bindparams(bindparam('players', expanding=True))
+        lst_stmts = [(stmt, {**dct_params, 'players': [int(p) for p in lst_chunk]})
+                     for lst_chunk in _chunks(list(lst_players))]
+
+    with engine.connect() as conn:
+        lst_dfs = [pd.read_sql(stmt, conn, params=params) for stmt, params in lst_stmts]
+    df = pd.concat(lst_dfs, ignore_index=True) if lst_dfs else pd.DataFrame(columns=FORM_KEYS)
+    df['Game_Date'] = pd.to_datetime(df['Game_Date'])
+
+    return (df.sort_values(FORM_KEYS, kind='stable')
+              .drop_duplicates(['Role', 'Player_ID'], keep='last')
+              .reset_index(drop=True))
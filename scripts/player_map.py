@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import hashlib
+import logging
+import os
+import urllib.request
+import uuid
+from datetime import datetime, timedelta
+from io import BytesIO
+
+import pandas as pd
+import ujson
+
+
+PLAYERIDMAP_URL = 'https://www.smartfantasybaseball.com/PLAYERIDMAPCSV'
+
+SNAPSHOT_VERSION = 1
+
+# Columns the pipeline reads; a download without them is rejected.
+REQUIRED_COLS = ['MLBID', 'MLBNAME', 'BREFID', 'POS', 'PLAYERNAME', 'ACTIVE']
+
+
+def _parse_player_map(source):
+    '''Parses the PlayerID Map CSV, skipping malformed lines and typing MLBID
+    as a nullable integer.'''
+    df = pd.read_csv(source, on_bad_lines='warn', dtype={'MLBID': str})
+
+    lst_missing = [c for c in REQUIRED_COLS if c not in df.columns]
+    if lst_missing:
+        raise ValueError(f'PlayerID Map is missing columns: {lst_missing}')
+
+    df['MLBID'] = pd.to_numeric(df['MLBID'], errors='coerce').astype('Int64')
+
+    return df
+
+
+def download_player_map(snapshot_path, url=PLAYERIDMAP_URL, timeout=30):
+    '''Downloads the PlayerID Map and stores it as the local snapshot, along
+    with a meta file that records when and from where it was fetched.
+
+    The download is parsed before anything is written, so a truncated or
+    malformed file never replaces a good snapshot.
+
+    Args:
+        snapshot_path(str): Where to write the CSV snapshot. The meta file is
+                            written next to it as {snapshot_path}.meta.json.
+        url(str): The PlayerID Map CSV.
+        timeout(float): Socket timeout in seconds.
+
+    Returns:
+        DataFrame: The parsed player map.
+
+    Raises:
+        URLError: if the download fails
+        ValueError: if the file is not a usable player map
+    '''
+    request = urllib.request.Request(url, headers={'User-Agent': 'mlb-statcast-ml'})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        content = response.read()
+
+    df = _parse_player_map(BytesIO(content))
+    save_player_map(content, snapshot_path, url, len(df))
+
+    logging.info(f'PlayerID Map snapshot refreshed: {len(df)} players -> {snapshot_path}')
+
+    return df
+
+
+def save_player_map(content, snapshot_path, url, row_count):
+    '''Writes a PlayerID Map CSV and its meta file as the local snapshot.
+
+    Both files are written under temporary names and renamed into place.
+
+    Args:
+        content(bytes): The CSV file.
+        snapshot_path(str): Where to write the CSV. The meta file is written
+                            next to it as {snapshot_path}.meta.json.
+        url(str): Where the CSV came from, recorded in the meta file.
+        row_count(int): Number of players, recorded in the meta file.
+
+    Returns:
+        Does not return a parameter
+
+    Raises:
+        No exceptions
+    '''
+    os.makedirs(os.path.dirname(snapshot_path) or '.', exist_ok=True)
+    tmp_suffix = f'.{uuid.uuid4().hex}.tmp'
+    with open(snapshot_path + tmp_suffix, 'wb') as f:
+        f.write(content)
+    with open(f'{snapshot_path}.meta.json' + tmp_suffix, 'w') as f:
+        ujson.dump({'version': SNAPSHOT_VERSION,
+                    'url': url,
+                    'fetched_at': datetime.now().isoformat(timespec='seconds'),
+                    'rows': int(row_count),
+                    'sha256': hashlib.sha256(content).hexdigest()}, f)
+    os.replace(snapshot_path + tmp_suffix, snapshot_path)
+    os.replace(f'{snapshot_path}.meta.json' + tmp_suffix, f'{snapshot_path}.meta.json')
+
+
+def snapshot_age(snapshot_path):
+    '''Returns how long ago the snapshot was fetched, or None if there is no
+    usable snapshot.'''
+    try:
+        dct_meta = ujson.load(open(f'{snapshot_path}.meta.json'))
+        if dct_meta.get('version') != SNAPSHOT_VERSION or not os.path.exists(snapshot_path):
+            return None
+        return datetime.now() - datetime.fromisoformat(dct_meta['fetched_at'])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def load_player_map(snapshot_path, ttl_days=7, refresh=False, url=PLAYERIDMAP_URL):
+    '''Loads the PlayerID Map from the local snapshot, refreshing the snapshot
+    first when it is missing, older than ttl_days, or refresh is True.
+
+    If the refresh fails (e.g. no network), the existing snapshot is used
+    regardless of its age, so the pipeline keeps working offline.
+
+    Args:
+        snapshot_path(str): The CSV snapshot, e.g. {parent_path}/csv/playeridmap.csv.
+        ttl_days(float): Age in days after which the snapshot is refreshed.
+                         None never refreshes an existing snapshot.
+        refresh(bool): Refresh the snapshot regardless of its age.
+        url(str): The PlayerID Map CSV.
+
+    Returns:
+        DataFrame: The player map, with MLBID as an Int64 column.
+
+    Raises:
+        RuntimeError: if there is no snapshot and it cannot be downloaded
+    '''
+    age = snapshot_age(snapshot_path)
+    stale = age is None or (ttl_days is not None and age > timedelta(days=ttl_days))
+
+    if refresh or stale:
+        try:
+            return download_player_map(snapshot_path, url)
+        except Exception as e:
+            if age is None:
+                raise RuntimeError(f'No PlayerID Map snapshot at {snapshot_path} and the download failed: {e}') from e
+            logging.warning(f'Could not refresh the PlayerID Map ({e}), using the snapshot from {age.days} days ago')
+
+    return _parse_player_map(snapshot_path)
+
+
+def player_id_names(df_map):
+    '''Returns {MLB ID (int): MLB full name} for every player with an MLB ID.'''
+    df_map = df_map[df_map['MLBID'].notna()]
+
+    return dict(zip(df_map['MLBID'].astype('int64'), df_map['MLBNAME']))
+
+
+if __name__ == '__main__':
+    import yaml
+
+    with open('config.yaml', 'r') as yamlfile:
+        lst_config = yaml.load(yamlfile, Loader=yaml.FullLoader)
+    parent_path = [section['Paths'] for section in lst_config if 'Paths' in section][0]['parent_path']
+
+    df = load_player_map(f'{parent_path}/csv/playeridmap.csv', refresh=True)
+    print(f'PlayerID Map snapshot: {len(df)} players')
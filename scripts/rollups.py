@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, inspect, text
+
+from db_loader import replace_df
+from table_watermarks import bump_watermark
+
+
+# Counting columns summed into every rollup, next to the number of pitches.
+ROLLUP_MEASURES = ['cnt_PA', 'cnt_AB', 'cnt_Hit', 'cnt_Single', 'cnt_Double', 'cnt_Triple', 'cnt_Home_Run',
+                   'cnt_K', 'cnt_BackwardsK', 'cnt_Walk', 'cnt_HBP', 'cnt_RBI', 'Yahoo_Pnts_Batter']
+
+# Rollups of the wrk_statcast_{year} tables: the table name (formatted with
+# the year), the columns that identify a row, and descriptive columns carried
+# along (the MAX within the row's pitches).
+ROLLUPS = {
+    'player_game': {'table': 'rollup_player_game_{year}',
+                    'keys': ['Game_Date', 'Game_ID', 'Batter_ID'],
+                    'attrs': ['Batter_Name', 'Bat_Team']},
+    'team_game': {'table': 'rollup_team_game_{year}',
+                  'keys': ['Game_Date', 'Game_ID', 'Bat_Team'],
+                  'attrs': []},
+    'player_season': {'table': 'rollup_player_season_{year}',
+                      'keys': ['Game_Year', 'Batter_ID'],
+                      'attrs': ['Batter_Name']},
+}
+
+# Values per IN (...) list; SQL Server accepts at most 2100 parameters.
+MAX_IN_PARAMS = 1000
+
+
+def rollup_table(name, year):
+    '''Returns the table name of a rollup for a year.'''
+    return ROLLUPS[name]['table'].format(year=year)
+
+
+def _chunks(lst, size=MAX_IN_PARAMS):
+    '''Splits a list into lists of at most size values.'''
+    return [lst[i:i + size] for i in range(0, len(lst), size)]
+
+
+def aggregate_rollup(df, name):
+    '''Computes a rollup from a DataFrame.
+
+    The player-game and team-game rollups are computed from WRK rows, the
+    player-season rollup from player-game rollup rows.
+
+    Args:
+        df(DataFrame): WRK rows, or player-game rollup rows for 'player_season'.
+        name(str): The rollup, a key of ROLLUPS.
+
+    Returns:
+        DataFrame: One row per key, with Pitches (and Games for the season
+                   rollup), the attributes and the summed measures.
+
+    Raises:
+        No exceptions
+    '''
+    dct_rollup = ROLLUPS[name]
+    if name == 'player_season':
+        df = df.assign(Game_Year=pd.to_datetime(df['Game_Date']).dt.year)
+        dct_agg = {'Pitches': ('Pitches', 'sum'), 'Games': ('Game_ID', 'nunique')}
+    else:
+        dct_agg = {'Pitches': ('Game_ID', 'size')}
+    dct_agg.update({col: (col, 'max') for col in dct_rollup['attrs']})
+    dct_agg.update({col: (col, 'sum') for col in ROLLUP_MEASURES})
+
+    lst_cols = list(dict.fromkeys(dct_rollup['keys'] + [col for col, func in dct_agg.values()]))
+    df = df[lst_cols].copy()
+    for col in dct_rollup['keys'] + dct_rollup['attrs']:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object)
+
+    return df.groupby(dct_rollup['keys'], dropna=False, sort=True).agg(**dct_agg).reset_index()
+
+
+def rollup_sql(name, year):
+    '''Returns the SELECT that computes a rollup from the WRK table in the
+    database, used to rebuild and check the incrementally maintained tables.'''
+    dct_rollup = ROLLUPS[name]
+    lst_select = dct_rollup['keys'] + ['COUNT(*) AS Pitches']
+    if name == 'player_season':
+        lst_select.append('COUNT(DISTINCT Game_ID) AS Games')
+    lst_select += [f'MAX({col}) AS {col}' for col in dct_rollup['attrs']]
+    lst_select += [f'SUM({col}) AS {col}' for col in ROLLUP_MEASURES]
+
+    return f'SELECT {", ".join(lst_select)} FROM wrk_statcast_{year} GROUP BY {", ".join(dct_rollup["keys"])}'
+
+
+def update_rollups(engine, df_wrk, year, dct_loader=None):
+    '''Updates the rollups for newly loaded WRK rows.
+
+    The player-game and team-game rows of the games in df_wrk are deleted
+    and inserted again from df_wrk, so loading the same games again (a
+    retried date, a resumed build, a chunk of a date) leaves the rollups as if
+    they were loaded once. The season rows of the batters in df_wrk are then
+    recomputed from the player-game rollup. Each table's delete and insert
+    run in one transaction (see db_loader.replace_df()), so a failure leaves
+    a rollup as it was instead of without the games.
+
+    df_wrk must hold every pitch of each game it contains on its date, as
+    process_date() and the chunks of stream_range() do.
+
+    Args:
+        engine(Engine): The database engine.
+        df_wrk(DataFrame): The WRK rows just inserted.
+        year(str): The season, for the table names.
+        dct_loader(dict): The 'Loader' section of config.yaml.
+
+    Returns:
+        dict: {rollup name: rows written}, empty if df_wrk has no rows
+
+    Raises:
+        Exception: if a delete or insert fails; the rollup being written is
+                   unchanged, and rebuild_rollup() brings it up to date
+                   with the WRK table
+    '''
+    if df_wrk.empty:
+        return {}
+
+    dct_rows = {}
+    srs_dates = pd.to_datetime(df_wrk['Game_Date']).dt.strftime('%Y-%m-%d')
+    dct_games = {date: [int(g) for g in df_wrk.loc[(srs_dates == date).to_numpy(), 'Game_ID'].unique()]
+                 for date in srs_dates.unique()}
+
+    for name in ['player_game', 'team_game']:
+        table = rollup_table(name, year)
+        stmt = text(f'DELETE FROM {table} WHERE Game_Date >= :start AND Game_Date < :end AND Game_ID IN :games')
+        stmt = stmt.bindparams(bindparam('games', expanding=True))
+        lst_deletes = [(stmt, {'start': date, 'end': (pd.Timestamp(date) + pd.Timedelta(days=1)).strftime('%Y-%m-%d'),
+                               'games': lst_chunk})
+                       for date, lst_games in dct_games.items() for lst_chunk in _chunks(lst_games)]
+        df = aggregate_rollup(df_wrk, name)
+        replace_df(df, table, engine, lst_deletes, dct_loader)
+        bump_watermark(engine, table, max(dct_games), len(df))
+        dct_rows[name] = len(df)
+
+    table = rollup_table('player_season', year)
+    lst_batters = [int(b) for b in df_wrk['Batter_ID'].dropna().unique()]
+    stmt = text(f"SELECT * FROM {rollup_table('player_game', year)} WHERE Batter_ID IN :batters")
+    stmt = stmt.bindparams(bindparam('batters', expanding=True))
+    with engine.connect() as conn:
+        df = pd.concat([pd.read_sql(stmt, conn, params={'batters': lst_chunk}) for lst_chunk in _chunks(lst_batters)],
+                       ignore_index=True)
+    df = aggregate_rollup(df, 'player_season')
+    stmt = text(f'DELETE FROM {table} WHERE Batter_ID IN :batters')
+    stmt = stmt.bindparams(bindparam('batters', expanding=True))
+    replace_df(df, table, engine, [(stmt, {'batters': lst_chunk}) for lst_chunk in _chunks(lst_batters)], dct_loader)
+    bump_watermark(engine, table, max(dct_games), len(df))
+    dct_rows['player_season'] = len(df)
+
+    return dct_rows
+
+
+def _key_frame(df):
+    '''Normalizes the key columns of a rollup read from any backend so two
+    copies of it can be joined: dates as 'yyyy-mm-dd', IDs as integers.'''
+    df = df.copy()
+    if 'Game_Date' in df.columns:
+        df['Game_Date'] = pd.to_datetime(df['Game_Date']).dt.strftime('%Y-%m-%d')
+    for col in ['Game_ID', 'Batter_ID', 'Game_Year']:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col]).astype('Int64')
+
+    return df
+
+
+def check_rollup(engine, name, year):
+    '''Recomputes a rollup from the WRK table and compares it to the stored
+    rollup.
+
+    Args:
+        engine(Engine): The database engine.
+        name(str): The rollup, a key of ROLLUPS.
+        year(str): The season.
+
+    Returns:
+        DataFrame: The keys that differ, with a 'Diff' column naming the
+                   first measure that differs, 'missing' (not in the stored
+                   rollup) or 'extra' (not in the WRK table). Empty if the
+                   rollup is consistent.
+
+    Raises:
+        No exceptions
+    '''
+    lst_keys = ROLLUPS[name]['keys']
+    lst_measures = ['Pitches'] + (['Games'] if name == 'player_season' else []) + ROLLUP_MEASURES
+
+    with engine.connect() as conn:
+        df_expected = _key_frame(pd.read_sql(text(rollup_sql(name, year)), conn))
+        if inspect(engine).has_table(rollup_table(name, year)):
+            df_stored = _key_frame(pd.read_sql(text(f'SELECT * FROM {rollup_table(name, year)}'), conn))
+        else:
+            df_stored = pd.DataFrame(columns=df_expected.columns)
+
+    df = df_expected.merge(df_stored, on=lst_keys, how='outer', suffixes=('', '_stored'), indicator=True)
+    srs_diff = pd.Series(None, index=df.index, dtype=object)
+    srs_diff[(df['_merge'] == 'left_only').to_numpy()] = 'missing'
+    srs_diff[(df['_merge'] == 'right_only').to_numpy()] = 'extra'
+    arr_both = (df['_merge'] == 'both').to_numpy()
+    for col in reversed(lst_measures):
+        arr_expected = pd.to_numeric(df[col]).to_numpy(dtype='float64', na_value=np.nan)
+        arr_stored = pd.to_numeric(df[f'{col}_stored']).to_numpy(dtype='float64', na_value=np.nan)
+        arr_differs = arr_both & ~np.isclose(arr_expected, arr_stored, equal_nan=True)
+        srs_diff[arr_differs] = col
+    df['Diff'] = srs_diff
+
+    return df.loc[df['Diff'].notna(), lst_keys + ['Diff']].reset_index(drop=True)
+
+
+def rebuild_rollup(engine, name, year, dct_loader=None):
+    '''Replaces a rollup with one computed from the WRK table.
+
+    Args:
+        engine(Engine): The database engine.
+        name(str): The rollup, a key of ROLLUPS.
+        year(str): The season.
+        dct_loader(dict): The 'Loader' section of config.yaml.
+
+    Returns:
+        int: Rows written.
+
+    Raises:
+        No exceptions
+    '''
+    table = rollup_table(name, year)
+    with engine.connect() as conn:
+        df = pd.read_sql(text(rollup_sql(name, year)), conn)
+    if 'Game_Date' in df.columns:
+        df['Game_Date'] = pd.to_datetime(df['Game_Date'])
+
+    replace_df(df, table, engine, [(text(f'DELETE FROM {table}'), {})], dct_loader)
+    bump_watermark(engine, table, row_count=len(df))
+
+    return len(df)
@@ -3,6 +3,7 @@
 
 from mlb_statcast import Statcast_DB
 
-statcast = Statcast_DB()
+if __name__ == '__main__':
+    statcast = Statcast_DB()
 
-statcast.build_db()
+    statcast.build_db()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import ujson
+
+
+class RunMetrics():
+    '''
+    Per-date, per-stage metrics for a build or stream run, written as JSON
+    lines so a slow run can be traced to the stage and date responsible.
+
+    Each record holds the run ID, date, stage, wall time in seconds, rows,
+    bytes, retries and status ('ok' or 'error'), plus any extra fields the
+    stage adds. Records are appended to a file shared by every run; the run
+    ID tells runs apart.
+
+    A copy sent to a build worker process does not write to the file. It
+    buffers its records, and the worker hands them back to the parent with
+    the data, so the parent stays the single writer.
+
+    Args:
+        path(str): The JSON lines file.
+        enabled(bool): If False, records are kept for the summary but not
+                       written to the file.
+        run_id(str): Identifies the run. Defaults to the start time and pid.
+
+    '''
+    def __init__(self, path, enabled=True, run_id=None):
+
+        self.path = path
+        self.enabled = enabled
+        self.run_id = run_id or f'{datetime.now().strftime("%Y%m%dT%H%M%S")}-{os.getpid()}'
+        self.buffered = False
+        self.lst_records = []
+        self.lst_buffer = []
+
+        if self.enabled:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def __getstate__(self):
+        '''Copies sent to worker processes buffer their records instead of
+        writing them.'''
+        dct_state = self.__dict__.copy()
+        dct_state.update({'buffered': True, 'lst_records': [], 'lst_buffer': []})
+
+        return dct_state
+
+    def buffer(self):
+        '''Switches to buffering records, for a worker process that inherited
+        the object by fork rather than by pickling.'''
+        self.__dict__.update(self.__getstate__())
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    @contextmanager
+    def stage(self, date, stage, **fields):
+        '''Times a stage of the pipeline for a date.
+
+        The record is yielded so the stage can fill in 'rows', 'bytes',
+        'retries' or extra fields while it runs. If the stage raises, the
+        record is written with status 'error' and the exception is re-raised.
+
+        Args:
+            date(str): The date being processed, formatted 'yyyy-mm-dd'.
+            stage(str): The stage name, e.g. 'fetch' or 'add_teams'.
+            **fields: Initial values for the record.
+
+        Returns:
+            generator: Yields the record (dict).
+
+        Raises:
+            Exception: whatever the stage raised
+        '''
+        dct_record = {'date': date, 'stage': stage, 'rows': 0, 'bytes': 0, 'retries': 0, 'status': 'ok'}
+        dct_record.update(fields)
+        startTime = time.perf_counter()
+        try:
+            yield dct_record
+        except BaseException:
+            dct_record['status'] = 'error'
+            raise
+        finally:
+            dct_record['wall_sec'] = round(time.perf_counter() - startTime, 6)
+            self.add([dct_record])
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def add(self, lst_records):
+        '''Adds finished records: buffered in a worker, written in the parent.
+
+        Args:
+            lst_records(list): Records (dicts) from stage() or drain().
+
+        Returns:
+            Does not return a parameter
+
+        Raises:
+            No exceptions
+        '''
+        if self.buffered:
+            self.lst_buffer.extend(lst_records)
+            return
+
+        for dct_record in lst_records:
+            dct_record.setdefault('run_id', self.run_id)
+            dct_record.setdefault('ts', datetime.now().isoformat(timespec='seconds'))
+        self.lst_records.extend(lst_records)
+
+        if self.enabled and lst_records:
+            with open(self.path, 'a') as f:
+                f.write(''.join(ujson.dumps(dct_record) + '\n' for dct_record in lst_records))
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def drain(self):
+        '''Returns and clears the records buffered in a worker process.'''
+        lst_records, self.lst_buffer = self.lst_buffer, []
+
+        return lst_records
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def summary(self, top=10):
+        '''Returns a table of the slowest stages and dates of the run.
+
+        Stages are ranked by total wall time across all dates, with their
+        call count, mean and max time, rows/sec and retries. Dates are
+        ranked by the sum of their stage times; nested stages are not
+        recorded, so the sum does not double count.
+
+        Args:
+            top(int): Number of stages and dates to list.
+
+        Returns:
+            str: The summary table.
+
+        Raises:
+            No exceptions
+        '''
+        dct_stages = {}
+        dct_dates = {}
+        for dct_record in self.lst_records:
+            dct_stage = dct_stages.setdefault(dct_record['stage'], {'count': 0, 'wall': 0.0, 'max': 0.0, 'rows': 0,
+                                                                    'retries': 0, 'errors': 0})
+            dct_stage['count'] += 1
+            dct_stage['wall'] += dct_record['wall_sec']
+            dct_stage['max'] = max(dct_stage['max'], dct_record['wall_sec'])
+            dct_stage['rows'] += dct_record['rows']
+            dct_stage['retries'] += dct_record['retries']
+            dct_stage['errors'] += dct_record['status'] != 'ok'
+            dct_dates[dct_record['date']] = dct_dates.get(dct_record['date'], 0.0) + dct_record['wall_sec']
+
+        lst_lines = [f'Run {self.run_id}: {len(dct_dates)} date(s), {len(self.lst_records)} stage records',
+                     f'{"stage":<24}{"count":>7}{"total s":>10}{"mean s":>9}{"max s":>9}{"rows/sec":>12}{"retries":>9}{"errors":>8}']
+        for stage, dct_stage in sorted(dct_stages.items(), key=lambda x: -x[1]['wall'])[:top]:
+            rows_sec = f'{dct_stage["rows"] / dct_stage["wall"]:,.0f}' if dct_stage['rows'] and dct_stage['wall'] else '-'
+            lst_lines.append(f'{stage:<24}{dct_stage["count"]:>7}{dct_stage["wall"]:>10.2f}'
+                             f'{dct_stage["wall"] / dct_stage["count"]:>9.3f}{dct_stage["max"]:>9.3f}'
+                             f'{rows_sec:>12}{dct_stage["retries"]:>9}{dct_stage["errors"]:>8}')
+        lst_lines.append(f'{"slowest dates":<24}{"total s":>10}')
+        for date, wall in sorted(dct_dates.items(), key=lambda x: -x[1])[:top]:
+            lst_lines.append(f'{date:<24}{wall:>10.2f}')
+
+        return '\n'.join(lst_lines)
+
+
+def frame_bytes(df):
+    '''Returns the in-memory size of a DataFrame, including string contents.'''
+    return int(df.memory_usage(index=False, deep=True).sum()) if df is not None else 0
@@ -1,8 +1,10 @@
 #!/usr/bin/env python
 # coding: utf-8
 
-from mlb_statcast import Statcast_DB
+import sys
 
-statcast = Statcast_DB()
+from statcast_cli import main
 
-statcast.run_stream('2019-06-03')
+if __name__ == '__main__':
+    # Streams yesterday's games, or the dates given on the command line.
+    main(['stream'] + sys.argv[1:])
@@ -1,19 +1,415 @@
 #!/usr/bin/env python
 # coding: utf-8
 
-import numpy as np
+import itertools
+import logging
+import re
+
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
+import yaml
+from sqlalchemy import bindparam, inspect, text
+
+from db_loader import create_db_engine
+from feature_matrix import FeatureMatrix, DEFAULT_LABELS, read_feature_list, wrk_feature_columns
+from rollups import MAX_IN_PARAMS
+from statcast_cache import DiskCache
+from statcast_dtypes import type_wrk_frame
+from table_watermarks import WATERMARKED_TABLES, read_watermarks
+
+
+# Tables whose watermarks a cached query depends on, found in its SQL.
+TABLE_PATTERN = re.compile(r'\b((?:' + '|'.join(WATERMARKED_TABLES) + r')_\d{4})\b', re.IGNORECASE)
 
 
 class Statcast_Analyze():
     '''
+    Reads the WRK tables built by Statcast_DB for analysis. Queries select
+    only the requested columns and filter on dates, teams and players in
+    SQL, the rows are streamed from the server in chunks, and each chunk is
+    converted to the pipeline's typed frame model (nullable Int32 IDs and
+    counts, categorical text; see statcast_dtypes.type_wrk_frame()) before
+    the next is fetched. A query over several seasons therefore holds the
+    compact typed rows it returns, not the database driver's copy of them.
+
+    Results of read_wrk() and query() are kept in a local, size-bounded
+    cache. The key holds the query, its parameters and the watermark of each
+    table it reads (see table_watermarks.py), and the pipeline moves a
+    table's watermark on every write, so a result is never served after the
+    table changed; the stale entry is evicted as the cache fills.
+
     Args:
+        config_path(str): The config.yaml file, whose 'Database_System' and
+                          DB_* sections give the database.
+        engine(Engine): An existing engine to use instead of the one in
+                        config.yaml.
+
     Attributes:
+        engine(Engine): The database engine.
+        chunk_rows(int): Rows fetched from the server at a time, the
+                         'chunk_rows' value of the 'Analyze' section of
+                         config.yaml (default 50000).
+        cache(DiskCache): The query result cache, configured by the
+                          'cache', 'cache_path' and 'cache_max_gb' values of
+                          the 'Analyze' section of config.yaml.
+
     '''
+    def __init__(self, config_path='config.yaml', engine=None):
+
+        with open(config_path, 'r') as yamlfile:
+            self.lst_config = yaml.load(yamlfile, Loader=yaml.FullLoader)
+
+        dct_analyze = self.get_config_section('Analyze')
+        self.chunk_rows = dct_analyze.get('chunk_rows', 50000)
+        self.engine = engine if engine is not None else self.connect_db()
+
+        parent_path = self.get_config_section('Paths').get('parent_path', '.')
+        self.cache = DiskCache(dct_analyze.get('cache_path') or f'{parent_path}/cache/queries',
+                               max_bytes=int(dct_analyze.get('cache_max_gb', 1) * 1024**3))
+        self.cache.enabled = self.cache.enabled and dct_analyze.get('cache', True)
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def get_config_section(self, name):
+        '''Returns a named section of config.yaml, or an empty dictionary if the
+        section is not in the file.'''
+        for section in self.lst_config:
+            if name in section:
+                return section[name] or {}
+
+        return {}
+
+    def connect_db(self):
+        '''Returns an engine for the database in config.yaml.
+
+        Args:
+            No arguments
+
+        Returns:
+            Engine: The database engine.
+
+        Raises:
+            ValueError: if the database type is not supported
+        '''
+        dbtype = self.get_config_section('Database_System')['db_type']
+        dct_sections = {'mssql': 'DB_MSSQL', 'mysql': 'DB_MySQL', 'sqlite': 'DB_SQLite'}
+        if dbtype not in dct_sections:
+            raise ValueError(f'Unsupported database type: {dbtype}')
+
+        return create_db_engine(dbtype, self.get_config_section(dct_sections[dbtype]))
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def wrk_years(self, start=None, end=None, years=None):
+        '''Returns the seasons a query reads: the given years, or those between
+        the start and end dates, or every season with a WRK table. Seasons
+        without a WRK table are left out.
+
+        Args:
+            start(str): First date, formatted 'yyyy-mm-dd'.
+            end(str): Last date, formatted 'yyyy-mm-dd'.
+            years(list): Seasons to read, e.g. ['2018', '2019'].
+
+        Returns:
+            list: The seasons, as strings, in order.
+
+        Raises:
+            No exceptions
+        '''
+        lst_tables = [t for t in inspect(self.engine).get_table_names() if t.startswith('wrk_statcast_')]
+        lst_existing = sorted(t[len('wrk_statcast_'):] for t in lst_tables)
+
+        if years is None:
+            years = [y for y in lst_existing
+                     if (start is None or y >= start[:4]) and (end is None or y <= end[:4])]
+        lst_years = [str(y) for y in years]
+        for year in lst_years:
+            if year not in lst_existing:
+                logging.warning(f'wrk_statcast_{year} does not exist, skipped')
+
+        return [year for year in lst_years if year in lst_existing]
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def wrk_sql(self, year, columns=None, start=None, end=None, teams=None, batters=None, pitchers=None,
+                sort=False):
+        '''Returns the SELECT for a season's WRK rows and its parameters.
+
+        Team and player lists are bound as expanding IN parameters. A list
+        longer than rollups.MAX_IN_PARAMS is split, and one statement is
+        returned per combination of the pieces; their rows do not overlap.
+
+        Args:
+            year(str): The season.
+            columns(list): Columns to select. None selects every column.
+            start(str): First date, formatted 'yyyy-mm-dd'.
+            end(str): Last date, formatted 'yyyy-mm-dd'.
+            teams(list): Batting teams (Bat_Team) to keep.
+            batters(list): Batter MLB IDs to keep.
+            pitchers(list): Pitcher MLB IDs to keep.
+            sort(bool): Order the rows by date, game, plate appearance and pitch.
+
+        Returns:
+            list: (TextClause, dict of parameters) for each statement.
+
+        Raises:
+            ValueError: if a column is not in the table
+        '''
+        table = f'wrk_statcast_{year}'
+        lst_table_cols = [dct_col['name'] for dct_col in inspect(self.engine).get_columns(table)]
+        if columns is None:
+            columns = lst_table_cols
+        lst_unknown = [col for col in columns if col not in lst_table_cols]
+        if lst_unknown:
+            raise ValueError(f'Not in {table}: {lst_unknown}')
+
+        quote = self.engine.dialect.identifier_preparer.quote
+        lst_where = []
+        dct_params = {}
+        if start is not None:
+            lst_where.append('Game_Date >= :start')
+            dct_params['start'] = start
+        if end is not None:
+            lst_where.append('Game_Date < :end')
+            dct_params['end'] = (pd.Timestamp(end) + pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+
+        lst_lists = []
+        lst_expanding = []
+        for col, param, lst_values in [('Bat_Team', 'teams', teams), ('Batter_ID', 'batters', batters),
+                                       ('Pitcher_ID', 'pitchers', pitchers)]:
+            if lst_values is not None:
+                lst_values = [v.item() if hasattr(v, 'item') else v for v in lst_values]
+                lst_where.append(f'{col} IN :{param}')
+                lst_expanding.append(bindparam(param, expanding=True))
+                lst_lists.append([(param, lst_values[i:i + MAX_IN_PARAMS])
+                                  for i in range(0, max(len(lst_values), 1), MAX_IN_PARAMS)])
+
+        sql = f'SELECT {", ".join(quote(col) for col in columns)} FROM {table}'
+        if lst_where:
+            sql += ' WHERE ' + ' AND '.join(lst_where)
+        if sort:
+            sql += ' ORDER BY Game_Date, Game_ID, PA_Num, Pitch_Num'
+
+        stmt = text(sql).bindparams(*lst_expanding)
+
+        return [(stmt, {**dct_params, **dict(combo)}) for combo in itertools.product(*lst_lists)]
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def iter_wrk(self, columns=None, start=None, end=None, teams=None, batters=None, pitchers=None,
+                 years=None, sort=False, chunk_rows=None):
+        '''Streams WRK rows as typed DataFrames of at most chunk_rows rows.
+
+        The rows are read with a server-side cursor where the driver supports
+        one, so neither the driver nor pandas holds more than a chunk at a
+        time.
+
+        Args:
+            columns(list): Columns to return. None returns every column.
+            start(str): First date, formatted 'yyyy-mm-dd'.
+            end(str): Last date, formatted 'yyyy-mm-dd'.
+            teams(list): Batting teams (Bat_Team) to keep.
+            batters(list): Batter MLB IDs to keep.
+            pitchers(list): Pitcher MLB IDs to keep.
+            years(list): Seasons to read. Defaults to those between start and
+                         end, see wrk_years().
+            sort(bool): Order the rows of each season by date, game, plate
+                        appearance and pitch.
+            chunk_rows(int): Rows per chunk. Defaults to self.chunk_rows.
+
+        Returns:
+            generator: The typed DataFrames, season by season.
+
+        Raises:
+            ValueError: if a column is not in a table
+        '''
+        chunk_rows = chunk_rows or self.chunk_rows
+
+        for year in self.wrk_years(start, end, years):
+            for stmt, dct_params in self.wrk_sql(year, columns, start, end, teams, batters, pitchers, sort):
+                with self.engine.connect() as conn:
+                    conn = conn.execution_options(stream_results=True, max_row_buffer=chunk_rows)
+                    for df in pd.read_sql(stmt, conn, params=dct_params, chunksize=chunk_rows):
+                        yield type_wrk_frame(df)
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def read_wrk(self, columns=None, start=None, end=None, teams=None, batters=None, pitchers=None,
+                 years=None, sort=False, chunk_rows=None, use_cache=True):
+        '''Reads WRK rows into one typed DataFrame, built from the chunks of
+        iter_wrk(). Categorical columns keep the union of the chunks'
+        categories, so they stay categorical in the result.
+
+        The result is cached under the query and the watermarks of the
+        seasons' WRK tables, so repeating a query reads the table only if it
+        was written since.
+
+        Args:
+            columns(list): Columns to return. None returns every column.
+            start(str): First date, formatted 'yyyy-mm-dd'.
+            end(str): Last date, formatted 'yyyy-mm-dd'.
+            teams(list): Batting teams (Bat_Team) to keep.
+            batters(list): Batter MLB IDs to keep.
+            pitchers(list): Pitcher MLB IDs to keep.
+            years(list): Seasons to read, see wrk_years().
+            sort(bool): Order the rows by date, game, plate appearance and pitch.
+            chunk_rows(int): Rows fetched at a time. Defaults to self.chunk_rows.
+            use_cache(bool): Read and store the result in the query cache.
+
+        Returns:
+            DataFrame: The rows, empty if no row matched.
+
+        Raises:
+            ValueError: if a column is not in a table
+        '''
+        lst_years = self.wrk_years(start, end, years)
+        key = None
+        if use_cache and self.cache.enabled:
+            dct_args = {'columns': columns, 'start': start, 'end': end, 'teams': teams, 'batters': batters,
+                        'pitchers': pitchers, 'sort': sort}
+            key = self.cache_key('wrk', dct_args, [f'wrk_statcast_{year}' for year in lst_years])
+            df = self.cache.get(key)
+            if df is not None:
+                return df
+
+        lst_frames = list(self.iter_wrk(columns, start, end, teams, batters, pitchers, lst_years, sort, chunk_rows))
+        if not lst_frames:
+            return pd.DataFrame(columns=columns)
+
+        for col in lst_frames[0].columns:
+            if isinstance(lst_frames[0][col].dtype, pd.CategoricalDtype):
+                categories = pd.api.types.union_categoricals([df[col] for df in lst_frames]).categories
+                for df in lst_frames:
+                    df[col] = df[col].cat.set_categories(categories)
+
+        df = pd.concat(lst_frames, ignore_index=True)
+        if key is not None:
+            self.cache.put(key, df)
+
+        return df
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def query(self, sql, params=None, tables=None, use_cache=True):
+        '''Runs a SELECT, e.g. a leaderboard or split over a WRK or rollup
+        table, and returns its result, from the cache if the tables it reads
+        were not written since it was cached.
+
+        Args:
+            sql(str): The SELECT. Lists in params are bound as IN lists.
+            params(dict): The parameters.
+            tables(list): The tables the query reads. Defaults to the RAW, WRK
+                          and rollup tables named in sql; a query that names
+                          none is not cached.
+            use_cache(bool): Read and store the result in the query cache.
+
+        Returns:
+            DataFrame: The result, as returned by the database.
+
+        Raises:
+            Exception: if the query fails
+        '''
+        params = params or {}
+        lst_tables = tables if tables is not None else sorted({t.lower() for t in TABLE_PATTERN.findall(sql)})
+        key = None
+        if use_cache and self.cache.enabled and lst_tables:
+            key = self.cache_key('sql', {'sql': normalize_sql(sql), 'params': params}, lst_tables)
+            df = self.cache.get(key)
+            if df is not None:
+                return df
+
+        stmt = text(sql).bindparams(*[bindparam(name, expanding=True) for name, value in params.items()
+                                      if isinstance(value, (list, tuple))])
+        with self.engine.connect() as conn:
+            df = pd.read_sql(stmt, conn, params=params)
+        if key is not None:
+            self.cache.put(key, df)
+
+        return df
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def build_features(self, start=None, end=None):
+        '''Creates or extends the feature matrix configured by the 'Features'
+        section of config.yaml (see feature_matrix.FeatureMatrix.build()).
+
+        A new matrix takes its features from the 'list' file (default
+        lists/reorder_features.txt) mapped to the WRK columns, and its
+        labels from 'labels'. An existing matrix keeps the columns it was
+        created with and is extended from the day after its latest date.
+
+        Args:
+            start(str): First date to (re)encode, formatted 'yyyy-mm-dd'.
+            end(str): Last date, formatted 'yyyy-mm-dd'.
+
+        Returns:
+            FeatureMatrix: The matrix.
+
+        Raises:
+            ValueError: if there is no WRK table to build from
+        '''
+        dct_features = self.get_config_section('Features')
+        parent_path = self.get_config_section('Paths').get('parent_path', '.')
+        matrix = FeatureMatrix(dct_features.get('path') or f'{parent_path}/features/wrk')
+
+        if matrix.dct_manifest is None:
+            lst_years = self.wrk_years(start, end)
+            if not lst_years:
+                raise ValueError('No WRK table to build the feature matrix from')
+            lst_wrk_columns = [dct_col['name'] for dct_col in inspect(self.engine).get_columns(f'wrk_statcast_{lst_years[0]}')]
+            lst_names = read_feature_list(dct_features.get('list') or f'{parent_path}/lists/reorder_features.txt')
+            matrix.create(wrk_feature_columns(lst_names, parent_path, lst_wrk_columns),
+                          dct_features.get('labels') or DEFAULT_LABELS)
+
+        rows = matrix.build(self, start, end, batch_rows=dct_features.get('batch_rows'))
+        print(f'Completed: {rows} rows added to the feature matrix in {matrix.path}, {matrix.rows} rows in total')
+        logging.info(f'Feature matrix {matrix.path}: {rows} rows added, {matrix.rows} in total')
+
+        return matrix
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def cache_key(self, kind, dct_args, lst_tables):
+        '''Returns the cache key of a query: its kind, its arguments with lists
+        of values sorted (the order of an IN list does not change the rows),
+        and the current watermark of each table it reads.
+
+        Args:
+            kind(str): 'wrk' for read_wrk(), 'sql' for query().
+            dct_args(dict): The query's arguments. 'columns' keeps its order.
+            lst_tables(list): The tables the query reads.
+
+        Returns:
+            str: The key.
+
+        Raises:
+            No exceptions
+        '''
+        lst_parts = [kind]
+        for name, value in sorted(dct_args.items()):
+            if isinstance(value, dict):
+                value = {k: _normalize_value(v) for k, v in sorted(value.items())}
+            elif name != 'columns':
+                value = _normalize_value(value)
+            lst_parts.append(f'{name}={value!r}')
+        dct_watermarks = read_watermarks(self.engine, list(lst_tables))
+        lst_parts += [f'{table}@{dct_watermarks[table]}' for table in sorted(dct_watermarks)]
+
+        return '|'.join(lst_parts)
+
+
+def _normalize_value(value):
+    '''Returns a parameter value as plain Python, with a list of values sorted.'''
+    if hasattr(value, 'tolist'):
+        value = value.tolist()
+    if isinstance(value, (list, tuple, set)):
+        return sorted((_normalize_value(v) for v in value), key=lambda v: (type(v).__name__, v))
+
+    return value
+
 
-    def __init__(self):
-        pass
+def normalize_sql(sql):
+    '''Returns the SQL with runs of whitespace outside string literals
+    collapsed to one space, so reformatting a query does not change its key.'''
+    lst_parts = re.split(r"('(?:[^']|'')*')", sql.strip())
 
-    def 
+    return ''.join(part if p % 2 else ' '.join(part.split()) for p, part in enumerate(lst_parts))
@@ -0,0 +1,643 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import argparse
+import functools
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import ujson
+import yaml
+
+from db_loader import create_db_engine, insert_df
+from player_map import save_player_map
+
+
+PARENT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Columns pybaseball.statcast() returns that are not in lst_reorder_cols.txt.
+EXTRA_RAW_COLS = ['pitcher.1', 'fielder_2.1', 'post_away_score', 'post_home_score', 'post_bat_score', 'post_fld_score']
+
+# Plate appearance outcomes and their approximate league-wide frequencies.
+DCT_PA_EVENTS = {'field_out': 0.43, 'strikeout': 0.225, 'single': 0.14, 'walk': 0.08, 'double': 0.045,
+                 'home_run': 0.03, 'grounded_into_double_play': 0.02, 'force_out': 0.015, 'hit_by_pitch': 0.01,
+                 'sac_fly': 0.006, 'field_error': 0.008, 'triple': 0.004, 'sac_bunt': 0.003,
+                 'fielders_choice_out': 0.003, 'double_play': 0.002, 'strikeout_double_play': 0.001,
+                 'fielders_choice': 0.001, 'catcher_interf': 0.001}
+
+LST_PITCH_TYPES = [('FF', '4-Seam Fastball'), ('SL', 'Slider'), ('CH', 'Changeup'), ('CU', 'Curveball'),
+                   ('SI', 'Sinker'), ('FC', 'Cutter')]
+
+
+def make_insert_frame(rows=4500, num_cols=60, str_cols=15, seed=0):
+    '''Creates a DataFrame shaped like a day of statcast data for the insert
+    benchmark: mostly float columns, some short strings and some NULLs.
+
+    Args:
+        rows(int): Number of rows, ~4500 is a full day of pitches.
+        num_cols(int): Number of numeric columns.
+        str_cols(int): Number of string columns.
+        seed(int): Seed for the random generator.
+
+    Returns:
+        DataFrame: The generated data.
+
+    Raises:
+        No exceptions
+    '''
+    rng = np.random.default_rng(seed)
+    dct_cols = {}
+    for c in range(0, num_cols):
+        arr = rng.normal(size=rows)
+        arr[rng.random(rows) < 0.1] = np.nan
+        dct_cols[f'num_{c}'] = arr
+    for c in range(0, str_cols):
+        dct_cols[f'str_{c}'] = rng.choice(['strikeout', 'field_out', 'single', 'ball', 'Progressive Field'], rows)
+
+    return pd.DataFrame(dct_cols)
+
+
+def _advance_runners(lst_bases, event, batter):
+    '''Moves the runners for a plate appearance outcome.
+
+    Returns:
+        tuple: (new bases, runners who scored, outs recorded)
+    '''
+    on_1b, on_2b, on_3b = lst_bases
+    if event == 'home_run':
+        return [None, None, None], [r for r in lst_bases if r] + [batter], 0
+    if event == 'triple':
+        return [None, None, batter], [r for r in lst_bases if r], 0
+    if event == 'double':
+        return [None, batter, on_1b], [r for r in [on_2b, on_3b] if r], 0
+    if event in ['single', 'field_error', 'fielders_choice']:
+        return [batter, on_1b, on_2b], [r for r in [on_3b] if r], 0
+    if event in ['walk', 'hit_by_pitch', 'catcher_interf']:
+        if on_1b and on_2b and on_3b:
+            return [batter, on_1b, on_2b], [on_3b], 0
+        if on_1b and on_2b:
+            return [batter, on_1b, on_2b], [], 0
+        if on_1b:
+            return [batter, on_1b, on_3b], [], 0
+        return [batter, on_2b, on_3b], [], 0
+    if event == 'sac_fly' and on_3b:
+        return [on_1b, on_2b, None], [on_3b], 1
+    if event in ['grounded_into_double_play', 'double_play', 'strikeout_double_play'] and on_1b:
+        return [None, on_2b, on_3b], [], 2
+    if event in ['force_out', 'fielders_choice_out']:
+        return [batter, on_2b, on_3b], [], 1
+
+    return [on_1b, on_2b, on_3b], [], 1
+
+
+def make_statcast_day(date='2019-06-01', n_games=15, seed=0, parent_path=PARENT_PATH):
+    '''Generates a synthetic day of raw statcast data, shaped like a
+    pybaseball.statcast() pull.
+
+    Each game is played out plate appearance by plate appearance: nine
+    innings of three outs, 1-7 pitches per plate appearance, outcomes drawn
+    from league-wide frequencies, and runners, outs and scores carried from
+    one pitch to the next. Gameday descriptions name the runners who score
+    so add_game_state() sees realistic text. Batters are named after players
+    in that season's dictionaries, so the position, batting order and sprint
+    speed lookups hit the way real data does. The pitch-tracking columns are
+    random, but with realistic ranges and NULLs where statcast has them.
+
+    Args:
+        date(str): The game date, formatted 'yyyy-mm-dd'.
+        n_games(int): Number of games, 15 is a full day.
+        seed(int): Seed for the random generator.
+        parent_path(str): The project folder that holds /csv, /dicts and /lists.
+
+    Returns:
+        DataFrame: The generated data, with the columns of lst_reorder_cols.txt
+                   plus the extra columns statcast() returns, newest pitch first.
+
+    Raises:
+        No exceptions
+    '''
+    rng = np.random.default_rng([seed, int(date.replace('-', ''))])
+    year = int(date[:4])
+    lst_teams = pd.read_csv(f'{parent_path}/csv/team_atts.csv')['Team'].tolist()
+    lst_names = _season_players(parent_path, year)
+    lst_events = list(DCT_PA_EVENTS)
+    arr_event_p = np.array(list(DCT_PA_EVENTS.values()))
+    arr_event_p = arr_event_p / arr_event_p.sum()
+
+    lst_rows = []
+    arr_matchups = rng.permutation(len(lst_teams))[:n_games * 2].reshape(-1, 2)
+    for g, (home, away) in enumerate(arr_matchups):
+        game_pk = 560000 + int(date.replace('-', '')[2:]) * 20 + g
+        dct_lineup = {t: rng.choice(len(lst_names), 10, replace=False) for t in [home, away]}
+        dct_score = {home: 0, away: 0}
+        dct_next = {home: 0, away: 0}
+        at_bat_number = 0
+        for inning in range(1, 10):
+            for topbot, bat, fld in [('Top', away, home), ('Bot', home, away)]:
+                if topbot == 'Bot' and inning == 9 and dct_score[home] > dct_score[away]:
+                    break
+                outs = 0
+                lst_bases = [None, None, None]
+                while outs < 3:
+                    at_bat_number += 1
+                    batter = int(dct_lineup[bat][dct_next[bat] % 9])
+                    dct_next[bat] += 1
+                    pitcher = int(dct_lineup[fld][9])
+                    event = lst_events[rng.choice(len(lst_events), p=arr_event_p)]
+                    num_pitches = int(rng.integers(1, 8))
+                    balls = strikes = 0
+                    for p in range(1, num_pitches + 1):
+                        last = p == num_pitches
+                        if not last:
+                            description = rng.choice(['ball', 'called_strike', 'foul', 'swinging_strike'])
+                        elif event == 'strikeout' or event == 'strikeout_double_play':
+                            description = rng.choice(['called_strike', 'swinging_strike'])
+                        elif event == 'walk':
+                            description = 'ball'
+                        elif event == 'hit_by_pitch':
+                            description = 'hit_by_pitch'
+                        else:
+                            description = 'hit_into_play'
+                        lst_rows.append({'game_pk': game_pk, 'home_team': lst_teams[home], 'away_team': lst_teams[away],
+                                         'batter': 400000 + batter, 'pitcher': 400000 + pitcher,
+                                         'player_name': lst_names[pitcher], 'inning': inning, 'inning_topbot': topbot,
+                                         'outs_when_up': outs, 'balls': balls, 'strikes': strikes,
+                                         'on_1b': lst_bases[0], 'on_2b': lst_bases[1], 'on_3b': lst_bases[2],
+                                         'home_score': dct_score[home], 'away_score': dct_score[away],
+                                         'bat_score': dct_score[bat], 'fld_score': dct_score[fld],
+                                         'post_home_score': dct_score[home], 'post_away_score': dct_score[away],
+                                         'post_bat_score': dct_score[bat], 'post_fld_score': dct_score[fld],
+                                         'at_bat_number': at_bat_number, 'pitch_number': p,
+                                         'fielders': dct_lineup[fld], 'description': description,
+                                         'events': event if last else None, 'des': None})
+                        if description == 'ball':
+                            balls = min(balls + 1, 3)
+                        elif description != 'foul' or strikes < 2:
+                            strikes = min(strikes + 1, 2)
+                    lst_bases, lst_scored, outs_made = _advance_runners(lst_bases, event, 400000 + batter)
+                    if event in ['strikeout', 'strikeout_double_play']:
+                        outs_made = max(outs_made, 1)
+                    outs += outs_made
+                    dct_score[bat] += len(lst_scored)
+                    lst_rows[-1].update({'post_home_score': dct_score[home], 'post_away_score': dct_score[away],
+                                         'post_bat_score': dct_score[bat]})
+                    verb = 'homers' if event == 'home_run' else event.replace('_', ' ')
+                    lst_rows[-1]['des'] = (f'{lst_names[batter]} {verb}. '
+                                           + ' '.join(f'{lst_names[r - 400000]} scores.' for r in lst_scored if r != 400000 + batter or event != 'home_run'))
+
+    n = len(lst_rows)
+    df = pd.DataFrame(lst_rows)
+    arr_fielders = np.stack(df.pop('fielders').to_numpy()) + 400000
+    for f in range(2, 10):
+        df[f'fielder_{f}'] = arr_fielders[:, f - 2]
+    df['game_date'] = pd.Timestamp(date)
+    df['game_year'] = year
+    df['stand'] = rng.choice(['R', 'L'], n, p=[0.6, 0.4])
+    df['p_throws'] = rng.choice(['R', 'L'], n, p=[0.7, 0.3])
+    df['if_fielding_alignment'] = rng.choice(['Standard', 'Infield shift', 'Strategic'], n, p=[0.7, 0.2, 0.1])
+    df['of_fielding_alignment'] = rng.choice(['Standard', 'Strategic'], n, p=[0.9, 0.1])
+    arr_pitch = rng.integers(0, len(LST_PITCH_TYPES), n)
+    df['pitch_type'] = [LST_PITCH_TYPES[i][0] for i in arr_pitch]
+    df['pitch_name'] = [LST_PITCH_TYPES[i][1] for i in arr_pitch]
+    df['type'] = np.where(df['description'] == 'ball', 'B', np.where(df['description'] == 'hit_into_play', 'X', 'S'))
+    for col, mean, sd in [('release_speed', 89, 6), ('release_pos_x', -1, 1.8), ('release_pos_z', 5.8, 0.5),
+                          ('release_pos_y', 54.3, 0.5), ('release_spin_rate', 2250, 300), ('release_extension', 6.2, 0.4),
+                          ('effective_speed', 89, 6), ('vx0', 2, 6), ('vy0', -130, 9), ('vz0', -4, 3),
+                          ('ax', -3, 9), ('ay', 27, 4), ('az', -24, 8), ('pfx_x', -0.1, 0.8), ('pfx_z', 0.7, 0.7),
+                          ('plate_x', 0, 0.85), ('plate_z', 2.3, 0.95), ('sz_top', 3.4, 0.2), ('sz_bot', 1.6, 0.1)]:
+        df[col] = rng.normal(mean, sd, n).round(3)
+    df['zone'] = rng.integers(1, 15, n).astype(float)
+    arr_in_play = (df['description'] == 'hit_into_play').to_numpy()
+    for col, mean, sd in [('launch_speed', 88, 14), ('launch_angle', 12, 26), ('hit_distance_sc', 180, 120),
+                          ('hc_x', 125, 40), ('hc_y', 140, 40), ('estimated_ba_using_speedangle', 0.3, 0.25),
+                          ('estimated_woba_using_speedangle', 0.35, 0.35)]:
+        df[col] = np.where(arr_in_play, rng.normal(mean, sd, n).round(3), np.nan)
+    df['bb_type'] = np.where(arr_in_play, rng.choice(['ground_ball', 'fly_ball', 'line_drive', 'popup'], n), None)
+    df['launch_speed_angle'] = np.where(arr_in_play, rng.integers(1, 7, n), np.nan)
+    df['hit_location'] = np.where(arr_in_play, rng.integers(1, 10, n), np.nan)
+    arr_pa_end = df['events'].notna().to_numpy()
+    for col, mean in [('woba_value', 0.3), ('woba_denom', 1.0), ('babip_value', 0.3), ('iso_value', 0.15)]:
+        df[col] = np.where(arr_pa_end, rng.random(n) * mean * 2, np.nan).round(3)
+    df['sv_id'] = None
+    df['pitcher.1'] = df['pitcher']
+    df['fielder_2.1'] = df['fielder_2']
+
+    with open(f'{parent_path}/lists/lst_reorder_cols.txt', 'r') as filehandler:
+        lst_cols = [line.strip() for line in filehandler if line.strip()]
+    df = df[lst_cols + EXTRA_RAW_COLS]
+
+    return df.sort_values(['game_pk', 'at_bat_number', 'pitch_number'], ascending=False, ignore_index=True)
+
+
+def iter_statcast_days(start='2019-04-01', days=1, n_games=15, seed=0, parent_path=PARENT_PATH):
+    '''Yields (date, DataFrame) for consecutive synthetic days, one day at
+    a time so a full season does not have to be held in memory.'''
+    start_dt = datetime.strptime(start, '%Y-%m-%d')
+    for d in range(0, days):
+        date = (start_dt + timedelta(days=d)).strftime('%Y-%m-%d')
+        yield date, make_statcast_day(date, n_games, seed, parent_path)
+
+
+def _season_players(parent_path, year):
+    '''Returns player names from a season's position dictionary, or generic
+    names if the dictionary is not there.'''
+    try:
+        lst_names = sorted(ujson.load(open(f'{parent_path}/dicts/dct_pos_{year}.txt')))
+    except (OSError, ValueError):
+        lst_names = []
+
+    return lst_names if len(lst_names) >= 20 else [f'Player {i}' for i in range(0, 600)]
+
+
+def make_bench_db(tmpdir, parent_path=PARENT_PATH, year=2019):
+    '''Creates a Statcast_DB that writes to a SQLite database in tmpdir,
+    with the raw data cache off and a synthetic PlayerID Map snapshot that
+    matches the players of make_statcast_day(), so nothing touches the network.
+
+    Args:
+        tmpdir(str): Scratch folder for the config, database and snapshot.
+        parent_path(str): The project folder that holds /csv, /dicts and /lists.
+        year(int): The season the synthetic players are taken from.
+
+    Returns:
+        Statcast_DB: The connected object.
+
+    Raises:
+        No exceptions
+    '''
+    from mlb_statcast import Statcast_DB
+
+    lst_names = _season_players(parent_path, year)
+    df_map = pd.DataFrame({'MLBID': range(400000, 400000 + len(lst_names)), 'MLBNAME': lst_names,
+                           'PLAYERNAME': lst_names, 'BREFID': None, 'POS': 'OF', 'ACTIVE': 'Y'})
+    save_player_map(df_map.to_csv(index=False).encode('utf-8'), f'{tmpdir}/playeridmap.csv', 'synthetic', len(df_map))
+
+    lst_config = [{'Database_System': {'db_type': 'sqlite'}},
+                  {'DB_SQLite': {'database': f'{tmpdir}/bench.db'}},
+                  {'Paths': {'parent_path': parent_path}},
+                  {'Cache': {'enabled': False, 'path': f'{tmpdir}/cache'}},
+                  {'Metrics': {'enabled': False}},
+                  {'PlayerMap': {'path': f'{tmpdir}/playeridmap.csv', 'ttl_days': None}}]
+    with open(f'{tmpdir}/config.yaml', 'w') as yamlfile:
+        yaml.dump(lst_config, yamlfile)
+
+    statcast_db = Statcast_DB(f'{tmpdir}/config.yaml')
+    statcast_db.dbtype = 'sqlite'
+    statcast_db.connect_db()
+
+    return statcast_db
+
+
+def bench_insert(df, dct_loader=None, repeat=3):
+    '''Times inserting a DataFrame into a fresh SQLite database.
+
+    Args:
+        df(DataFrame): The data to insert.
+        dct_loader(dict): Loader settings passed to db_loader.insert_df(), or
+                          None to time a plain DataFrame.to_sql().
+        repeat(int): Number of timed runs, the fastest is reported.
+
+    Returns:
+        float: Rows inserted per second.
+
+    Raises:
+        No exceptions
+    '''
+    lst_times = []
+    for r in range(0, repeat):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            engine = create_db_engine('sqlite', {'database': os.path.join(tmpdir, 'bench.db')})
+            startTime = time.perf_counter()
+            if dct_loader is None:
+                df.to_sql('bench', engine, index=False, if_exists='append')
+            else:
+                insert_df(df, 'bench', engine, dct_loader)
+            lst_times.append(time.perf_counter() - startTime)
+            engine.dispose()
+
+    return len(df) / min(lst_times)
+
+
+def run_insert_benchmarks(rows=4500, lst_batch_sizes=(100, 1000, 5000)):
+    '''Prints insert throughput for plain to_sql and the bulk loader at several
+    batch sizes against a local SQLite stand-in.
+    '''
+    df = make_insert_frame(rows)
+    print(f'Insert benchmark: {len(df)} rows x {len(df.columns)} columns (sqlite)')
+    print(f'{"to_sql (baseline)":<30}{bench_insert(df):>12,.0f} rows/sec')
+    for mode in ['executemany', 'multi']:
+        for batch_size in lst_batch_sizes:
+            rows_sec = bench_insert(df, {'batch_size': batch_size, 'default_mode': mode})
+            print(f'{f"insert_df {mode} batch={batch_size}":<30}{rows_sec:>12,.0f} rows/sec')
+
+
+# Row-by-row versions of the WRK transforms that were vectorized, kept as the
+# reference check_parity() compares the Statcast_DB methods to. Each reads the
+# frame the method is about to run on and returns {column: values}.
+# add_post_scores is not here: add_game_state() replaced it.
+def _loop_add_teams(statcast_db):
+    lst_bat_team = []
+    lst_fld_team = []
+    for i in range(0, len(statcast_db.df['Inning_TopBot'])):
+        if statcast_db.df['Inning_TopBot'][i] == 'Top':
+            lst_bat_team.append(statcast_db.df['Away_Team'][i])
+            lst_fld_team.append(statcast_db.df['Home_Team'][i])
+        if statcast_db.df['Inning_TopBot'][i] == 'Bot':
+            lst_bat_team.append(statcast_db.df['Home_Team'][i])
+            lst_fld_team.append(statcast_db.df['Away_Team'][i])
+
+    return {'Bat_Team': lst_bat_team, 'Fld_Team': lst_fld_team}
+
+
+def _loop_add_player_names(statcast_db):
+    lst_cols = ['Fielder_2', 'Fielder_3', 'Fielder_4', 'Fielder_5', 'Fielder_6',
+                'Fielder_7', 'Fielder_8', 'Fielder_9', 'On_1b', 'On_2b', 'On_3b']
+
+    return {col: [statcast_db.dct_playerIDs.get(x, None) for x in statcast_db.df[col]] for col in lst_cols}
+
+
+# The events each cnt_* column counted before add_cnt_events() replaced the
+# per-column np.select() methods, as (column, Result_Event values,
+# Event_Description or None).
+LOOP_CNT_EVENTS = [
+    ('cnt_PA', ['strikeout', 'field_out', 'grounded_into_double_play', 'strikeout_double_play', 'double_play',
+                'force_out', 'fielders_choice_out', 'fielders_choice', 'single', 'double', 'triple', 'home_run',
+                'hit_by_pitch', 'walk', 'field_error', 'sac_fly', 'sac_bunt', 'interf_def'], None),
+    ('cnt_AB', ['strikeout', 'field_out', 'grounded_into_double_play', 'strikeout_double_play', 'double_play',
+                'force_out', 'fielders_choice_out', 'fielders_choice', 'single', 'double', 'triple', 'home_run'], None),
+    ('cnt_Hit', ['single', 'double', 'triple', 'home_run'], None),
+    ('cnt_Single', ['single'], None),
+    ('cnt_Double', ['double'], None),
+    ('cnt_Triple', ['triple'], None),
+    ('cnt_Home_Run', ['home_run'], None),
+    ('cnt_K', ['strikeout'], 'called_strike'),
+    ('cnt_BackwardsK', ['strikeout'], 'swinging_strike'),
+    ('cnt_Walk', ['walk'], None),
+    ('cnt_HBP', ['hit_by_pitch'], None)]
+
+
+def _loop_add_cnt_events(statcast_db):
+    dct_cnt = {col: [] for col, lst_events, desc in LOOP_CNT_EVENTS}
+    for i in range(0, len(statcast_db.df)):
+        event = statcast_db.df['Result_Event'][i]
+        event_desc = statcast_db.df['Event_Description'][i]
+        for col, lst_events, desc in LOOP_CNT_EVENTS:
+            if any(event == x for x in lst_events) and (desc is None or event_desc == desc):
+                dct_cnt[col].append(1)
+            else:
+                dct_cnt[col].append(0)
+
+    return dct_cnt
+
+
+def _loop_add_cnt_rbi(statcast_db):
+    # A pitch that did not end a plate appearance (no Result_Event) drives in
+    # no runs, as add_game_state() made the score change of every pitch known.
+    lst_cnt_rbi = []
+    for i in range(0, len(statcast_db.df)):
+        event = statcast_db.df['Result_Event'][i]
+        if pd.isna(event) or event in ['field_error', 'grounded_into_double_play', 'strikeout', 'strikeout_double_play', 'double_play']:
+            lst_cnt_rbi.append(0)
+        else:
+            lst_cnt_rbi.append(statcast_db.df['Post_Bat_Score'][i] - statcast_db.df['Bat_Score'][i])
+
+    return {'cnt_RBI': lst_cnt_rbi}
+
+
+def _loop_add_yahoo_pnts(statcast_db):
+    df = statcast_db.df
+    lst_yahoo_pnts_b = []
+    for i in list(df.index.values):
+        lst_yahoo_pnts_b.append((df['cnt_Single'].iloc[i]*2.6) + (df['cnt_Double'].iloc[i]*5.2) + (df['cnt_Triple'].iloc[i]*7.8) + (df['cnt_Home_Run'].iloc[i]*10.4) + (df['cnt_RBI'].iloc[i]*1.9) + (df['cnt_Walk'].iloc[i]*2.6) + (df['cnt_HBP'].iloc[i]*2.6))
+
+    return {'Yahoo_Pnts_Batter': lst_yahoo_pnts_b}
+
+
+PARITY_STEPS = {'add_teams': _loop_add_teams,
+                'add_player_names': _loop_add_player_names,
+                'add_cnt_events': _loop_add_cnt_events,
+                'add_cnt_rbi': _loop_add_cnt_rbi,
+                'add_yahoo_pnts': _loop_add_yahoo_pnts}
+
+
+def _same_values(lst_expected, srs_actual):
+    '''Returns True if a column holds the expected values, NaN and None
+    counting as the same missing value.'''
+    arr_expected = pd.Series(lst_expected, dtype=object).to_numpy()
+    arr_actual = srs_actual.astype(object).to_numpy()
+    if len(arr_expected) != len(arr_actual):
+        return False
+    arr_missing = pd.isna(arr_expected)
+    if not np.array_equal(arr_missing, pd.isna(arr_actual)):
+        return False
+
+    return all(e == a for e, a in zip(arr_expected[~arr_missing], arr_actual[~arr_missing]))
+
+
+def check_parity(date='2019-06-01', n_games=15, seed=0, parent_path=PARENT_PATH):
+    '''Runs a synthetic day through process_date() and checks every output
+    column of the vectorized transforms against its row-by-row version.
+
+    Each method in PARITY_STEPS is wrapped so the loop version runs on the
+    frame the method receives, and its columns are compared to what the
+    method produced, value by value.
+
+    Args:
+        date(str): The synthetic date, formatted 'yyyy-mm-dd'.
+        n_games(int): Games in the day.
+        seed(int): Seed of the synthetic day.
+        parent_path(str): The project folder that holds /csv, /dicts and /lists.
+
+    Returns:
+        dict: {method: [columns that differ]}, empty lists if every column
+              matched.
+
+    Raises:
+        RuntimeError: if a method in PARITY_STEPS did not run
+    '''
+    dct_diffs = {}
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        statcast_db = make_bench_db(tmpdir, parent_path, int(date[:4]))
+        df_day = make_statcast_day(date, n_games, seed, parent_path)
+        statcast_db.fetch_statcast = lambda start_dt, end_dt: df_day.copy()
+
+        def wrap(name, method, loop):
+            @functools.wraps(method)
+            def checked(*args, **kwargs):
+                dct_expected = loop(statcast_db)
+                result = method(*args, **kwargs)
+                dct_diffs[name] = [col for col, lst_values in dct_expected.items()
+                                   if not _same_values(lst_values, statcast_db.df[col])]
+                return result
+            return checked
+
+        for name, loop in PARITY_STEPS.items():
+            setattr(statcast_db, name, wrap(name, getattr(statcast_db, name), loop))
+        statcast_db.process_date(date)
+        statcast_db.engine.dispose()
+
+    lst_missing = [name for name in PARITY_STEPS if name not in dct_diffs]
+    if lst_missing:
+        raise RuntimeError(f'Transforms did not run: {lst_missing}')
+
+    return dct_diffs
+
+
+# Statcast_DB methods timed as pipeline steps. Methods called from inside
+# another timed step (e.g. calc_yahoo_pnts) count towards the outer step.
+STEP_PREFIXES = ('fetch_', 'load_year_', 'reorder_', 'rename_', 'add_', 'calc_')
+
+
+def _instrument(statcast_db, dct_times, dct_peaks=None):
+    '''Wraps every pipeline step of a Statcast_DB instance so its time (and
+    optionally the peak traced memory it allocated on top of what was already
+    in use) is added to the dictionaries.'''
+    depth = [0]
+    start_bytes = [0]
+
+    def wrap(name, method):
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            depth[0] += 1
+            if depth[0] == 1 and dct_peaks is not None:
+                start_bytes[0] = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+            startTime = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                depth[0] -= 1
+                if depth[0] == 0:
+                    dct_times[name] = dct_times.get(name, 0.0) + time.perf_counter() - startTime
+                    if dct_peaks is not None:
+                        peak_bytes = tracemalloc.get_traced_memory()[1]
+                        dct_peaks[name] = max(dct_peaks.get(name, 0), peak_bytes - start_bytes[0])
+                        dct_peaks['(day)'] = max(dct_peaks.get('(day)', 0), peak_bytes)
+        return timed
+
+    for name in dir(type(statcast_db)):
+        if name.startswith(STEP_PREFIXES) and callable(getattr(type(statcast_db), name)):
+            setattr(statcast_db, name, wrap(name, getattr(statcast_db, name)))
+
+
+def bench_pipeline(days=1, n_games=15, start='2019-04-01', insert=True, memory=True, parent_path=PARENT_PATH):
+    '''Runs synthetic days through Statcast_DB.process_date() and the RAW/WRK
+    inserts into SQLite, timing each transform step.
+
+    Each day is generated before its timing starts, and fed to the
+    pipeline through fetch_statcast(), so network and generation time are not
+    measured. With memory=True one more day is run under tracemalloc to get
+    the peak memory each step allocates, and the peak in use at any point of
+    the day; it is a separate pass because tracing slows the code down.
+
+    Args:
+        days(int): Number of days, ~186 is a full season.
+        n_games(int): Games per day.
+        start(str): First date, formatted 'yyyy-mm-dd'.
+        insert(bool): Also time the inserts.
+        memory(bool): Also measure peak memory per step.
+        parent_path(str): The project folder that holds /csv, /dicts and /lists.
+
+    Returns:
+        dict: 'rows', 'days', 'steps' {step: seconds}, 'peaks' {step: bytes
+              allocated by the step} and 'peak_day' (bytes in use at the
+              peak of the day).
+
+    Raises:
+        No exceptions
+    '''
+    dct_times = {}
+    dct_peaks = {}
+    rows = 0
+    peak_day = 0
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        statcast_db = make_bench_db(tmpdir, parent_path, int(start[:4]))
+        _instrument(statcast_db, dct_times)
+
+        for date, df_day in iter_statcast_days(start, days, n_games, parent_path=parent_path):
+            statcast_db.fetch_statcast = lambda start_dt, end_dt, df_day=df_day: df_day.copy()
+            rows += len(df_day)
+
+            startTime = time.perf_counter()
+            df_raw, df_wrk = statcast_db.process_date(date)
+            dct_times['process_date (total)'] = dct_times.get('process_date (total)', 0.0) + time.perf_counter() - startTime
+
+            if insert:
+                for step, df, table in [('insert RAW', df_raw, f'raw_statcast_{date[:4]}'),
+                                        ('insert WRK', df_wrk, f'wrk_statcast_{date[:4]}')]:
+                    startTime = time.perf_counter()
+                    insert_df(df, table, statcast_db.engine, statcast_db.dct_loader)
+                    dct_times[step] = dct_times.get(step, 0.0) + time.perf_counter() - startTime
+
+        if memory:
+            statcast_db = make_bench_db(tmpdir, parent_path, int(start[:4]))
+            _instrument(statcast_db, {}, dct_peaks)
+            date, df_day = next(iter_statcast_days(start, 1, n_games, parent_path=parent_path))
+            statcast_db.fetch_statcast = lambda start_dt, end_dt: df_day.copy()
+            tracemalloc.start()
+            try:
+                df_raw, df_wrk = statcast_db.process_date(date)
+                if insert:
+                    for step, df, table in [('insert RAW', df_raw, f'raw_statcast_{date[:4]}'),
+                                            ('insert WRK', df_wrk, f'wrk_statcast_{date[:4]}')]:
+                        start_bytes = tracemalloc.get_traced_memory()[0]
+                        tracemalloc.reset_peak()
+                        insert_df(df, table, statcast_db.engine, statcast_db.dct_loader)
+                        peak_bytes = tracemalloc.get_traced_memory()[1]
+                        dct_peaks[step] = peak_bytes - start_bytes
+                        dct_peaks['(day)'] = max(dct_peaks.get('(day)', 0), peak_bytes)
+            finally:
+                tracemalloc.stop()
+            peak_day = dct_peaks.pop('(day)', 0)
+
+        statcast_db.engine.dispose()
+
+    return {'rows': rows, 'days': days, 'steps': dct_times, 'peaks': dct_peaks, 'peak_day': peak_day}
+
+
+def print_pipeline_report(dct_result):
+    '''Prints the time, rows/sec and peak memory of each step.'''
+    rows = dct_result['rows']
+    print(f'Pipeline benchmark: {dct_result["days"]} day(s), {rows:,} pitches (sqlite)')
+    print(f'{"step":<30}{"total s":>10}{"ms/day":>10}{"rows/sec":>14}{"peak MB":>10}')
+    for step, seconds in sorted(dct_result['steps'].items(), key=lambda x: -x[1]):
+        peak = dct_result['peaks'].get(step)
+        print(f'{step:<30}{seconds:>10.3f}{seconds / dct_result["days"] * 1000:>10.1f}'
+              f'{rows / seconds if seconds else float("inf"):>14,.0f}'
+              f'{"" if peak is None else f"{peak / 1024**2:.1f}":>10}')
+    if dct_result['peak_day']:
+        print(f'Peak traced memory for one day: {dct_result["peak_day"] / 1024**2:.1f} MB')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks for the statcast pipeline.')
+    parser.add_argument('--suite', choices=['pipeline', 'insert', 'parity', 'all'], default='all')
+    parser.add_argument('--rows', type=int, default=4500, help='rows for the insert benchmark')
+    parser.add_argument('--days', type=int, default=1, help='synthetic days, ~186 is a full season')
+    parser.add_argument('--games', type=int, default=15, help='games per synthetic day')
+    parser.add_argument('--start', default='2019-04-01', help='first synthetic date')
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc pass')
+    parser.add_argument('--json', help='also write the pipeline results to this file')
+    args = parser.parse_args()
+
+    if args.suite in ['pipeline', 'all']:
+        dct_result = bench_pipeline(args.days, args.games, args.start, memory=not args.no_memory)
+        print_pipeline_report(dct_result)
+        if args.json:
+            with open(args.json, 'w') as f:
+                ujson.dump(dct_result, f, indent=2)
+    if args.suite in ['insert', 'all']:
+        run_insert_benchmarks(args.rows)
+    if args.suite in ['parity', 'all']:
+        dct_diffs = check_parity(args.start, args.games)
+        for name, lst_cols in dct_diffs.items():
+            print(f'{name:<30}{"ok" if not lst_cols else f"differs: {lst_cols}"}')
+        if any(dct_diffs.values()):
+            raise SystemExit(1)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import hashlib
+import importlib.util
+import logging
+import os
+import uuid
+
+import pandas as pd
+
+
+class DiskCache():
+    '''
+    A local, size-bounded cache of DataFrames stored as compressed Parquet
+    files.
+
+    Entries are addressed by the SHA-256 of a key string, so the file name
+    is fixed by what was requested rather than when it was written. Each hit
+    touches the file's modification time, and when the cache grows past
+    max_bytes the least recently used files are deleted first. There is no
+    shared index file, so several processes can read and write the same
+    cache directory at once.
+
+    Args:
+        path(str): Directory that holds the cached files.
+        max_bytes(int): Size limit of the cache, in bytes.
+        compression(str): Parquet compression codec.
+
+    Attributes:
+        enabled(bool): False if pyarrow is not installed, in which case every
+                       get() is a miss and put() does nothing.
+
+    '''
+    def __init__(self, path, max_bytes=5 * 1024**3, compression='zstd'):
+
+        self.path = path
+        self.max_bytes = max_bytes
+        self.compression = compression
+        self.enabled = importlib.util.find_spec('pyarrow') is not None
+
+        if self.enabled:
+            os.makedirs(self.path, exist_ok=True)
+        else:
+            logging.warning(f'pyarrow is not installed, the cache at {self.path} is disabled')
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def key_path(self, key):
+        '''Returns the file path for a key.'''
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+        return os.path.join(self.path, f'{digest}.parquet')
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def get(self, key):
+        '''Returns the cached DataFrame for a key, or None on a miss.
+
+        Args:
+            key(str): The cache key.
+
+        Returns:
+            DataFrame: The cached data, or None.
+
+        Raises:
+            No exceptions
+        '''
+        if not self.enabled:
+            return None
+
+        path = self.key_path(key)
+        try:
+            df = pd.read_parquet(path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.exception(f'Unreadable cache entry for {key}, discarding it')
+            self.discard(key)
+            return None
+
+        os.utime(path)
+
+        return df
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def put(self, key, df):
+        '''Stores a DataFrame under a key, then evicts old entries if the cache
+        is over its size limit.
+
+        The file is written under a temporary name and renamed into place, so
+        readers never see a partial file.
+
+        Args:
+            key(str): The cache key.
+            df(DataFrame): The data to store.
+
+        Returns:
+            Does not return a parameter
+
+        Raises:
+            No exceptions
+        '''
+        if not self.enabled:
+            return
+
+        path = self.key_path(key)
+        tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        try:
+            df.to_parquet(tmp_path, compression=self.compression, index=False)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logging.exception(f'Could not cache {key}')
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        self.evict()
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def discard(self, key):
+        '''Removes the entry for a key, if there is one.'''
+        try:
+            os.remove(self.key_path(key))
+        except FileNotFoundError:
+            pass
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def evict(self):
+        '''Deletes the least recently used entries until the cache fits within
+        max_bytes.
+
+        Returns:
+            int: Number of entries deleted.
+
+        Raises:
+            No exceptions
+        '''
+        lst_entries = []
+        for entry in os.scandir(self.path):
+            if entry.name.endswith('.parquet'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                lst_entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total_bytes = sum(size for _, size, _ in lst_entries)
+        deleted = 0
+        for mtime, size, path in sorted(lst_entries):
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+            deleted += 1
+
+        return deleted
+
+
+def raw_statcast_key(start_dt, end_dt):
+    '''Returns the cache key for a pybaseball.statcast() pull.'''
+    return f'statcast|start_dt={start_dt}|end_dt={end_dt}'
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# coding: utf-8
+'''
+Command-line entry point for the MLB Statcast pipeline.
+
+    python statcast_cli.py build [--start 2019-03-28 --end 2019-09-29] [--workers 4]
+    python statcast_cli.py resume [--workers 4]
+    python statcast_cli.py stream [2019-06-03 ...] [--start ... --end ...]
+    python statcast_cli.py backfill --start 2019-04-01 --end 2019-06-30 [--chunk-games 5] [--resume]
+    python statcast_cli.py rollups 2019 [--rebuild]
+    python statcast_cli.py form 2019
+    python statcast_cli.py indexes 2019 [--drop]
+    python statcast_cli.py export 2019
+    python statcast_cli.py features [--start 2019-03-28] [--end 2019-09-29]
+
+The database is taken from config.yaml, so nothing is prompted for and the
+commands can be scheduled on a server without a display. Only the standard
+library is imported at startup; pandas, SQLAlchemy and pybaseball are loaded
+by the subcommand that needs them; tests/test_cli_startup.py checks both the
+imports and the startup time.
+'''
+
+import argparse
+import os
+import sys
+from datetime import date, datetime, timedelta
+
+
+def date_range(start, end):
+    '''Returns every date from start to end (inclusive), formatted 'yyyy-mm-dd'.
+
+    Args:
+        start(str): First date, formatted 'yyyy-mm-dd'.
+        end(str): Last date, formatted 'yyyy-mm-dd'. Defaults to start.
+
+    Returns:
+        list: The dates.
+
+    Raises:
+        ValueError: if a date is not formatted 'yyyy-mm-dd', or end is before start
+    '''
+    start_dt = datetime.strptime(start, '%Y-%m-%d').date()
+    end_dt = datetime.strptime(end or start, '%Y-%m-%d').date()
+    if end_dt < start_dt:
+        raise ValueError(f'End date {end} is before start date {start}')
+
+    return [(start_dt + timedelta(days=d)).strftime('%Y-%m-%d') for d in range(0, (end_dt - start_dt).days + 1)]
+
+
+def _dates_from_args(args):
+    '''Returns the dates given on the command line, or None if there were none.'''
+    lst_dates = list(getattr(args, 'dates', None) or [])
+    if args.start:
+        lst_dates += date_range(args.start, args.end)
+
+    return lst_dates or None
+
+
+def _open_db(args):
+    '''Creates the Statcast_DB object, importing the pipeline on first use.'''
+    from mlb_statcast import Statcast_DB
+
+    return Statcast_DB(args.config)
+
+
+def cmd_build(args):
+    '''Builds the database from config.yaml, optionally resuming a previous build.'''
+    statcast_db = _open_db(args)
+    statcast_db.build_db(workers=args.workers,
+                         resume=args.resume,
+                         refresh=args.refresh,
+                         lst_dates=_dates_from_args(args),
+                         interactive=args.gui)
+
+
+def cmd_stream(args):
+    '''Streams each date into the database, yesterday if no date is given.'''
+    lst_dates = _dates_from_args(args) or [(date.today() - timedelta(days=1)).strftime('%Y-%m-%d')]
+
+    statcast_db = _open_db(args)
+    for stream_date in lst_dates:
+        statcast_db.stream_data(stream_date, refresh=args.refresh)
+
+
+def cmd_backfill(args):
+    '''Loads a range of dates through the chunked pipeline, a few games at a time.'''
+    statcast_db = _open_db(args)
+    statcast_db.stream_range(args.start,
+                             args.end,
+                             chunk_games=args.chunk_games,
+                             resume=args.resume,
+                             refresh=args.refresh)
+
+
+def cmd_rollups(args):
+    '''Checks the rollup tables of each season against its WRK table.'''
+    statcast_db = _open_db(args)
+    for year in args.years:
+        statcast_db.check_rollups(year, rebuild=args.rebuild)
+
+
+def cmd_form(args):
+    '''Rebuilds the rolling player form of each season from its WRK table.'''
+    statcast_db = _open_db(args)
+    statcast_db.dbtype = statcast_db.get_config_section('Database_System')['db_type']
+    statcast_db.connect_db()
+    for year in args.years:
+        statcast_db.rebuild_year_form(year)
+    statcast_db.manage_indexes(args.years, 'create')
+
+
+def cmd_indexes(args):
+    '''Creates the missing indexes, or drops them, on each season's tables.'''
+    statcast_db = _open_db(args)
+    statcast_db.dbtype = statcast_db.get_config_section('Database_System')['db_type']
+    statcast_db.connect_db()
+    statcast_db.manage_indexes(args.years, 'drop' if args.drop else 'create')
+
+
+def cmd_export(args):
+    '''Exports each season's WRK table to the Parquet dataset.'''
+    statcast_db = _open_db(args)
+    for year in args.years:
+        statcast_db.export_year(year)
+
+
+def cmd_features(args):
+    '''Creates the feature matrix, or extends it with the dates loaded since.'''
+    from statcast_analyze import Statcast_Analyze
+
+    Statcast_Analyze(args.config).build_features(args.start, args.end)
+
+
+def build_parser():
+    '''Returns the argument parser for the command line.'''
+    parser = argparse.ArgumentParser(prog='statcast_cli', description='MLB Statcast database pipeline.')
+    parser.add_argument('--config', default='config.yaml', help='config file (default: %(default)s)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    parser_dates = argparse.ArgumentParser(add_help=False)
+    parser_dates.add_argument('--start', help='first date of a range, yyyy-mm-dd')
+    parser_dates.add_argument('--end', help='last date of a range, yyyy-mm-dd (default: --start)')
+    parser_dates.add_argument('--refresh', action='store_true',
+                              help='re-download instead of reading the local cache, and reload dates already loaded')
+
+    parser_build = subparsers.add_parser('build', parents=[parser_dates], help='build the RAW and WRK tables')
+    parser_build.add_argument('--workers', type=int, help="worker processes (default: 'Build' section of config)")
+    parser_build.add_argument('--resume', action='store_true', help='retry dates the manifest shows as failed')
+    parser_build.add_argument('--gui', action='store_true', help='ask for the database in the GUI prompt')
+    parser_build.set_defaults(func=cmd_build)
+
+    parser_resume = subparsers.add_parser('resume', parents=[parser_dates], help='resume an interrupted build')
+    parser_resume.add_argument('--workers', type=int, help="worker processes (default: 'Build' section of config)")
+    parser_resume.set_defaults(func=cmd_build, resume=True, gui=False)
+
+    parser_stream = subparsers.add_parser('stream', parents=[parser_dates], help='append new dates to the tables')
+    parser_stream.add_argument('dates', nargs='*', help='dates to append, yyyy-mm-dd (default: yesterday)')
+    parser_stream.set_defaults(func=cmd_stream)
+
+    parser_backfill = subparsers.add_parser('backfill', parents=[parser_dates],
+                                            help='load a range of dates in chunks of games, with bounded memory')
+    parser_backfill.add_argument('--chunk-games', type=int, help="games per chunk (default: 'Build' section of config)")
+    parser_backfill.add_argument('--resume', action='store_true', help='retry dates the manifest shows as failed')
+    parser_backfill.set_defaults(func=cmd_backfill)
+
+    parser_rollups = subparsers.add_parser('rollups', help='check the rollup tables against the WRK tables')
+    parser_rollups.add_argument('years', nargs='+', help='seasons to check, e.g. 2019')
+    parser_rollups.add_argument('--rebuild', action='store_true', help='rebuild a rollup that differs')
+    parser_rollups.set_defaults(func=cmd_rollups, start=None)
+
+    parser_form = subparsers.add_parser('form', help='rebuild the rolling player form from the WRK tables')
+    parser_form.add_argument('years', nargs='+', help='seasons to rebuild, e.g. 2019')
+    parser_form.set_defaults(func=cmd_form, start=None)
+
+    parser_indexes = subparsers.add_parser('indexes', help='create the indexes of the RAW, WRK and rollup tables')
+    parser_indexes.add_argument('years', nargs='+', help='seasons to index, e.g. 2019')
+    parser_indexes.add_argument('--drop', action='store_true', help='drop the indexes instead, e.g. before a bulk load')
+    parser_indexes.set_defaults(func=cmd_indexes, start=None)
+
+    parser_export = subparsers.add_parser('export', help='export the WRK tables to a Parquet dataset')
+    parser_export.add_argument('years', nargs='+', help='seasons to export, e.g. 2019')
+    parser_export.set_defaults(func=cmd_export, start=None)
+
+    parser_features = subparsers.add_parser('features', help='build or extend the ML feature matrix')
+    parser_features.add_argument('--start', help='first date to encode, yyyy-mm-dd (default: after the latest date)')
+    parser_features.add_argument('--end', help='last date to encode, yyyy-mm-dd (default: the latest loaded)')
+    parser_features.set_defaults(func=cmd_features)
+
+    return parser
+
+
+def main(argv=None):
+    '''Parses the command line and runs the subcommand.'''
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    try:
+        _dates_from_args(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.command == 'backfill' and not args.start:
+        parser.error('backfill requires --start')
+
+    if not os.path.exists(args.config):
+        parser.error(f'config file not found: {args.config}')
+
+    args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
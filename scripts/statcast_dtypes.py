@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import pandas as pd
+
+from transform_registry import CNT_EVENT_COLS, GAME_STATE_COLS
+
+
+# RAW columns holding IDs, counts and scores. Statcast returns them as floats
+# whenever the day has a NULL in the column; they are stored as nullable
+# integers instead. Every value fits in 32 bits (MLB IDs and game_pk < 10^7).
+RAW_INT_COLS = ['game_year', 'game_pk', 'pitcher', 'batter', 'home_score', 'away_score', 'bat_score', 'fld_score',
+                'inning', 'outs_when_up', 'on_3b', 'on_2b', 'on_1b', 'balls', 'strikes',
+                'fielder_2', 'fielder_3', 'fielder_4', 'fielder_5', 'fielder_6', 'fielder_7', 'fielder_8', 'fielder_9',
+                'at_bat_number', 'pitch_number', 'pitcher.1', 'fielder_2.1',
+                'post_away_score', 'post_home_score', 'post_bat_score', 'post_fld_score']
+
+# RAW text columns with a small set of repeated values, stored as categoricals.
+# 'des' and 'sv_id' are close to unique per row and stay as plain strings.
+RAW_CATEGORY_COLS = ['player_name', 'p_throws', 'stand', 'home_team', 'away_team', 'inning_topbot',
+                     'if_fielding_alignment', 'of_fielding_alignment', 'pitch_type', 'pitch_name',
+                     'bb_type', 'type', 'events', 'description']
+
+# The same model for the WRK tables. Columns in none of these lists are
+# float64 measurements. The cnt_* counts are nullable too: a row the
+# transformation has not filled in, or a table read back before a count
+# column was added, holds NULLs.
+WRK_INT_COLS = ['Game_Year', 'Game_ID', 'Pitcher_ID', 'Batter_ID', 'Home_Score', 'Away_Score', 'Bat_Score',
+                'Fld_Score', 'Inning', 'Outs_When_Up', 'Balls', 'Strikes', 'PA_Num', 'Pitch_Num'] + GAME_STATE_COLS
+WRK_COUNT_COLS = CNT_EVENT_COLS
+WRK_CATEGORY_COLS = ['Pitcher_Name', 'Batter_Name', 'Pitcher_Hand', 'Batter_Hand', 'Home_Team', 'Away_Team',
+                     'Bat_Team', 'Fld_Team', 'Bat_Team_League', 'Bat_Team_Division', 'Fld_Team_League',
+                     'Fld_Team_Division', 'Ball_Park', 'Inning_TopBot', 'On_3b', 'On_2b', 'On_1b',
+                     'IF_Alightnment', 'OF_Alightnment', 'Fielder_2', 'Fielder_3', 'Fielder_4', 'Fielder_5',
+                     'Fielder_6', 'Fielder_7', 'Fielder_8', 'Fielder_9', 'Pitch_Type', 'Pitch_Name', 'BB_Type',
+                     'Pitch_Result', 'Result_Event', 'Event_Description']
+WRK_TEXT_COLS = ['Batter_Pos', 'Batter_BOP', 'Gameday_Description', 'Event_ID']
+WRK_DATE_COLS = ['Game_Date']
+
+
+def type_raw_frame(df):
+    '''Converts a raw statcast pull to the pipeline's typed frame model.
+
+    ID, count and score columns become nullable Int32, the repeated text
+    columns become categoricals, and the measurement columns stay float64
+    with NaN for missing values. Missing values stay as NA/NaN throughout the
+    transformation and are only turned into SQL NULLs when the frame is
+    written (see db_loader.sql_frame()).
+
+    Args:
+        df(DataFrame): The data returned by pybaseball.statcast().
+
+    Returns:
+        DataFrame: The typed data. Columns not in the frame are skipped.
+
+    Raises:
+        No exceptions
+    '''
+    lst_int_cols = [c for c in RAW_INT_COLS if c in df.columns]
+    lst_category_cols = [c for c in RAW_CATEGORY_COLS if c in df.columns]
+
+    df = df.astype({c: 'float64' for c in lst_int_cols if df[c].dtype == object})
+
+    return df.astype({**{c: 'Int32' for c in lst_int_cols}, **{c: 'category' for c in lst_category_cols}})
+
+
+def type_wrk_frame(df):
+    '''Converts WRK data read back from the database or a Parquet export to
+    the dtypes transform_wrk() produces.
+
+    A database returns integer columns as floats when they hold a NULL, text
+    as plain strings, and a column that is NULL on every row as objects, so
+    the same table can come back with different dtypes from one read to the
+    next. After this the dtypes depend only on the column names; the free
+    text columns (WRK_TEXT_COLS) are left as they are. The cnt_* counts come
+    back as nullable Int32 rather than the int64 the transformation builds,
+    so a count column holding NULLs converts instead of raising.
+
+    Args:
+        df(DataFrame): WRK rows, any subset of the columns.
+
+    Returns:
+        DataFrame: The typed data.
+
+    Raises:
+        No exceptions
+    '''
+    dct_types = {}
+    for col in df.columns:
+        if col in WRK_INT_COLS:
+            dct_types[col] = 'Int32'
+        elif col in WRK_COUNT_COLS:
+            dct_types[col] = 'Int32'
+        elif col in WRK_CATEGORY_COLS:
+            dct_types[col] = 'category'
+        elif col in WRK_TEXT_COLS:
+            continue
+        elif col in WRK_DATE_COLS:
+            dct_types[col] = 'datetime64[us]'
+        else:
+            dct_types[col] = 'float64'
+
+    df = df.astype({col: 'float64' for col, dtype in dct_types.items()
+                    if dtype in ['Int32', 'float64'] and df[col].dtype == object})
+    df = df.astype({col: dtype for col, dtype in dct_types.items() if df[col].dtype != dtype})
+
+    return df
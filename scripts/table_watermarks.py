@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import logging
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import inspect, text
+
+
+WATERMARK_TABLE = 'table_watermarks'
+
+# The tables the pipeline bumps a watermark for on every write, as name
+# patterns without the _{year} suffix. A table added to the pipeline goes
+# here too, so cached queries over it are keyed on its watermark.
+WATERMARKED_TABLES = [r'(?:raw|wrk)_statcast',
+                      r'rollup_[a-z_]+',
+                      r'player_form(?:_state)?']
+
+
+def create_watermarks(engine):
+    '''Creates the watermark table if it does not exist.
+
+    The table holds one row per data table: the latest Game_Date loaded, the
+    total rows written, and a version that goes up on every write, so a cached
+    query result can tell whether a table changed since it was computed.
+
+    Args:
+        engine(Engine): The database engine.
+
+    Returns:
+        Does not return a parameter
+
+    Raises:
+        No exceptions
+    '''
+    if inspect(engine).has_table(WATERMARK_TABLE):
+        return
+
+    with engine.begin() as conn:
+        conn.execute(text(f'''CREATE TABLE {WATERMARK_TABLE} (
+                                  Table_Name VARCHAR(64) NOT NULL,
+                                  Max_Date VARCHAR(10),
+                                  Row_Count BIGINT,
+                                  Version INTEGER NOT NULL,
+                                  Updated_At VARCHAR(26))'''))
+
+
+def bump_watermark(engine, table, date=None, row_count=0):
+    '''Records a write to a table: the version goes up by one, the row count
+    by row_count, and the latest date moves to date if it is later.
+
+    A failure is logged rather than raised, so the bookkeeping never fails a
+    load; query results cached before it are then kept until they are
+    evicted or the table is written again.
+
+    Args:
+        engine(Engine): The database engine.
+        table(str): The table written.
+        date(str): The latest date written, formatted 'yyyy-mm-dd'.
+        row_count(int): Rows written.
+
+    Returns:
+        Does not return a parameter
+
+    Raises:
+        No exceptions
+    '''
+    dct_params = {'table': table,
+                  'date': date,
+                  'rows': int(row_count),
+                  'updated': datetime.now().isoformat(timespec='seconds')}
+    try:
+        create_watermarks(engine)
+        with engine.begin() as conn:
+            result = conn.execute(text(f'''UPDATE {WATERMARK_TABLE}
+                                           SET Version = Version + 1,
+                                               Row_Count = Row_Count + :rows,
+                                               Max_Date = CASE WHEN Max_Date IS NULL OR Max_Date < :date
+                                                               THEN :date ELSE Max_Date END,
+                                               Updated_At = :updated
+                                           WHERE Table_Name = :table'''), dct_params)
+            if result.rowcount == 0:
+                conn.execute(text(f'''INSERT INTO {WATERMARK_TABLE} (Table_Name, Max_Date, Row_Count, Version, Updated_At)
+                                      VALUES (:table, :date, :rows, 1, :updated)'''), dct_params)
+    except Exception as e:
+        logging.exception(f'{table}: Watermark not updated')
+
+
+def read_watermarks(engine, lst_tables):
+    '''Returns the watermark of each table, as a string that changes whenever
+    the table is written.
+
+    Tables with a row in the watermark table use its version. A table without
+    one (e.g. loaded before the watermark table existed) is scanned once for
+    its MAX(Game_Date) and COUNT(*), and a row is written from them, so later
+    calls read the row instead of scanning the table again. If the row
+    cannot be written, the scan is returned and repeated on the next call.
+
+    Args:
+        engine(Engine): The database engine.
+        lst_tables(list): The tables.
+
+    Returns:
+        dict: {table: watermark}, 'missing' for a table that does not exist.
+
+    Raises:
+        No exceptions
+    '''
+    inspector = inspect(engine)
+    dct_watermarks = {}
+    dct_scanned = {}
+    with engine.connect() as conn:
+        if inspector.has_table(WATERMARK_TABLE) and lst_tables:
+            df = pd.read_sql(text(f'SELECT Table_Name, Max_Date, Row_Count, Version FROM {WATERMARK_TABLE}'), conn)
+            df = df[df['Table_Name'].isin(lst_tables)]
+            df['Max_Date'] = df['Max_Date'].astype(object).where(df['Max_Date'].notna(), None)
+            dct_watermarks = {row.Table_Name: f'v{row.Version}|{row.Max_Date}|{row.Row_Count}'
+                              for row in df.itertuples(index=False)}
+
+        for table in lst_tables:
+            if table in dct_watermarks:
+                continue
+            if not inspector.has_table(table):
+                dct_watermarks[table] = 'missing'
+                continue
+            set_cols = {dct_col['name'] for dct_col in inspector.get_columns(table)}
+            max_date = 'MAX(Game_Date)' if 'Game_Date' in set_cols else 'NULL'
+            row = conn.execute(text(f'SELECT {max_date}, COUNT(*) FROM {table}')).one()
+            dct_scanned[table] = (None if row[0] is None else pd.Timestamp(row[0]).strftime('%Y-%m-%d'), row[1])
+
+    # Written once the read connection is closed, as SQLite does not let
+    # another connection commit while it holds its read lock.
+    for table, (date, row_count) in dct_scanned.items():
+        if _seed_watermark(engine, table, date, row_count):
+            dct_watermarks[table] = f'v1|{date}|{row_count}'
+        else:
+            dct_watermarks[table] = f'live|{date}|{row_count}'
+
+    return dct_watermarks
+
+
+def _seed_watermark(engine, table, date, row_count):
+    '''Writes the first watermark row of a table from its current contents.
+    Returns False, after logging, if it could not be written.'''
+    dct_params = {'table': table,
+                  'date': date,
+                  'rows': int(row_count),
+                  'updated': datetime.now().isoformat(timespec='seconds')}
+    try:
+        create_watermarks(engine)
+        with engine.begin() as conn:
+            conn.execute(text(f'''INSERT INTO {WATERMARK_TABLE} (Table_Name, Max_Date, Row_Count, Version, Updated_At)
+                                  VALUES (:table, :date, :rows, 1, :updated)'''), dct_params)
+    except Exception as e:
+        logging.exception(f'{table}: Watermark not recorded')
+        return False
+
+    return True
@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import sys
+
+import pytest
+
+# The pipeline modules are flat scripts run from scripts/, so the tests import
+# them the same way.
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+
+
+@pytest.fixture
+def bench_db(tmp_path):
+    '''A Statcast_DB writing to a SQLite database in tmp_path, whose fetches
+    return synthetic days of 4 games (see statcast_bench), so the pipeline
+    runs without the network. The game log lookup refresh of stream_data()
+    is switched off for the same reason.'''
+    from statcast_bench import make_bench_db, make_statcast_day
+
+    statcast_db = make_bench_db(str(tmp_path))
+    statcast_db.fetch_statcast = lambda start_dt, end_dt: make_statcast_day(start_dt, 4,
+                                                                            seed=int(start_dt.replace('-', '')))
+    statcast_db.stream_pos_bop_dct = lambda date, lst_batters=None: None
+
+    return statcast_db
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+from conftest import SCRIPTS_DIR
+
+
+# `statcast_cli.py --help` measured ~0.1s with lazy imports, against several
+# seconds when the pipeline is imported at startup. The budget leaves room for
+# slow machines while still failing if the pipeline is imported eagerly.
+STARTUP_BUDGET_SEC = 1.0
+
+# Modules only the subcommands may import.
+HEAVY_MODULES = ['pandas', 'numpy', 'sqlalchemy', 'pybaseball', 'tkinter']
+
+
+def test_help_starts_within_budget():
+    '''`python statcast_cli.py --help` starts within the budget, taking the
+    fastest of three runs so a busy machine does not fail it.'''
+    lst_times = []
+    for r in range(0, 3):
+        startTime = time.perf_counter()
+        result = subprocess.run([sys.executable, 'statcast_cli.py', '--help'], cwd=SCRIPTS_DIR,
+                                capture_output=True, text=True)
+        lst_times.append(time.perf_counter() - startTime)
+        assert result.returncode == 0, result.stderr
+        assert 'usage: statcast_cli' in result.stdout
+
+    assert min(lst_times) < STARTUP_BUDGET_SEC, f'--help took {min(lst_times):.2f}s'
+
+
+def test_parsing_does_not_import_pipeline():
+    '''Parsing a command line leaves pandas, SQLAlchemy, pybaseball and the
+    GUI unimported; only running the subcommand loads them.'''
+    code = ('import json, sys, statcast_cli\n'
+            'args = statcast_cli.build_parser().parse_args(["stream", "--start", "2019-06-01", "--end", "2019-06-03"])\n'
+            'statcast_cli._dates_from_args(args)\n'
+            f'print(json.dumps([name for name in {HEAVY_MODULES!r} if name in sys.modules]))\n')
+    result = subprocess.run([sys.executable, '-c', code], cwd=SCRIPTS_DIR, capture_output=True, text=True,
+                            env={**os.environ, 'PYTHONPATH': SCRIPTS_DIR})
+
+    assert result.returncode == 0, result.stderr
+    assert json.loads(result.stdout) == []
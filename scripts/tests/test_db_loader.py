@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import pandas as pd
+import pytest
+
+from sqlalchemy import inspect, text
+
+import db_loader
+from db_loader import create_db_engine, upsert_df
+from transform_registry import GAME_STATE_COLS
+
+
+NEW_WRK_COLS = GAME_STATE_COLS + ['cnt_RBI']
+
+
+def test_old_wrk_table_gets_new_columns(bench_db):
+    '''A WRK table built before the game state and cnt_RBI columns existed
+    takes a streamed date and a chunked load; the columns are added and are
+    NULL only for the rows loaded before them.'''
+    bench_db.stream_data('2019-06-01')
+    df_old = pd.read_sql('SELECT * FROM wrk_statcast_2019', bench_db.engine).drop(columns=NEW_WRK_COLS)
+    df_old.to_sql('wrk_statcast_2019', bench_db.engine, index=False, if_exists='replace')
+
+    bench_db.stream_data('2019-06-02')
+    bench_db.stream_range('2019-06-03', chunk_games=2)
+
+    set_cols = {dct_col['name'] for dct_col in inspect(bench_db.engine).get_columns('wrk_statcast_2019')}
+    assert set(NEW_WRK_COLS) <= set_cols
+    df = pd.read_sql('SELECT SUBSTR(Game_Date, 1, 10) AS d, COUNT(*) AS n, COUNT(Post_Outs) AS n_outs, '
+                     'COUNT(cnt_RBI) AS n_rbi FROM wrk_statcast_2019 GROUP BY d', bench_db.engine)
+    assert df['d'].tolist() == ['2019-06-01', '2019-06-02', '2019-06-03']
+    assert df['n_rbi'].tolist() == [0] + df['n'].tolist()[1:]
+    assert df['n_outs'].iloc[0] == 0 and (df['n_outs'].iloc[1:] > 0).all()
+
+
+def sqlite_tables(engine, prefix):
+    '''Names of the tables that start with prefix.'''
+    with engine.connect() as conn:
+        return [row[0] for row in conn.execute(text('SELECT name FROM sqlite_master WHERE type = :t AND name LIKE :p'),
+                                               {'t': 'table', 'p': f'{prefix}%'})]
+
+
+def test_upsert_is_repeatable(tmp_path, monkeypatch):
+    '''Upserting the same frame twice, and again after a partial overlap,
+    leaves one row per key with the latest values, and no staging table.'''
+    engine = create_db_engine('sqlite', {'database': f'{tmp_path}/upsert.db'})
+    lst_keys = ['game_pk', 'at_bat_number', 'pitch_number']
+    df = pd.DataFrame({'game_pk': [1, 1, 1, 2, 2], 'at_bat_number': [1, 1, 2, 1, 1], 'pitch_number': [1, 2, 1, 1, 2],
+                       'release_speed': [95.1, 88.0, 91.3, 84.2, 97.7], 'events': [None, 'single', 'walk', None, 'field_out']})
+
+    assert upsert_df(df, 'raw_statcast_2019', engine, lst_keys) == 0
+    assert upsert_df(df, 'raw_statcast_2019', engine, lst_keys) == len(df)
+
+    def read():
+        return pd.read_sql('SELECT * FROM raw_statcast_2019 ORDER BY game_pk, at_bat_number, pitch_number', engine)
+
+    pd.testing.assert_frame_equal(read(), df)
+
+    df_overlap = pd.DataFrame({'game_pk': [2, 2, 3], 'at_bat_number': [1, 1, 1], 'pitch_number': [2, 3, 1],
+                               'release_speed': [98.0, 90.5, 93.3], 'events': ['double', None, 'strikeout']})
+    assert upsert_df(df_overlap, 'raw_statcast_2019', engine, lst_keys) == 1
+    df_expected = pd.concat([df.iloc[:4], df_overlap], ignore_index=True)
+    pd.testing.assert_frame_equal(read(), df_expected)
+
+    assert upsert_df(df_overlap, 'raw_statcast_2019', engine, lst_keys) == len(df_overlap)
+    pd.testing.assert_frame_equal(read(), df_expected)
+    assert sqlite_tables(engine, 'stg_') == []
+
+    # A failure after the staging load leaves the table as it was.
+    monkeypatch.setattr(db_loader, 'upsert_sql', lambda *args: ['DELETE FROM no_such_table', 'SELECT 1'])
+    with pytest.raises(Exception):
+        upsert_df(df_overlap, 'raw_statcast_2019', engine, lst_keys)
+    pd.testing.assert_frame_equal(read(), df_expected)
+    assert sqlite_tables(engine, 'stg_') == []
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from feature_matrix import ARRAYS, FeatureMatrix, _npy_offset
+
+
+LST_FEATURES = ['Game_Date', 'Bat_Team', 'Batter_Pos', 'Release_Speed']
+LST_LABELS = ['cnt_Hit', 'cnt_RBI']
+
+
+def make_wrk(date, game_id, lst_teams, lst_pos):
+    '''WRK-like rows of one game, one pitch per team and position.'''
+    rows = len(lst_teams)
+
+    return pd.DataFrame({'Game_Date': [date] * rows,
+                         'Game_ID': [game_id] * rows,
+                         'PA_Num': np.arange(1, rows + 1),
+                         'Pitch_Num': [1] * rows,
+                         'Bat_Team': lst_teams,
+                         'Batter_Pos': lst_pos,
+                         'Release_Speed': np.linspace(85.0, 99.0, rows),
+                         'cnt_Hit': np.arange(rows) % 2,
+                         'cnt_RBI': np.arange(rows) % 3})
+
+
+def compact_header(path):
+    '''Rewrites an array file with the header older numpy versions wrote:
+    padded to 16 bytes (numpy < 1.14), without room for the row count to grow.'''
+    arr = np.load(path)
+    dct_header = {'descr': np.lib.format.dtype_to_descr(arr.dtype), 'fortran_order': False, 'shape': arr.shape}
+    header = repr(dct_header)[:-1] + ', }'
+    header += ' ' * (-(len(header) + 11) % 16) + '\n'
+    with open(path, 'wb') as f:
+        f.write(b'\x93NUMPY\x01\x00' + len(header).to_bytes(2, 'little') + header.encode('latin1'))
+        f.write(arr.tobytes())
+
+    return len(header) + 10
+
+
+def assert_matrix(matrix, df_wrk):
+    '''The files, read by np.load() and by load(), hold df_wrk encoded with
+    the matrix's code tables.'''
+    dct_expected = matrix.encode(df_wrk)
+    for name, arr in zip(ARRAYS, matrix.load()):
+        np.testing.assert_array_equal(np.load(matrix.array_path(name)), dct_expected[name])
+        np.testing.assert_array_equal(arr, dct_expected[name])
+    assert matrix.rows == len(df_wrk)
+
+
+def test_appends_across_header_growth_then_truncate(tmp_path):
+    '''Batches appended to a matrix, one of them to files whose header has
+    to grow, read back with np.load(); codes given out stay the same and a
+    truncated date is cut off and can be appended again.'''
+    path = str(tmp_path / 'matrix')
+    matrix = FeatureMatrix(path)
+    matrix.create(LST_FEATURES, LST_LABELS)
+    with pytest.raises(ValueError):
+        FeatureMatrix(path).create(LST_FEATURES, LST_LABELS)
+
+    df_1 = make_wrk('2019-06-01', 1, ['SF', 'LAD', 'SF'], ['C', '1B', 'DH'])
+    df_2 = make_wrk('2019-06-02', 2, ['ATL', 'LAD', 'NYM', 'ATL'], ['SS', 'C', 'CF', '2B'])
+    df_3 = make_wrk('2019-06-02', 3, ['BOS', 'SF'], ['1B', 'RF'])
+    df_4 = make_wrk('2019-06-03', 4, ['AAA', 'SF', 'ZZZ'], ['P', 'C', 'LF'])
+
+    assert matrix.append(df_1) == 3
+    assert matrix.dct_codes['Bat_Team'] == ['LAD', 'SF']
+    assert matrix.append(df_2) == 4
+    assert matrix.dct_codes['Bat_Team'] == ['LAD', 'SF', 'ATL', 'NYM']
+
+    # Files written by an older numpy have a smaller header; the next append
+    # moves the rows behind the larger header.
+    dct_offsets = {name: compact_header(matrix.array_path(name)) for name in ARRAYS}
+    assert all(_npy_offset(matrix.array_path(name))[1] == offset for name, offset in dct_offsets.items())
+    assert matrix.append(df_3) == 2
+    assert all(_npy_offset(matrix.array_path(name))[1] > offset for name, offset in dct_offsets.items())
+    assert not list(tmp_path.glob('matrix/*.tmp'))
+
+    assert matrix.append(df_4) == 3
+    assert matrix.dct_codes['Bat_Team'] == ['LAD', 'SF', 'ATL', 'NYM', 'BOS', 'AAA', 'ZZZ']
+    df_all = pd.concat([df_1, df_2, df_3, df_4], ignore_index=True)
+    assert_matrix(matrix, df_all)
+    assert matrix.date_rows('2019-06-02') == slice(3, 9)
+    with pytest.raises(ValueError):
+        matrix.append(df_1)
+
+    # Reopened, the matrix has the same rows and code tables.
+    matrix = FeatureMatrix(path)
+    assert matrix.dct_codes['Bat_Team'] == ['LAD', 'SF', 'ATL', 'NYM', 'BOS', 'AAA', 'ZZZ']
+    assert_matrix(matrix, df_all)
+
+    assert matrix.truncate('2019-06-02') == 9
+    assert matrix.truncate('2019-06-05') == 0
+    assert matrix.date_rows('2019-06-02') is None and matrix.last_date == '2019-06-01'
+    assert_matrix(matrix, df_1)
+
+    assert matrix.append(pd.concat([df_2, df_3], ignore_index=True)) == 6
+    assert matrix.date_rows('2019-06-02') == slice(3, 9)
+    assert_matrix(FeatureMatrix(path), pd.concat([df_1, df_2, df_3], ignore_index=True))
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import numpy as np
+import pandas as pd
+
+from mlb_statcast import Statcast_DB
+
+
+NA = pd.NA
+
+# Two games, pitch by pitch, with the state after each pitch worked out by
+# hand. Game 1: a wild pitch scores a run in the middle of a plate appearance
+# (no RBI), the half inning changes after the third out, and the home team
+# walks off on a sacrifice fly, leaving one more out and an unknown base
+# state. Game 2 ends on a top-half out.
+STATE_COLS = ['Game_ID', 'PA_Num', 'Pitch_Num', 'Inning', 'Inning_TopBot', 'Home_Score', 'Away_Score', 'Bat_Score',
+              'Outs_When_Up', 'On_1b', 'On_2b', 'On_3b', 'Result_Event', 'Gameday_Description']
+EXPECTED_COLS = ['Post_Bat_Score', 'Post_Fld_Score', 'Post_Outs', 'Post_Base_State', 'cnt_RBI']
+LST_PITCHES = [
+    ((1, 1, 1, 1, 'Top', 0, 0, 0, 0, NA, NA, NA, None, None), (0, 0, 0, 0, 0)),
+    ((1, 1, 2, 1, 'Top', 0, 0, 0, 0, NA, NA, NA, 'triple', 'A triples on a line drive.'), (0, 0, 0, 4, 0)),
+    ((1, 2, 1, 1, 'Top', 0, 0, 0, 0, NA, NA, 101, None, None), (1, 0, 0, 0, 0)),
+    ((1, 2, 2, 1, 'Top', 0, 1, 1, 0, NA, NA, NA, 'strikeout', 'B strikes out swinging.'), (1, 0, 1, 0, 0)),
+    ((1, 3, 1, 1, 'Top', 0, 1, 1, 1, NA, NA, NA, 'field_out', 'C flies out.'), (1, 0, 2, 0, 0)),
+    ((1, 4, 1, 1, 'Top', 0, 1, 1, 2, NA, NA, NA, 'field_out', 'D grounds out.'), (1, 0, 3, 0, 0)),
+    ((1, 5, 1, 1, 'Bot', 0, 1, 0, 0, NA, NA, NA, 'home_run', 'E homers (1) on a fly ball.'), (1, 1, 0, 0, 1)),
+    ((1, 6, 1, 1, 'Bot', 1, 1, 1, 0, NA, NA, NA, 'double', 'F doubles on a line drive.'), (1, 1, 0, 2, 0)),
+    ((1, 7, 1, 1, 'Bot', 1, 1, 1, 0, NA, 102, NA, 'field_out', 'G grounds out. 102 to 3rd.'), (1, 1, 1, 4, 0)),
+    ((1, 8, 1, 1, 'Bot', 1, 1, 1, 1, NA, NA, 102, None, None), (1, 1, 1, 4, 0)),
+    ((1, 8, 2, 1, 'Bot', 1, 1, 1, 1, NA, NA, 102, 'sac_fly', 'H out on a sacrifice fly. 102 scores.'), (2, 1, 2, NA, 1)),
+    ((2, 1, 1, 1, 'Top', 0, 0, 0, 0, NA, NA, NA, 'field_out', 'I lines out.'), (0, 0, 3, 0, 0)),
+]
+
+
+def test_game_state_and_rbi_follow_the_game():
+    '''Post_* and cnt_RBI match the hand-worked state of each pitch, with the
+    pitches given out of order.'''
+    df = pd.DataFrame([state for state, expected in LST_PITCHES], columns=STATE_COLS)
+    for col in ['On_1b', 'On_2b', 'On_3b']:
+        df[col] = df[col].astype('Int32')
+    df['Balls'] = 0
+    df['Row'] = range(0, len(df))
+
+    statcast_db = Statcast_DB.__new__(Statcast_DB)
+    statcast_db.df = df.sample(frac=1, random_state=7).reset_index(drop=True)
+    statcast_db.add_game_state()
+    statcast_db.add_cnt_rbi()
+
+    df_actual = statcast_db.df.sort_values('Row')[EXPECTED_COLS].astype('Float64').reset_index(drop=True)
+    df_expected = pd.DataFrame([expected for state, expected in LST_PITCHES], columns=EXPECTED_COLS).astype('Float64')
+    pd.testing.assert_frame_equal(df_actual, df_expected, check_dtype=False)
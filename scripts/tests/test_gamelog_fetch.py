@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import collections
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from gamelog_fetch import GamelogFetcher, parse_last_game
+
+
+PAGE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'gamelog_troutmi01_2019.html')
+
+
+class GamelogHandler(BaseHTTPRequestHandler):
+    '''Serves the recorded game log page. IDs starting with 'flaky' get a 503
+    on their first two requests, IDs starting with 'missing' always get a 404.'''
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        brefid = parse_qs(urlsplit(self.path).query)['id'][0]
+        with self.server.lock:
+            self.server.dct_hits[brefid].append(time.monotonic())
+            hits = len(self.server.dct_hits[brefid])
+        if brefid.startswith('flaky') and hits <= 2:
+            self.send_response(503)
+            self.end_headers()
+            return
+        if brefid.startswith('missing'):
+            self.send_response(404)
+            self.end_headers()
+            return
+        with open(PAGE_PATH, 'rb') as f:
+            body = f.read()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    srv = ThreadingHTTPServer(('127.0.0.1', 0), GamelogHandler)
+    srv.lock = threading.Lock()
+    srv.dct_hits = collections.defaultdict(list)
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def make_fetcher(server, backoff=0.05):
+    return GamelogFetcher(concurrency=4, requests_per_minute=None, retries=3, backoff=backoff, timeout=5,
+                          url_template=f'http://127.0.0.1:{server.server_port}/players/gl.fcgi?id={{brefid}}&t=b&year={{year}}')
+
+
+def test_retries_503_with_backoff(server):
+    '''A 503 is retried, each wait at least twice as long as the last, and
+    the page is returned once the server recovers.'''
+    fetcher = make_fetcher(server, backoff=0.05)
+    dct_pages = dict(fetcher.iter_gamelogs(['flaky01'], '2019'))
+
+    lst_times = server.dct_hits['flaky01']
+    lst_gaps = [b - a for a, b in zip(lst_times, lst_times[1:])]
+    assert dct_pages['flaky01'] is not None
+    assert len(lst_times) == 3
+    assert fetcher.retry_count == 2
+    assert lst_gaps[0] >= 0.05
+    assert lst_gaps[1] >= 0.1
+
+
+def test_404_is_not_retried(server):
+    '''A 404 gives no page after a single request.'''
+    fetcher = make_fetcher(server, backoff=0.05)
+    dct_pages = dict(fetcher.iter_gamelogs(['missing01', 'troutmi01'], '2019'))
+
+    assert dct_pages['missing01'] is None
+    assert len(server.dct_hits['missing01']) == 1
+    assert fetcher.retry_count == 0
+    assert dct_pages['troutmi01'] is not None
+
+
+def test_parse_last_game_from_served_page(server):
+    '''The served page parses to the player's last game: the second game of
+    the Apr 1 doubleheader, batting 2nd in CF.'''
+    fetcher = make_fetcher(server)
+    dct_pages = dict(fetcher.iter_gamelogs(['troutmi01'], '2019'))
+
+    df = parse_last_game(dct_pages['troutmi01'], '2019')
+    assert len(df) == 1
+    assert df.loc[0, ['Date', 'BOP', 'Pos']].astype(str).tolist() == ['2019-04-01', '2', 'CF']
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import pandas as pd
+import pytest
+
+import mlb_statcast
+
+from ingest_manifest import (delete_date_rows, plan_dates, read_manifest, STATUS_COMPLETE, STATUS_EMPTY, STATUS_FAILED,
+                             STATUS_STARTED)
+
+
+DATES = ['2019-06-01', '2019-06-02']
+
+
+def date_counts(statcast_db, table, date_col):
+    '''Rows per date in a table, as {'yyyy-mm-dd': count}.'''
+    df = pd.read_sql(f'SELECT SUBSTR({date_col}, 1, 10) AS d, COUNT(*) AS n FROM {table} GROUP BY d',
+                     statcast_db.engine)
+
+    return dict(zip(df['d'], df['n']))
+
+
+def fail_step(statcast_db, name, date):
+    '''Makes the transformation step name raise on the RAW data of date.'''
+    method = getattr(statcast_db, name)
+
+    def step(*args):
+        if str(statcast_db.df.iloc[0].get('game_date', statcast_db.df.iloc[0].get('Game_Date')))[:10] == date:
+            raise RuntimeError(f'{name} failed')
+        return method(*args)
+
+    step.__name__ = name
+    setattr(statcast_db, name, step)
+
+
+@pytest.mark.parametrize('step', ['rename_columns', 'add_yahoo_pnts'])
+def test_build_marks_failed_transform_instead_of_loading_it(bench_db, step):
+    '''A date whose transformation fails, early (the frame still has the RAW
+    columns) or on the last step, is not written to the WRK table; the WRK
+    entry is marked failed and a resumed build loads it.'''
+    fail_step(bench_db, step, '2019-06-02')
+    bench_db.build_db(workers=1, lst_dates=DATES, interactive=False)
+
+    dct_manifest = read_manifest(bench_db.engine)
+    assert dct_manifest[('2019-06-02', 'raw_statcast_2019')] == STATUS_COMPLETE
+    assert dct_manifest[('2019-06-02', 'wrk_statcast_2019')] == STATUS_FAILED
+    assert set(date_counts(bench_db, 'wrk_statcast_2019', 'Game_Date')) == {'2019-06-01'}
+
+    delattr(bench_db, step)
+    bench_db.build_db(workers=1, lst_dates=DATES, resume=True, interactive=False)
+
+    assert date_counts(bench_db, 'wrk_statcast_2019', 'Game_Date') == date_counts(bench_db, 'raw_statcast_2019',
+                                                                                  'game_date')
+    assert set(read_manifest(bench_db.engine).values()) == {STATUS_COMPLETE}
+
+
+def test_chunked_resume_keeps_complete_raw(bench_db, monkeypatch):
+    '''A date whose WRK write fails on its second chunk is marked failed for
+    WRK only, with the rest of its chunks skipped; resuming reloads its WRK
+    rows from the RAW chunks without deleting or writing the complete RAW
+    rows again.'''
+    insert_df = mlb_statcast.insert_df
+    lst_inserts = []
+    dct_fail = {'wrk': True}
+
+    def count_inserts(df, table, *args):
+        lst_inserts.append(table)
+        if table.startswith('wrk') and dct_fail['wrk'] and lst_inserts.count(table) == 2:
+            raise RuntimeError('insert failed')
+        return insert_df(df, table, *args)
+    monkeypatch.setattr(mlb_statcast, 'insert_df', count_inserts)
+
+    bench_db.stream_range('2019-06-01', chunk_games=1)
+    dct_manifest = read_manifest(bench_db.engine)
+    assert dct_manifest[('2019-06-01', 'raw_statcast_2019')] == STATUS_COMPLETE
+    assert dct_manifest[('2019-06-01', 'wrk_statcast_2019')] == STATUS_FAILED
+    assert lst_inserts.count('raw_statcast_2019') == 4 and lst_inserts.count('wrk_statcast_2019') == 2
+    dct_raw = date_counts(bench_db, 'raw_statcast_2019', 'game_date')
+
+    dct_fail['wrk'] = False
+    lst_inserts.clear()
+    bench_db.stream_range('2019-06-01', chunk_games=1, resume=True)
+
+    assert lst_inserts == ['wrk_statcast_2019'] * 4
+    assert date_counts(bench_db, 'raw_statcast_2019', 'game_date') == dct_raw
+    assert date_counts(bench_db, 'wrk_statcast_2019', 'Game_Date') == dct_raw
+    assert set(read_manifest(bench_db.engine).values()) == {STATUS_COMPLETE}
+
+
+def test_plan_dates():
+    '''Loaded and empty dates are skipped, unfinished ones are retried only
+    when resuming, and refresh loads every date with its entries reset to
+    started, so the writers delete its rows first.'''
+    dct_manifest = {('2019-06-01', 'raw_statcast_2019'): STATUS_COMPLETE,
+                    ('2019-06-01', 'wrk_statcast_2019'): STATUS_COMPLETE,
+                    ('2019-06-02', 'raw_statcast_2019'): STATUS_EMPTY,
+                    ('2019-06-02', 'wrk_statcast_2019'): STATUS_EMPTY,
+                    ('2019-06-03', 'raw_statcast_2019'): STATUS_COMPLETE,
+                    ('2019-06-03', 'wrk_statcast_2019'): STATUS_FAILED,
+                    ('2019-06-04', 'raw_statcast_2019'): STATUS_STARTED}
+    lst_dates = ['2019-06-01', '2019-06-02', '2019-06-03', '2019-06-04', '2019-06-05']
+
+    assert plan_dates(dict(dct_manifest), lst_dates) == (['2019-06-05'], {'done': lst_dates[:2],
+                                                                          'unfinished': lst_dates[2:4]})
+    assert plan_dates(dict(dct_manifest), lst_dates, resume=True) == (lst_dates[2:], {'done': lst_dates[:2],
+                                                                                      'unfinished': []})
+
+    dct_refresh = dict(dct_manifest)
+    assert plan_dates(dct_refresh, lst_dates, refresh=True) == (lst_dates, {'done': [], 'unfinished': []})
+    assert dct_refresh == {key: STATUS_STARTED for key in dct_manifest}
+
+
+def test_reruns_skip_retry_and_refresh(bench_db, monkeypatch):
+    '''Against the database: a rerun skips loaded dates and adds no rows, a
+    failed date is retried only with resume, and refresh deletes a loaded
+    date's rows before loading it again.'''
+    fetch_statcast = bench_db.fetch_statcast
+    lst_fetched = []
+    dct_fail = {'2019-06-02': True}
+
+    def fetch(start_dt, end_dt):
+        lst_fetched.append(start_dt)
+        if dct_fail.get(start_dt):
+            raise IOError('fetch failed')
+        return fetch_statcast(start_dt, end_dt)
+    bench_db.fetch_statcast = fetch
+
+    bench_db.stream_range(*DATES)
+    assert read_manifest(bench_db.engine)[('2019-06-02', 'raw_statcast_2019')] == STATUS_FAILED
+    dct_counts = date_counts(bench_db, 'raw_statcast_2019', 'game_date')
+    assert list(dct_counts) == ['2019-06-01']
+
+    lst_fetched.clear()
+    bench_db.stream_range(*DATES)
+    assert lst_fetched == []
+    assert date_counts(bench_db, 'raw_statcast_2019', 'game_date') == dct_counts
+
+    dct_fail.clear()
+    bench_db.stream_range(*DATES, resume=True)
+    assert lst_fetched == ['2019-06-02']
+    dct_counts = date_counts(bench_db, 'raw_statcast_2019', 'game_date')
+    assert list(dct_counts) == DATES
+    assert date_counts(bench_db, 'wrk_statcast_2019', 'Game_Date') == dct_counts
+
+    lst_deleted = []
+    monkeypatch.setattr(mlb_statcast, 'delete_date_rows',
+                        lambda engine, table, date_col, date: lst_deleted.append((table, date))
+                        or delete_date_rows(engine, table, date_col, date))
+    bench_db.stream_range(*DATES, refresh=True)
+    assert sorted(lst_deleted) == [(f'{kind}_statcast_2019', date) for kind in ['raw', 'wrk'] for date in DATES]
+    assert date_counts(bench_db, 'raw_statcast_2019', 'game_date') == dct_counts
+    assert date_counts(bench_db, 'wrk_statcast_2019', 'Game_Date') == dct_counts
+    assert set(read_manifest(bench_db.engine).values()) == {STATUS_COMPLETE}
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+
+import pandas as pd
+import pytest
+import ujson
+
+from lookup_store import LookupStore, compile_lookup_store
+from mlb_statcast import Statcast_DB
+
+
+# Per-season dictionaries as scraped: a player in a season with and without
+# an entry for a date, a player only in the other season and a sprint speed
+# that is missing.
+DCT_DICTS = {
+    'pos': {2019: {'Aaron Able': {'2019-06-01': 'C', '2019-06-02': '1B'},
+                   'Ben Baker': {'2019-06-01': 'SS'}},
+            2020: {'Aaron Able': {'2020-07-24': 'DH'},
+                   'Carl Cole': {'2020-07-24': 'CF', '2020-07-25': 'LF'}}},
+    'bop': {2019: {'Aaron Able': {'2019-06-01': 4, '2019-06-02': 2},
+                   'Ben Baker': {'2019-06-01': 9}},
+            2020: {'Aaron Able': {'2020-07-24': 1},
+                   'Carl Cole': {'2020-07-24': 7, '2020-07-25': 3}}},
+    'ss': {2019: {'Aaron Able': 27.5, 'Ben Baker': None},
+           2020: {'Aaron Able': 27.1, 'Carl Cole': 29.8}},
+}
+
+DCT_ROWS = {
+    2019: [('Aaron Able', '2019-06-01'), ('Aaron Able', '2019-06-02'), ('Aaron Able', '2019-06-03'),
+           ('Ben Baker', '2019-06-01'), ('Ben Baker', '2019-06-02'), ('Carl Cole', '2019-06-01'),
+           ('Dan Dunn', '2019-06-02')],
+    2020: [('Carl Cole', '2020-07-25'), ('Aaron Able', '2020-07-24'), ('Ben Baker', '2020-07-24'),
+           ('Carl Cole', '2020-07-26'), ('Aaron Able', '2020-07-25')],
+}
+
+
+def write_dicts(parent_path):
+    '''Writes DCT_DICTS the way the scrapers save them.'''
+    os.makedirs(f'{parent_path}/dicts')
+    for kind, dct_years in DCT_DICTS.items():
+        for year, dct in dct_years.items():
+            ujson.dump(dct, open(f'{parent_path}/dicts/dct_{kind}_{year}.txt', 'w'))
+
+
+def add_lookups(year, dct_lookups, lookup_store):
+    '''Runs add_batter_pos/bop/ss on a season's rows, with the dictionaries
+    or, where they are None, with the store.'''
+    statcast_db = Statcast_DB.__new__(Statcast_DB)
+    statcast_db.df = pd.DataFrame(DCT_ROWS[year], columns=['Batter_Name', 'Game_Date'])
+    statcast_db.df['Batter_Name'] = statcast_db.df['Batter_Name'].astype('category')
+    statcast_db.df['Game_Date'] = pd.to_datetime(statcast_db.df['Game_Date'])
+    statcast_db.df['Game_Year'] = year
+    statcast_db.df['Home_Team'] = 'SF'
+    statcast_db.dct_pos, statcast_db.dct_bop, statcast_db.dct_ss = dct_lookups
+    statcast_db.lookup_store = lookup_store
+    statcast_db.add_batter_pos()
+    statcast_db.add_batter_bop()
+    statcast_db.add_batter_ss()
+
+    return statcast_db.df
+
+
+@pytest.mark.parametrize('year', [2019, 2020])
+def test_store_matches_dict_lookups(tmp_path, year):
+    '''A store compiled from every season returns the values the season's
+    dictionaries give: the value of a date, None for a date the player has
+    no entry for, and the missing player defaults.'''
+    parent_path = str(tmp_path)
+    write_dicts(parent_path)
+    lookup_store = LookupStore(compile_lookup_store(parent_path))
+
+    df_dicts = add_lookups(year, [DCT_DICTS[kind][year] for kind in ['pos', 'bop', 'ss']], None)
+    df_store = add_lookups(year, [None, None, None], lookup_store)
+
+    for col in ['Batter_Pos', 'Batter_BOP', 'Batter_Sprint']:
+        pd.testing.assert_series_equal(df_store[col], df_dicts[col])
+    assert df_dicts['Batter_Pos'].isna().any() and (df_dicts['Batter_Pos'] == 'P').any()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import pandas as pd
+
+from sqlalchemy import text
+
+import db_loader
+from ingest_manifest import read_manifest, STATUS_COMPLETE, STATUS_FAILED
+from player_form import FORM_KEYS, form_table, rebuild_form, state_table
+
+
+def read_table(engine, table):
+    '''A form or state table in key order, with dates as 'yyyy-mm-dd'.'''
+    df = pd.read_sql(text(f'SELECT * FROM {table}'), engine)
+    df['Game_Date'] = pd.to_datetime(df['Game_Date']).dt.strftime('%Y-%m-%d')
+    lst_keys = FORM_KEYS + [col for col in ['PA_Num'] if col in df.columns]
+
+    return df.sort_values(lst_keys).reset_index(drop=True)
+
+
+def assert_form_rebuilds_the_same(engine):
+    '''The stored form and state equal those rebuild_form() computes from
+    the WRK table.'''
+    dct_updated = {table: read_table(engine, table) for table in [form_table(2019), state_table(2019)]}
+    rebuild_form(engine, 2019)
+    for table, df_updated in dct_updated.items():
+        df_rebuilt = read_table(engine, table)
+        pd.testing.assert_frame_equal(df_updated[df_rebuilt.columns], df_rebuilt, check_dtype=False)
+
+
+def test_incremental_form_equals_rebuild(bench_db):
+    '''Form updated by chunked loads and a repeated date equals the season
+    rebuilt in one pass.'''
+    bench_db.stream_range('2019-06-01', '2019-06-02', chunk_games=1)
+    bench_db.stream_data('2019-06-03')
+    bench_db.stream_data('2019-06-03')
+
+    assert len(read_table(bench_db.engine, form_table(2019)))
+    assert_form_rebuilds_the_same(bench_db.engine)
+
+
+def test_failed_form_update_rebuilds_next_time(bench_db, monkeypatch):
+    '''A form update whose state insert fails leaves the form and state as
+    they were and marks the date failed; the next update rebuilds the
+    season, so its windows include the failed date.'''
+    bench_db.stream_data('2019-06-01')
+    dct_before = {table: read_table(bench_db.engine, table) for table in [form_table(2019), state_table(2019)]}
+
+    insert_df = db_loader.insert_df
+
+    def fail_state(df, table, *args):
+        if table.startswith(f'stg_{state_table(2019)}'):
+            raise RuntimeError('insert failed')
+        return insert_df(df, table, *args)
+    monkeypatch.setattr(db_loader, 'insert_df', fail_state)
+    bench_db.stream_data('2019-06-02')
+    monkeypatch.undo()
+
+    for table, df_before in dct_before.items():
+        pd.testing.assert_frame_equal(read_table(bench_db.engine, table), df_before)
+    assert read_manifest(bench_db.engine)[('2019-06-02', form_table(2019))] == STATUS_FAILED
+
+    bench_db.stream_data('2019-06-03')
+
+    assert read_manifest(bench_db.engine)[('2019-06-02', form_table(2019))] == STATUS_COMPLETE
+    assert set(read_table(bench_db.engine, form_table(2019))['Game_Date']) == {'2019-06-01', '2019-06-02',
+                                                                                '2019-06-03'}
+    assert_form_rebuilds_the_same(bench_db.engine)
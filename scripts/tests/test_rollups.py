@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import pandas as pd
+import pytest
+
+from sqlalchemy import text
+
+import db_loader
+import rollups
+from rollups import (ROLLUPS, _key_frame, aggregate_rollup, check_rollup, rebuild_rollup, rollup_table,
+                     update_rollups)
+
+
+def read_rollup(engine, name):
+    '''A rollup of 2019 in key order, with the keys normalized.'''
+    df = _key_frame(pd.read_sql(text(f'SELECT * FROM {rollup_table(name, 2019)}'), engine))
+
+    return df.sort_values(ROLLUPS[name]['keys']).reset_index(drop=True)
+
+
+def test_rollups_match_rebuild_after_chunked_and_repeated_loads(bench_db):
+    '''Rollups kept up to date by chunked loads, a streamed date and a
+    repeat of each agree with check_rollup() and with rebuild_rollup().'''
+    bench_db.stream_range('2019-06-01', '2019-06-02', chunk_games=1)
+    bench_db.stream_data('2019-06-03')
+    bench_db.stream_range('2019-06-02', chunk_games=3, refresh=True)
+    bench_db.stream_data('2019-06-03')
+
+    for name in ROLLUPS:
+        assert check_rollup(bench_db.engine, name, 2019).empty
+        df_updated = read_rollup(bench_db.engine, name)
+        rebuild_rollup(bench_db.engine, name, 2019)
+        df_rebuilt = read_rollup(bench_db.engine, name)
+        pd.testing.assert_frame_equal(df_rebuilt, df_updated[df_rebuilt.columns], check_dtype=False)
+
+    assert update_rollups(bench_db.engine, pd.read_sql('SELECT * FROM wrk_statcast_2019 LIMIT 0', bench_db.engine),
+                          2019) == {}
+
+
+def test_failed_rollup_update_keeps_the_games(bench_db, monkeypatch):
+    '''If the insert of an update fails after its delete ran, the rollup
+    still holds the games it had and no staging table is left.'''
+    bench_db.stream_data('2019-06-01')
+    df_before = read_rollup(bench_db.engine, 'player_game')
+    df_wrk = pd.read_sql('SELECT * FROM wrk_statcast_2019', bench_db.engine)
+
+    # The rollup gains a column the table lacks and is not given, so the
+    # INSERT fails after the DELETE of the same transaction ran.
+    monkeypatch.setattr(db_loader, 'add_missing_columns', lambda *args: [])
+    monkeypatch.setattr(rollups, 'aggregate_rollup',
+                        lambda df, name: aggregate_rollup(df, name).assign(Not_A_Column=1))
+    with pytest.raises(Exception):
+        update_rollups(bench_db.engine, df_wrk, 2019)
+
+    pd.testing.assert_frame_equal(read_rollup(bench_db.engine, 'player_game'), df_before)
+    assert check_rollup(bench_db.engine, 'player_game', 2019).empty
+    with bench_db.engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM sqlite_master WHERE name LIKE 'stg_%'")).scalar() == 0
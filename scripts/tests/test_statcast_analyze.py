@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import yaml
+
+from statcast_analyze import Statcast_Analyze, normalize_sql
+from table_watermarks import read_watermarks
+
+
+SQL_COUNT = 'SELECT Game_Date, COUNT(*) AS n FROM wrk_statcast_2019 GROUP BY Game_Date ORDER BY Game_Date'
+
+
+def make_analyzer(tmp_path, engine):
+    '''A Statcast_Analyze on the engine, caching in tmp_path.'''
+    config_path = str(tmp_path / 'analyze.yaml')
+    with open(config_path, 'w') as yamlfile:
+        yaml.dump([{'Paths': {'parent_path': str(tmp_path)}},
+                   {'Analyze': {'cache_path': str(tmp_path / 'cache' / 'queries')}}], yamlfile)
+
+    return Statcast_Analyze(config_path, engine=engine)
+
+
+def test_write_invalidates_cached_reads(bench_db, tmp_path, monkeypatch):
+    '''A repeated read_wrk() or query() is served from the cache until a
+    load writes the table; the load moves the table's watermark, so the
+    next call reads the new rows.'''
+    bench_db.stream_data('2019-06-01')
+    analyzer = make_analyzer(tmp_path, bench_db.engine)
+    lst_reads = []
+    iter_wrk = analyzer.iter_wrk
+    monkeypatch.setattr(analyzer, 'iter_wrk', lambda *args: lst_reads.append(args) or iter_wrk(*args))
+
+    lst_columns = ['Game_Date', 'Game_ID', 'PA_Num', 'Pitch_Num']
+    df_1 = analyzer.read_wrk(lst_columns)
+    df_count_1 = analyzer.query(SQL_COUNT)
+    key = analyzer.cache_key('sql', {'sql': normalize_sql(SQL_COUNT), 'params': {}}, ['wrk_statcast_2019'])
+    watermark = read_watermarks(bench_db.engine, ['wrk_statcast_2019'])['wrk_statcast_2019']
+    assert analyzer.read_wrk(lst_columns).equals(df_1) and len(lst_reads) == 1
+    assert analyzer.cache.get(key) is not None
+    assert list(df_count_1['n']) == [len(df_1)]
+
+    bench_db.stream_data('2019-06-02')
+    assert read_watermarks(bench_db.engine, ['wrk_statcast_2019'])['wrk_statcast_2019'] != watermark
+    assert analyzer.cache_key('sql', {'sql': normalize_sql(SQL_COUNT), 'params': {}}, ['wrk_statcast_2019']) != key
+    df_2 = analyzer.read_wrk(lst_columns)
+    df_count_2 = analyzer.query(SQL_COUNT)
+    assert len(lst_reads) == 2
+    assert list(df_count_2['Game_Date'].str[:10]) == ['2019-06-01', '2019-06-02']
+    assert df_count_2['n'].sum() == len(df_2) > len(df_1)
+
+    # Reloading a date with the same rows still moves the watermark.
+    watermark = read_watermarks(bench_db.engine, ['wrk_statcast_2019'])['wrk_statcast_2019']
+    bench_db.stream_range('2019-06-02', refresh=True)
+    assert read_watermarks(bench_db.engine, ['wrk_statcast_2019'])['wrk_statcast_2019'] != watermark
+    assert analyzer.read_wrk(lst_columns).equals(df_2) and len(lst_reads) == 3
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+
+import pandas as pd
+
+from statcast_cache import DiskCache, raw_statcast_key
+
+
+def make_frame(seed, rows=200):
+    '''A frame that compresses poorly, so each entry has about the same size.'''
+    return pd.DataFrame({'a': pd.Series(range(rows)) * seed, 'b': [f'{seed}-{i * 7919 % 1000}' for i in range(rows)]})
+
+
+def test_hit_and_miss(tmp_path):
+    '''A put entry is returned for its key only, and an unreadable entry is
+    a miss that is discarded.'''
+    cache = DiskCache(str(tmp_path))
+    key = raw_statcast_key('2019-06-01', '2019-06-01')
+    assert cache.get(key) is None
+
+    cache.put(key, make_frame(1))
+    pd.testing.assert_frame_equal(cache.get(key), make_frame(1))
+    assert cache.get(raw_statcast_key('2019-06-02', '2019-06-02')) is None
+
+    with open(cache.key_path(key), 'wb') as f:
+        f.write(b'not parquet')
+    assert cache.get(key) is None
+    assert not os.path.exists(cache.key_path(key))
+
+
+def test_evicts_least_recently_used(tmp_path):
+    '''Past max_bytes the entries used longest ago are deleted first; a hit
+    counts as a use.'''
+    cache = DiskCache(str(tmp_path), max_bytes=10**9)
+    for seed in range(4):
+        cache.put(f'key{seed}', make_frame(seed))
+        os.utime(cache.key_path(f'key{seed}'), (1000 + seed, 1000 + seed))
+    entry_bytes = max(os.path.getsize(cache.key_path(f'key{seed}')) for seed in range(4))
+
+    # key0 is read, so key1 is now the least recently used.
+    assert cache.get('key0') is not None
+    cache.max_bytes = 3 * entry_bytes
+    assert cache.evict() == 1
+    assert [cache.get(f'key{seed}') is not None for seed in range(4)] == [True, False, True, True]
+
+    # A put past the limit makes room for itself.
+    cache.max_bytes = 2 * entry_bytes
+    cache.put('key4', make_frame(4))
+    assert cache.get('key4') is not None
+    assert sum(os.path.getsize(entry.path) for entry in os.scandir(tmp_path)) <= cache.max_bytes
+
+
+def test_failed_put_keeps_the_entry(tmp_path, monkeypatch):
+    '''An entry is written under a temporary name and renamed into place: a
+    write that fails leaves the previous entry and no temporary file.'''
+    cache = DiskCache(str(tmp_path))
+    cache.put('key', make_frame(1))
+    assert [entry.name for entry in os.scandir(tmp_path)] == [os.path.basename(cache.key_path('key'))]
+
+    def fail_to_parquet(df, path, **kwargs):
+        with open(path, 'wb') as f:
+            f.write(b'PAR1 partial')
+        raise OSError('disk full')
+    monkeypatch.setattr(pd.DataFrame, 'to_parquet', fail_to_parquet)
+    cache.put('key', make_frame(2))
+
+    pd.testing.assert_frame_equal(cache.get('key'), make_frame(1))
+    assert [entry.name for entry in os.scandir(tmp_path)] == [os.path.basename(cache.key_path('key'))]
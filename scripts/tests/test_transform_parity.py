@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import pandas as pd
+
+from mlb_statcast import Statcast_DB
+from statcast_bench import LOOP_CNT_EVENTS, PARITY_STEPS, _loop_add_cnt_events, _same_values, check_parity
+from transform_registry import CNT_EVENT_COLS
+
+
+def test_vectorized_transforms_match_loops():
+    '''Every output column of the vectorized WRK transforms matches the
+    row-by-row version on a synthetic day.'''
+    dct_diffs = check_parity('2019-06-01', n_games=15, seed=0)
+
+    assert set(dct_diffs) == set(PARITY_STEPS)
+    assert {name: lst_cols for name, lst_cols in dct_diffs.items() if lst_cols} == {}
+
+
+def test_cnt_events_match_loop_for_every_event():
+    '''add_cnt_events() matches the per-column comparisons it replaced for
+    every event any cnt_* column counts, including those a synthetic day
+    rarely has (e.g. interf_def, strikeout_double_play), and for other or
+    missing events and descriptions.'''
+    lst_events = sorted({event for col, lst_events, desc in LOOP_CNT_EVENTS for event in lst_events})
+    lst_events += ['catcher_interf', 'caught_stealing_2b', None]
+    lst_descs = ['called_strike', 'swinging_strike', 'foul_tip', 'hit_into_play', None]
+    df = pd.DataFrame([(event, desc) for event in lst_events for desc in lst_descs],
+                      columns=['Result_Event', 'Event_Description']).astype('category')
+
+    statcast_db = Statcast_DB.__new__(Statcast_DB)
+    statcast_db.df = df
+    dct_expected = _loop_add_cnt_events(statcast_db)
+    statcast_db.add_cnt_events()
+
+    assert list(dct_expected) == CNT_EVENT_COLS
+    assert [col for col, lst_values in dct_expected.items()
+            if not _same_values(lst_values, statcast_db.df[col])] == []
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# The WRK transformation, in the order the steps run. Each step is a
+# Statcast_DB method that reads its 'inputs' from self.df and adds (or, for
+# add_player_names, rewrites) its 'outputs'. Columns no step outputs are the
+# renamed statcast columns, which are always present once reorder_columns and
+# rename_columns have run. A step placed before the one that rewrites a column
+# reads it as it was renamed, e.g. add_game_state reads the On_* MLB IDs.
+# 'args' names the run-time values the method is called with, e.g. ('year',)
+# for add_ballparks(year).
+#
+# The order also fixes the column order of the WRK tables, as each step
+# inserts its columns next to an existing one or at the end.
+BASE_STEPS = ['reorder_columns', 'rename_columns']
+
+CNT_EVENT_COLS = ['cnt_PA', 'cnt_AB', 'cnt_Hit', 'cnt_Single', 'cnt_Double', 'cnt_Triple', 'cnt_Home_Run',
+                  'cnt_K', 'cnt_BackwardsK', 'cnt_Walk', 'cnt_HBP']
+
+# The cnt_* columns each Result_Event counts towards; any other event counts
+# towards none. Add an event, or a new column to CNT_EVENT_COLS, here.
+CNT_EVENT_FLAGS = {
+    'strikeout': ['cnt_PA', 'cnt_AB'],
+    'field_out': ['cnt_PA', 'cnt_AB'],
+    'grounded_into_double_play': ['cnt_PA', 'cnt_AB'],
+    'strikeout_double_play': ['cnt_PA', 'cnt_AB'],
+    'double_play': ['cnt_PA', 'cnt_AB'],
+    'force_out': ['cnt_PA', 'cnt_AB'],
+    'fielders_choice_out': ['cnt_PA', 'cnt_AB'],
+    'fielders_choice': ['cnt_PA', 'cnt_AB'],
+    'single': ['cnt_PA', 'cnt_AB', 'cnt_Hit', 'cnt_Single'],
+    'double': ['cnt_PA', 'cnt_AB', 'cnt_Hit', 'cnt_Double'],
+    'triple': ['cnt_PA', 'cnt_AB', 'cnt_Hit', 'cnt_Triple'],
+    'home_run': ['cnt_PA', 'cnt_AB', 'cnt_Hit', 'cnt_Home_Run'],
+    'hit_by_pitch': ['cnt_PA', 'cnt_HBP'],
+    'walk': ['cnt_PA', 'cnt_Walk'],
+    'field_error': ['cnt_PA'],
+    'sac_fly': ['cnt_PA'],
+    'sac_bunt': ['cnt_PA'],
+    'interf_def': ['cnt_PA'],
+}
+
+# Columns that also depend on the pitch result, keyed on
+# (Result_Event, Event_Description).
+CNT_EVENT_DESC_FLAGS = {
+    ('strikeout', 'called_strike'): ['cnt_K'],
+    ('strikeout', 'swinging_strike'): ['cnt_BackwardsK'],
+}
+
+# Outs recorded by a plate appearance's Result_Event. Only needed for the
+# last pitch of a game, which has no next pitch to read the outs from.
+EVENT_OUTS = {
+    'strikeout': 1, 'field_out': 1, 'force_out': 1, 'fielders_choice_out': 1, 'sac_fly': 1, 'sac_bunt': 1,
+    'grounded_into_double_play': 2, 'double_play': 2, 'strikeout_double_play': 2, 'sac_fly_double_play': 2,
+    'sac_bunt_double_play': 2, 'triple_play': 3,
+}
+
+GAME_STATE_COLS = ['Post_Bat_Score', 'Post_Fld_Score', 'Post_Outs', 'Post_Base_State']
+
+WRK_STEPS = [
+    {'name': 'add_game_state',
+     'inputs': ['Game_ID', 'PA_Num', 'Pitch_Num', 'Inning', 'Inning_TopBot', 'Home_Score', 'Away_Score',
+                'Bat_Score', 'Fld_Score', 'Outs_When_Up', 'On_1b', 'On_2b', 'On_3b', 'Result_Event',
+                'Gameday_Description'],
+     'outputs': GAME_STATE_COLS},
+    {'name': 'add_batter_name', 'inputs': ['Batter_ID'], 'outputs': ['Batter_Name']},
+    {'name': 'add_player_names',
+     'inputs': ['Fielder_2', 'Fielder_3', 'Fielder_4', 'Fielder_5', 'Fielder_6', 'Fielder_7', 'Fielder_8', 'Fielder_9',
+                'On_1b', 'On_2b', 'On_3b'],
+     'outputs': ['Fielder_2', 'Fielder_3', 'Fielder_4', 'Fielder_5', 'Fielder_6', 'Fielder_7', 'Fielder_8', 'Fielder_9',
+                 'On_1b', 'On_2b', 'On_3b']},
+    {'name': 'add_teams', 'inputs': ['Inning_TopBot', 'Home_Team', 'Away_Team'], 'outputs': ['Bat_Team', 'Fld_Team']},
+    {'name': 'add_lg_div', 'inputs': ['Bat_Team', 'Fld_Team'],
+     'outputs': ['Bat_Team_League', 'Bat_Team_Division', 'Fld_Team_League', 'Fld_Team_Division']},
+    {'name': 'add_ballparks', 'inputs': ['Home_Team'], 'outputs': ['Ball_Park'], 'args': ('year',)},
+    {'name': 'add_batter_pos', 'inputs': ['Batter_Name', 'Game_Date'], 'outputs': ['Batter_Pos']},
+    {'name': 'add_batter_bop', 'inputs': ['Batter_Name', 'Game_Date'], 'outputs': ['Batter_BOP']},
+    {'name': 'add_batter_ss', 'inputs': ['Batter_Name', 'Game_Year'], 'outputs': ['Batter_Sprint']},
+    {'name': 'add_cnt_events', 'inputs': ['Result_Event', 'Event_Description'], 'outputs': CNT_EVENT_COLS},
+    {'name': 'add_cnt_rbi', 'inputs': ['Result_Event', 'Bat_Score', 'Post_Bat_Score'], 'outputs': ['cnt_RBI']},
+    {'name': 'add_yahoo_pnts',
+     'inputs': ['cnt_Single', 'cnt_Double', 'cnt_Triple', 'cnt_Home_Run', 'cnt_RBI', 'cnt_Walk', 'cnt_HBP'],
+     'outputs': ['Yahoo_Pnts_Batter']},
+]
+
+
+def wrk_step_outputs(lst_steps=WRK_STEPS):
+    '''Returns {column: name of the step that outputs it}.'''
+    return {col: dct_step['name'] for dct_step in lst_steps for col in dct_step['outputs']}
+
+
+def plan_steps(lst_columns=None, lst_steps=WRK_STEPS):
+    '''Returns the steps needed to compute the requested WRK columns.
+
+    A requested column pulls in the step that outputs it, and that step's
+    inputs pull in the steps they come from, and so on. The steps are
+    returned in registry order, so a plan runs them in the same order as the
+    full transformation. The base steps are not included; they always run.
+
+    Args:
+        lst_columns(iterable): WRK columns to compute. None plans every step.
+                               Renamed statcast columns need no step.
+        lst_steps(list): The registry to plan from.
+
+    Returns:
+        list: The step dictionaries to run, in order.
+
+    Raises:
+        ValueError: if a step reads a column that only a later step adds
+    '''
+    if lst_columns is None:
+        return list(lst_steps)
+
+    dct_outputs = wrk_step_outputs(lst_steps)
+    dct_order = {dct_step['name']: s for s, dct_step in enumerate(lst_steps)}
+
+    set_needed = set()
+    lst_pending = [col for col in lst_columns if col in dct_outputs]
+    while lst_pending:
+        name = dct_outputs[lst_pending.pop()]
+        if name in set_needed:
+            continue
+        set_needed.add(name)
+        dct_step = lst_steps[dct_order[name]]
+        for col in dct_step['inputs']:
+            if col not in dct_outputs or col in dct_step['outputs']:
+                continue
+            dct_source = lst_steps[dct_order[dct_outputs[col]]]
+            if dct_order[dct_source['name']] > dct_order[name]:
+                if col in dct_source['inputs']:
+                    continue
+                raise ValueError(f"Step {name} reads {col}, which {dct_source['name']} only outputs later")
+            lst_pending.append(col)
+
+    return [dct_step for dct_step in lst_steps if dct_step['name'] in set_needed]
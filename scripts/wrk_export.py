@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import glob
+import importlib.util
+import logging
+import os
+import uuid
+
+import pandas as pd
+from sqlalchemy import inspect, text
+
+from statcast_dtypes import type_wrk_frame
+
+
+# The WRK tables exported as a Parquet dataset, one directory per month:
+#     {root}/year=2019/month=6/2019-06-01-000.parquet
+# Each file holds one chunk of a date (the whole date outside stream_range()),
+# so reloading a date replaces its files. Rows are sorted by SORT_COLS before
+# they are written, which keeps each batting team's pitches in few row groups
+# and lets a team filter skip the rest using the row group statistics.
+PARTITIONING = [('year', 'int32'), ('month', 'int32')]
+SORT_COLS = ['Bat_Team', 'Game_ID', 'PA_Num', 'Pitch_Num']
+ROW_GROUP_ROWS = 1000
+
+
+def pyarrow_installed():
+    '''Returns True if pyarrow, which the export needs, is installed.'''
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def partition_dir(root, date):
+    '''Returns the directory of the month a date belongs to.'''
+    return os.path.join(root, f'year={int(date[:4])}', f'month={int(date[5:7])}')
+
+
+def arrow_table(df_wrk):
+    '''Converts WRK rows to an Arrow table whose schema depends only on the
+    column names, so files written from the pipeline and from the database
+    can be read as one dataset.
+
+    Args:
+        df_wrk(DataFrame): WRK rows.
+
+    Returns:
+        Table: The rows, with nullable integer, float, timestamp and string
+               columns. Categoricals are written as plain strings.
+
+    Raises:
+        No exceptions
+    '''
+    import pyarrow as pa
+
+    df = type_wrk_frame(df_wrk)
+    lst_arrays = []
+    for col in df.columns:
+        srs = df[col]
+        if isinstance(srs.dtype, pd.CategoricalDtype) or not (pd.api.types.is_numeric_dtype(srs.dtype) or
+                                                              pd.api.types.is_datetime64_any_dtype(srs.dtype)):
+            lst_arrays.append(pa.array(srs.astype(object), type=pa.string(), from_pandas=True))
+        else:
+            lst_arrays.append(pa.array(srs, from_pandas=True))
+
+    return pa.Table.from_arrays(lst_arrays, names=list(df.columns))
+
+
+def write_partition(df_wrk, root, date, chunk=0, row_group_rows=ROW_GROUP_ROWS, compression='zstd'):
+    '''Writes the WRK rows of a date, or of one chunk of a date, to the dataset.
+
+    Writing chunk 0 first deletes every file the date already has, so a date
+    that is loaded again (or with a different chunk size) ends up with only
+    its new files. Each file is written under a temporary name and renamed
+    when complete, so a reader never sees a partial file.
+
+    Args:
+        df_wrk(DataFrame): The WRK rows, all from the same date.
+        root(str): The dataset directory.
+        date(str): The date, formatted 'yyyy-mm-dd'.
+        chunk(int): Position of the chunk within the date.
+        row_group_rows(int): Maximum rows per Parquet row group.
+        compression(str): Parquet compression codec.
+
+    Returns:
+        str: The path of the file written.
+
+    Raises:
+        Exception: if the file cannot be written
+    '''
+    import pyarrow.parquet as pq
+
+    dir_path = partition_dir(root, date)
+    os.makedirs(dir_path, exist_ok=True)
+    if chunk == 0:
+        for old_path in glob.glob(os.path.join(dir_path, f'{date}-*.parquet')):
+            os.remove(old_path)
+
+    lst_sort = [col for col in SORT_COLS if col in df_wrk.columns]
+    df = df_wrk.sort_values(lst_sort, kind='stable') if lst_sort else df_wrk
+    path = os.path.join(dir_path, f'{date}-{chunk:03d}.parquet')
+    tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    try:
+        pq.write_table(arrow_table(df), tmp_path, row_group_size=row_group_rows, compression=compression)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return path
+
+
+def export_wrk(engine, year, root, row_group_rows=ROW_GROUP_ROWS, compression='zstd'):
+    '''Exports a season's WRK table to the dataset, one date at a time, so
+    memory holds a single date whatever the size of the table.
+
+    Args:
+        engine(Engine): The database engine.
+        year(str): The season.
+        root(str): The dataset directory.
+        row_group_rows(int): Maximum rows per Parquet row group.
+        compression(str): Parquet compression codec.
+
+    Returns:
+        dict: {date: rows written}, empty if the table does not exist.
+
+    Raises:
+        Exception: if a read or write fails
+    '''
+    table = f'wrk_statcast_{year}'
+    if not inspect(engine).has_table(table):
+        logging.warning(f'{table} does not exist, nothing to export')
+        return {}
+
+    with engine.connect() as conn:
+        srs_dates = pd.read_sql(text(f'SELECT DISTINCT Game_Date FROM {table}'), conn)['Game_Date']
+    lst_dates = sorted(pd.to_datetime(srs_dates).dt.strftime('%Y-%m-%d').unique())
+
+    dct_rows = {}
+    stmt = text(f'SELECT * FROM {table} WHERE Game_Date >= :start AND Game_Date < :end')
+    for date in lst_dates:
+        next_date = (pd.Timestamp(date) + pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+        with engine.connect() as conn:
+            df = pd.read_sql(stmt, conn, params={'start': date, 'end': next_date})
+        write_partition(df, root, date, row_group_rows=row_group_rows, compression=compression)
+        dct_rows[date] = len(df)
+
+    return dct_rows
+
+
+def wrk_filter(start=None, end=None, teams=None, batters=None, pitchers=None):
+    '''Returns the dataset filter for a date range, batting teams and players.
+
+    The date range is expressed on the year/month directories as well as on
+    Game_Date, so the months outside it are skipped without opening a file.
+
+    Args:
+        start(str): First date, formatted 'yyyy-mm-dd'.
+        end(str): Last date, formatted 'yyyy-mm-dd'.
+        teams(list): Batting teams (Bat_Team), e.g. ['NYY', 'BOS'].
+        batters(list): Batter MLB IDs.
+        pitchers(list): Pitcher MLB IDs.
+
+    Returns:
+        Expression: The filter, or None if no argument is given.
+
+    Raises:
+        No exceptions
+    '''
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    lst_exprs = []
+    for date, op in [(start, 'start'), (end, 'end')]:
+        if date is None:
+            continue
+        year, month = int(date[:4]), int(date[5:7])
+        if op == 'start':
+            lst_exprs.append((ds.field('year') > year) | ((ds.field('year') == year) & (ds.field('month') >= month)))
+            lst_exprs.append(ds.field('Game_Date') >= pa.scalar(pd.Timestamp(date), type=pa.timestamp('us')))
+        else:
+            lst_exprs.append((ds.field('year') < year) | ((ds.field('year') == year) & (ds.field('month') <= month)))
+            lst_exprs.append(ds.field('Game_Date') < pa.scalar(pd.Timestamp(date) + pd.Timedelta(days=1),
+                                                               type=pa.timestamp('us')))
+    for col, lst_values in [('Bat_Team', teams), ('Batter_ID', batters), ('Pitcher_ID', pitchers)]:
+        if lst_values is not None:
+            lst_exprs.append(ds.field(col).isin(list(lst_values)))
+
+    expr = None
+    for e in lst_exprs:
+        expr = e if expr is None else expr & e
+
+    return expr
+
+
+def open_dataset(root):
+    '''Opens the exported dataset, with the year/month directories as int32
+    partition columns.'''
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    partitioning = ds.partitioning(pa.schema([(name, getattr(pa, dtype)()) for name, dtype in PARTITIONING]),
+                                   flavor='hive')
+
+    return ds.dataset(root, format='parquet', partitioning=partitioning)
+
+
+def read_wrk(root, columns=None, start=None, end=None, teams=None, batters=None, pitchers=None):
+    '''Reads WRK rows from the dataset.
+
+    Only the requested columns are read, and the filters are pushed down to
+    the scan: months outside the date range are skipped by directory, and
+    files and row groups whose statistics rule out the filter are not read.
+
+    Args:
+        root(str): The dataset directory.
+        columns(list): Columns to return. None returns every WRK column.
+        start(str): First date, formatted 'yyyy-mm-dd'.
+        end(str): Last date, formatted 'yyyy-mm-dd'.
+        teams(list): Batting teams (Bat_Team) to keep.
+        batters(list): Batter MLB IDs to keep.
+        pitchers(list): Pitcher MLB IDs to keep.
+
+    Returns:
+        DataFrame: The rows, with the dtypes transform_wrk() produces (see
+                   statcast_dtypes.type_wrk_frame()). Rows come file by
+                   file, each file ordered by SORT_COLS; the files are not
+                   read in date order.
+
+    Raises:
+        Exception: if the dataset cannot be read
+    '''
+    dataset = open_dataset(root)
+    if columns is None:
+        columns = [col for col in dataset.schema.names if col not in dict(PARTITIONING)]
+    table = dataset.to_table(columns=list(columns),
+                             filter=wrk_filter(start, end, teams, batters, pitchers))
+
+    return type_wrk_frame(table.to_pandas())